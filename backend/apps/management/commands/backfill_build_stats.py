@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.models import BuildHistory, BuildStatsRollup
+from apps.utils.build_stats import (
+    FINAL_STATUSES, PERIODS, truncate_time, parse_duration, empty_histogram, apply_result
+)
+
+
+class Command(BaseCommand):
+    help = '根据构建历史重新生成构建统计汇总数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=0, help='只回填最近N天的数据，0表示全部')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批读取/写入的记录数')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+
+        histories = BuildHistory.objects.filter(status__in=FINAL_STATUSES)
+        rollups = BuildStatsRollup.objects.all()
+        if days > 0:
+            # 从当天零点开始截断，保证按天/按小时的汇总行都完整重建
+            start_time = truncate_time(datetime.now() - timedelta(days=days), 'day')
+            histories = histories.filter(create_time__gte=start_time)
+            rollups = rollups.filter(bucket_time__gte=start_time)
+
+        # 在内存中聚合，行数只与 时间段数 × 任务数 有关
+        rows = {}
+        processed = 0
+        for history in histories.values(
+            'status', 'create_time', 'build_time',
+            'task_id', 'task__project_id', 'task__environment_id'
+        ).iterator(chunk_size=batch_size):
+            if not history['task_id'] or not history['create_time']:
+                continue
+            duration = parse_duration(history['build_time'])
+            for period in PERIODS:
+                key = (period, truncate_time(history['create_time'], period), history['task_id'])
+                row = rows.get(key)
+                if row is None:
+                    row = BuildStatsRollup(
+                        period=period,
+                        bucket_time=key[1],
+                        task_id=history['task_id'],
+                        project_id=history['task__project_id'],
+                        environment_id=history['task__environment_id'],
+                        duration_histogram=empty_histogram(),
+                    )
+                    rows[key] = row
+                apply_result(row, history['status'], duration)
+            processed += 1
+
+        with transaction.atomic():
+            deleted, _ = rollups.delete()
+            BuildStatsRollup.objects.bulk_create(rows.values(), batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'回填完成：处理构建记录 {processed} 条，删除旧汇总 {deleted} 条，生成汇总 {len(rows)} 条'
+        ))
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.models import BuildHistory, BuildStageTiming
+from apps.utils.build_stats import FINAL_STATUSES
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_time(value):
+    try:
+        return datetime.strptime(value, TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_seconds(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Command(BaseCommand):
+    help = '根据构建历史中的 build_time 信息重新生成构建耗时明细数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=0, help='只回填最近N天的数据，0表示全部')
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的构建记录数')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+
+        histories = BuildHistory.objects.filter(status__in=FINAL_STATUSES).order_by('id')
+        if days > 0:
+            histories = histories.filter(create_time__gte=datetime.now() - timedelta(days=days))
+
+        processed = 0
+        created = 0
+        batch = []
+        for history in histories.values('history_id', 'task_id', 'status', 'build_time').iterator(chunk_size=batch_size):
+            batch.append(history)
+            if len(batch) >= batch_size:
+                created += self._process_batch(batch)
+                processed += len(batch)
+                batch = []
+        if batch:
+            created += self._process_batch(batch)
+            processed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'回填完成：处理构建记录 {processed} 条，生成耗时明细 {created} 条'
+        ))
+
+    def _process_batch(self, batch):
+        """将一批构建历史转换为耗时明细，替换这些构建已有的明细"""
+        timings = []
+        for history in batch:
+            build_time = history['build_time'] or {}
+            stages_time = build_time.get('stages_time') or []
+
+            total_duration = parse_seconds(build_time.get('total_duration'))
+            if total_duration is not None:
+                timings.append(BuildStageTiming(
+                    history_id=history['history_id'],
+                    task_id=history['task_id'],
+                    timing_type='build',
+                    start_time=parse_time(build_time.get('start_time')),
+                    duration=total_duration,
+                    status=history['status'],
+                ))
+
+            # 历史数据没有阶段状态：成功的构建所有阶段视为成功，否则最后一个阶段记为构建的最终状态
+            for index, stage in enumerate(stages_time):
+                duration = parse_seconds(stage.get('duration'))
+                if duration is None:
+                    continue
+                is_last = index == len(stages_time) - 1
+                timings.append(BuildStageTiming(
+                    history_id=history['history_id'],
+                    task_id=history['task_id'],
+                    timing_type='stage',
+                    stage_name=stage.get('name'),
+                    stage_index=index,
+                    start_time=parse_time(stage.get('start_time')),
+                    duration=duration,
+                    status=history['status'] if is_last and history['status'] != 'success' else 'success',
+                ))
+
+        with transaction.atomic():
+            BuildStageTiming.objects.filter(history_id__in=[history['history_id'] for history in batch]).delete()
+            BuildStageTiming.objects.bulk_create(timings)
+        return len(timings)
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from apps.models import BuildHistory
+from apps.utils.log_codec import compress_history_log, FINAL_STATUSES
+
+
+class Command(BaseCommand):
+    help = '压缩已结束构建的历史日志（构建结束时会自动压缩，本命令用于处理升级前的历史数据）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=0, help='只压缩N天前的构建日志，0表示全部')
+        parser.add_argument('--batch-size', type=int, default=100, help='每批读取的构建记录数')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+
+        histories = BuildHistory.objects.filter(status__in=FINAL_STATUSES, build_log__isnull=False).exclude(build_log='')
+        if days > 0:
+            histories = histories.filter(create_time__lt=datetime.now() - timedelta(days=days))
+
+        processed = 0
+        saved = 0
+        last_id = 0
+        while True:
+            # 按主键分批读取，日志较大，不一次性加载
+            batch = list(histories.filter(id__gt=last_id).order_by('id').only('id', 'status', 'build_log')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for history in batch:
+                saved += compress_history_log(history)
+                processed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'压缩完成：处理构建记录 {processed} 条，节省 {saved / 1024 / 1024:.2f} MB'
+        ))
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from apps.models import BuildHistory
+from apps.utils.log_codec import FINAL_STATUSES
+from apps.utils.log_search import build_log_index
+
+
+class Command(BaseCommand):
+    help = '将已结束构建的日志写入全文检索索引（构建结束时会自动写入，本命令用于处理升级前的历史数据或重建索引）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=0, help='只处理最近N天的构建，0表示全部')
+        parser.add_argument('--batch-size', type=int, default=50, help='每批读取的构建记录数')
+        parser.add_argument('--force', action='store_true', help='重新索引已索引的构建')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+
+        indexed = build_log_index.indexed_ids()
+
+        # 删除构建记录已不存在的索引（如随任务一起删除的构建）
+        existing = set(BuildHistory.objects.values_list('id', flat=True))
+        stale = indexed - existing
+        build_log_index.remove(stale)
+
+        histories = BuildHistory.objects.filter(status__in=FINAL_STATUSES)
+        if days > 0:
+            histories = histories.filter(create_time__gte=datetime.now() - timedelta(days=days))
+        if not options['force']:
+            histories = histories.exclude(id__in=indexed)
+
+        builds = 0
+        lines = 0
+        last_id = 0
+        fields = ('id', 'task_id', 'build_number', 'status', 'create_time', 'build_log', 'build_log_compressed', 'log_codec')
+        while True:
+            # 按主键分批读取，日志较大，不一次性加载
+            batch = list(histories.filter(id__gt=last_id).order_by('id').only(*fields)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for history in batch:
+                lines += build_log_index.index(history)
+                builds += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'索引完成：写入构建 {builds} 条、日志 {lines} 行，删除失效索引 {len(stale)} 条'
+        ))
@@ -0,0 +1,194 @@
+import math
+import time
+import logging
+import threading
+from collections import deque
+from django.conf import settings
+from django.db import connection
+from .utils.metrics import registry
+
+logger = logging.getLogger('apps')
+
+# 是否启用请求耗时统计
+REQUEST_TIMING_ENABLED = getattr(settings, 'REQUEST_TIMING_ENABLED', True)
+# 慢请求阈值（秒），超过时记录日志及耗时最多的SQL
+SLOW_REQUEST_THRESHOLD = getattr(settings, 'SLOW_REQUEST_THRESHOLD', 1.0)
+# 慢请求日志中输出的SQL条数
+SLOW_REQUEST_TOP_SQL = getattr(settings, 'SLOW_REQUEST_TOP_SQL', 5)
+# 每个接口保留最近多少次请求的耗时，用于计算分位数
+REQUEST_STATS_SAMPLE_SIZE = 200
+# 单个请求最多区分的SQL语句数，超出部分只计入总数和总耗时
+MAX_TRACKED_STATEMENTS = 500
+
+HTTP_REQUEST_DURATION = registry.histogram('liteops_http_request_duration_seconds', '接口请求耗时', ['method', 'route'])
+HTTP_REQUEST_QUERIES = registry.histogram(
+    'liteops_http_request_queries', '每次接口请求执行的SQL数', ['method', 'route'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+
+
+class QueryRecorder:
+    """通过 connection.execute_wrapper 统计一次请求中的SQL条数和耗时，相同语句合并计数"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}  # sql -> [执行次数, 总耗时]
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            stat = self.statements.get(sql)
+            if stat is not None:
+                stat[0] += 1
+                stat[1] += duration
+            elif len(self.statements) < MAX_TRACKED_STATEMENTS:
+                self.statements[sql] = [1, duration]
+
+    def top_statements(self, limit):
+        """按总耗时排序的SQL语句 [(sql, 执行次数, 总耗时)]"""
+        items = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [(sql, count, duration) for sql, (count, duration) in items]
+
+
+class RequestStats:
+    """按接口（请求方法 + 路由）汇总的请求耗时统计，保存在当前进程内存中"""
+
+    def __init__(self, sample_size=REQUEST_STATS_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._since = time.time()
+
+    def record(self, method, route, duration, query_count, query_time, size, status_code):
+        key = (method, route)
+        slow = duration >= SLOW_REQUEST_THRESHOLD
+        with self._lock:
+            stat = self._endpoints.get(key)
+            if stat is None:
+                stat = self._endpoints[key] = {
+                    'count': 0, 'errors': 0, 'slow': 0,
+                    'total_time': 0.0, 'max_time': 0.0,
+                    'total_queries': 0, 'max_queries': 0, 'total_query_time': 0.0,
+                    'total_size': 0,
+                    'samples': deque(maxlen=self.sample_size),
+                }
+            stat['count'] += 1
+            stat['errors'] += status_code >= 500
+            stat['slow'] += slow
+            stat['total_time'] += duration
+            stat['max_time'] = max(stat['max_time'], duration)
+            stat['total_queries'] += query_count
+            stat['max_queries'] = max(stat['max_queries'], query_count)
+            stat['total_query_time'] += query_time
+            stat['total_size'] += size
+            stat['samples'].append(duration)
+
+    @staticmethod
+    def _percentile(values, percent):
+        if not values:
+            return 0
+        return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+    def snapshot(self):
+        """返回各接口的统计结果（耗时单位为毫秒）"""
+        with self._lock:
+            items = [(key, dict(stat, samples=sorted(stat['samples']))) for key, stat in self._endpoints.items()]
+            since = self._since
+
+        result = []
+        for (method, route), stat in items:
+            count = stat['count']
+            result.append({
+                'method': method,
+                'route': route,
+                'count': count,
+                'errors': stat['errors'],
+                'slow': stat['slow'],
+                'avg_time': round(stat['total_time'] / count * 1000, 2),
+                'p50_time': round(self._percentile(stat['samples'], 50) * 1000, 2),
+                'p95_time': round(self._percentile(stat['samples'], 95) * 1000, 2),
+                'max_time': round(stat['max_time'] * 1000, 2),
+                'total_time': round(stat['total_time'] * 1000, 2),
+                'avg_queries': round(stat['total_queries'] / count, 2),
+                'max_queries': stat['max_queries'],
+                'avg_query_time': round(stat['total_query_time'] / count * 1000, 2),
+                'avg_size': int(stat['total_size'] / count),
+            })
+        return since, result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._since = time.time()
+
+
+request_stats = RequestStats()
+
+
+def _get_route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return '/' + match.route if match.route else match.view_name
+
+
+class RequestTimingMiddleware:
+    """
+    接口耗时统计中间件
+
+    记录每个请求的总耗时、SQL条数和耗时、响应大小，通过 Server-Timing 响应头返回，
+    超过 SLOW_REQUEST_THRESHOLD 的请求记录日志并列出耗时最多的SQL，各接口的汇总数据见 request_stats
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not REQUEST_TIMING_ENABLED:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.1f}, '
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+        )
+
+        # 流式响应（SSE、日志下载）的耗时只到开始返回数据为止，不计入统计
+        if response.streaming:
+            return response
+
+        try:
+            self._record(request, response, duration, recorder)
+        except Exception as e:
+            logger.error(f'记录接口耗时失败: {str(e)}', exc_info=True)
+        return response
+
+    def _record(self, request, response, duration, recorder):
+        method = request.method
+        route = _get_route(request)
+        request_stats.record(
+            method, route, duration, recorder.count, recorder.duration,
+            len(response.content), response.status_code
+        )
+        HTTP_REQUEST_DURATION.observe(duration, method=method, route=route)
+        HTTP_REQUEST_QUERIES.observe(recorder.count, method=method, route=route)
+
+        if duration >= SLOW_REQUEST_THRESHOLD:
+            lines = [
+                f'慢请求: {method} {request.path} 耗时 {duration * 1000:.0f}ms，'
+                f'SQL {recorder.count} 条共 {recorder.duration * 1000:.0f}ms，状态码 {response.status_code}'
+            ]
+            for sql, count, total in recorder.top_statements(SLOW_REQUEST_TOP_SQL):
+                lines.append(f'  {total * 1000:.1f}ms x{count}: {sql[:500]}')
+            logger.warning('\n'.join(lines))
@@ -12,6 +12,7 @@ class User(models.Model):
     email = models.EmailField(max_length=100, unique=True, null=True, verbose_name='邮箱')
     user_type = models.CharField(max_length=20, default='system', null=True, verbose_name='用户类型')
     ldap_dn = models.CharField(max_length=255, null=True, blank=True, verbose_name='LDAP DN')
+    ldap_modified = models.CharField(max_length=64, null=True, blank=True, verbose_name='LDAP修改标记')  # 上次同步时条目的 uSNChanged/entryUSN/modifyTimestamp
     status = models.SmallIntegerField(null=True, verbose_name='状态')
     login_time = models.DateTimeField(null=True, verbose_name='最后登录时间')
     create_time = models.DateTimeField(auto_now_add=True, null=True, verbose_name='创建时间')
@@ -78,7 +79,7 @@ class UserToken(models.Model):
     id = models.AutoField(primary_key=True)
     token_id = models.CharField(max_length=32, unique=True, null=True, verbose_name='TokenID')
     user = models.ForeignKey('User', on_delete=models.CASCADE, to_field='user_id', null=True, verbose_name='用户')
-    token = models.CharField(max_length=256, null=True, verbose_name='Token信息')
+    token = models.CharField(max_length=1024, null=True, verbose_name='Token信息')
     create_time = models.DateTimeField(auto_now_add=True, null=True, verbose_name='创建时间')
     update_time = models.DateTimeField(auto_now=True, null=True, verbose_name='更新时间')
 
@@ -197,6 +198,7 @@ class Environment(models.Model):
     name = models.CharField(max_length=50, null=True, verbose_name='环境名称')
     type = models.CharField(max_length=20, null=True, verbose_name='环境类型')  # development, testing, staging, production
     description = models.TextField(null=True, blank=True, verbose_name='环境描述')
+    resource_limits = models.JSONField(default=dict, verbose_name='构建资源限制')  # cpu_weight, cpu_max, memory_max, pids_max
     creator = models.ForeignKey('User', on_delete=models.CASCADE, to_field='user_id', null=True, verbose_name='创建者')
     create_time = models.DateTimeField(auto_now_add=True, null=True, verbose_name='创建时间')
     update_time = models.DateTimeField(auto_now=True, null=True, verbose_name='更新时间')
@@ -237,6 +239,11 @@ class BuildTask(models.Model):
     # 构建时间信息（使用JSON存储）
     build_time = models.JSONField(default=dict, verbose_name='构建时间信息')
 
+    # 构建资源限制（覆盖环境的配置）
+    resource_limits = models.JSONField(default=dict, verbose_name='构建资源限制')  # cpu_weight, cpu_max, memory_max, pids_max
+    build_timeout = models.IntegerField(null=True, blank=True, verbose_name='构建超时时间(分钟)')  # 为空时使用 BUILD_DEFAULT_TIMEOUT
+    log_filters = models.JSONField(default=dict, verbose_name='日志过滤配置')  # presets, strip_ansi, drop_patterns, mask_patterns, max_line_length
+
     # 构建后操作
     notification_channels = models.JSONField(default=list, verbose_name='通知方式')
 
@@ -276,6 +283,8 @@ class BuildHistory(models.Model):
     status = models.CharField(max_length=20, default='pending', verbose_name='构建状态')  # pending, running, success, failed, terminated
     requirement = models.TextField(null=True, blank=True, verbose_name='构建需求描述')
     build_log = models.TextField(null=True, blank=True, verbose_name='构建日志')
+    build_log_compressed = models.BinaryField(null=True, blank=True, verbose_name='压缩的构建日志')  # 构建结束后压缩保存，build_log置空
+    log_codec = models.CharField(max_length=20, null=True, blank=True, verbose_name='构建日志压缩编码')
     stages = models.JSONField(default=list, verbose_name='构建阶段')
     parameter_values = models.JSONField(default=dict, verbose_name='构建参数值')
     build_time = models.JSONField(default=dict, verbose_name='构建时间信息')
@@ -295,6 +304,72 @@ class BuildHistory(models.Model):
         return f"{self.task.name} #{self.build_number}"
 
 
+class BuildStatsRollup(models.Model):
+    """
+    构建统计汇总表 - 按小时/天预聚合每个任务的构建结果，供首页仪表盘直接读取
+    """
+    id = models.AutoField(primary_key=True)
+    period = models.CharField(max_length=10, verbose_name='统计粒度')  # hour, day
+    bucket_time = models.DateTimeField(verbose_name='统计时间段起点')
+    task = models.ForeignKey('BuildTask', on_delete=models.CASCADE, to_field='task_id', null=True, verbose_name='构建任务')
+    project_id = models.CharField(max_length=32, null=True, verbose_name='项目ID')  # 构建时所属项目
+    environment_id = models.CharField(max_length=32, null=True, verbose_name='环境ID')  # 构建时所属环境
+    total_count = models.IntegerField(default=0, verbose_name='构建总数')
+    success_count = models.IntegerField(default=0, verbose_name='成功次数')
+    failed_count = models.IntegerField(default=0, verbose_name='失败次数')
+    terminated_count = models.IntegerField(default=0, verbose_name='终止次数')
+    duration_sum = models.BigIntegerField(default=0, verbose_name='构建耗时总和(秒)')
+    duration_count = models.IntegerField(default=0, verbose_name='有耗时记录的构建数')
+    duration_histogram = models.JSONField(default=list, verbose_name='构建耗时分布')  # 与 DURATION_BUCKETS 对应的计数
+    update_time = models.DateTimeField(auto_now=True, null=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'build_stats_rollup'
+        verbose_name = '构建统计汇总'
+        verbose_name_plural = verbose_name
+        unique_together = ['period', 'bucket_time', 'task']
+        indexes = [
+            models.Index(fields=['period', 'bucket_time'], name='build_stats_period_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} {self.period} {self.bucket_time}"
+
+
+class BuildStageTiming(models.Model):
+    """
+    构建耗时明细表 - 以数值类型记录每次构建及其各阶段的耗时，供耗时分析使用
+    """
+    id = models.AutoField(primary_key=True)
+    history = models.ForeignKey('BuildHistory', on_delete=models.CASCADE, to_field='history_id', null=True, verbose_name='构建历史')
+    task = models.ForeignKey('BuildTask', on_delete=models.CASCADE, to_field='task_id', null=True, verbose_name='构建任务')
+    timing_type = models.CharField(max_length=10, default='stage', verbose_name='耗时类型')  # build: 整次构建, stage: 单个阶段
+    stage_name = models.CharField(max_length=100, null=True, verbose_name='阶段名称')
+    stage_index = models.IntegerField(default=0, verbose_name='阶段顺序')
+    start_time = models.DateTimeField(null=True, verbose_name='开始时间')
+    duration = models.FloatField(default=0, verbose_name='耗时(秒)')
+    status = models.CharField(max_length=20, null=True, verbose_name='状态')  # success, failed, terminated
+    # 阶段脚本进程树的资源占用，未采集到时为空
+    cpu_time = models.FloatField(null=True, verbose_name='CPU时间(秒)')
+    max_rss = models.BigIntegerField(null=True, verbose_name='内存峰值(字节)')
+    read_bytes = models.BigIntegerField(null=True, verbose_name='读取字节数')
+    write_bytes = models.BigIntegerField(null=True, verbose_name='写入字节数')
+    process_count = models.IntegerField(null=True, verbose_name='子进程数')
+    create_time = models.DateTimeField(auto_now_add=True, null=True, verbose_name='创建时间')
+
+    class Meta:
+        db_table = 'build_stage_timing'
+        verbose_name = '构建耗时明细'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['task', 'timing_type', 'start_time'], name='stage_timing_task_time_idx'),
+            models.Index(fields=['timing_type', 'start_time'], name='stage_timing_type_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.history_id} {self.stage_name} {self.duration}"
+
+
 class NotificationRobot(models.Model):
     """通知机器人表"""
     id = models.AutoField(primary_key=True)
@@ -321,6 +396,103 @@ class NotificationRobot(models.Model):
         return f"{self.name} ({self.type})"
 
 
+class NotificationOutbox(models.Model):
+    """
+    通知发件箱表 - 待发送的机器人通知，由后台发送线程投递并在失败时重试
+    """
+    id = models.AutoField(primary_key=True)
+    robot = models.ForeignKey('NotificationRobot', on_delete=models.CASCADE, to_field='robot_id', null=True, verbose_name='通知机器人')
+    history = models.ForeignKey('BuildHistory', on_delete=models.SET_NULL, to_field='history_id', null=True, verbose_name='构建历史')
+    message = models.JSONField(default=dict, verbose_name='消息内容')
+    summary = models.TextField(null=True, blank=True, verbose_name='摘要')  # 合并为汇总消息时使用的单行内容
+    batch_id = models.CharField(max_length=32, null=True, blank=True, verbose_name='汇总批次ID')
+    status = models.CharField(max_length=20, default='pending', verbose_name='发送状态')  # pending, sending, success, failed
+    attempts = models.IntegerField(default=0, verbose_name='已尝试次数')
+    next_attempt_time = models.DateTimeField(null=True, verbose_name='下次发送时间')
+    last_error = models.TextField(null=True, blank=True, verbose_name='最近一次错误')
+    sent_time = models.DateTimeField(null=True, verbose_name='发送成功时间')
+    create_time = models.DateTimeField(auto_now_add=True, null=True, verbose_name='创建时间')
+    update_time = models.DateTimeField(auto_now=True, null=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'notification_outbox'
+        verbose_name = '通知发件箱'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_time'], name='outbox_status_next_idx'),
+            models.Index(fields=['robot', 'create_time'], name='outbox_robot_time_idx'),
+            models.Index(fields=['batch_id'], name='outbox_batch_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.robot_id} {self.status}"
+
+
+class RetentionPolicy(models.Model):
+    """
+    数据保留策略表 - 按任务/环境定期清理过期的构建历史或登录日志
+    """
+    id = models.AutoField(primary_key=True)
+    policy_id = models.CharField(max_length=32, unique=True, null=True, verbose_name='策略ID')
+    name = models.CharField(max_length=100, null=True, verbose_name='策略名称')
+    scope = models.CharField(max_length=20, default='build_history', verbose_name='清理对象')  # build_history, login_log
+    task = models.ForeignKey('BuildTask', on_delete=models.CASCADE, to_field='task_id', null=True, blank=True, verbose_name='构建任务')
+    environment = models.ForeignKey('Environment', on_delete=models.CASCADE, to_field='environment_id', null=True, blank=True, verbose_name='构建环境')
+    keep_days = models.IntegerField(null=True, blank=True, verbose_name='保留天数')
+    keep_builds = models.IntegerField(null=True, blank=True, verbose_name='每个任务保留的构建数')
+    cleanup_workspace = models.BooleanField(default=True, verbose_name='清理构建目录')
+    enabled = models.BooleanField(default=True, verbose_name='是否启用')
+    interval_hours = models.IntegerField(default=24, verbose_name='执行间隔(小时)')
+    last_run_time = models.DateTimeField(null=True, blank=True, verbose_name='上次执行时间')
+    next_run_time = models.DateTimeField(null=True, blank=True, verbose_name='下次执行时间')
+    creator = models.ForeignKey('User', on_delete=models.SET_NULL, to_field='user_id', null=True, verbose_name='创建者')
+    create_time = models.DateTimeField(auto_now_add=True, null=True, verbose_name='创建时间')
+    update_time = models.DateTimeField(auto_now=True, null=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'retention_policy'
+        verbose_name = '数据保留策略'
+        verbose_name_plural = verbose_name
+        ordering = ['-create_time']
+
+    def __str__(self):
+        return self.name
+
+
+class RetentionJob(models.Model):
+    """
+    数据清理任务表 - 记录后台分批清理的进度和结果
+    """
+    id = models.AutoField(primary_key=True)
+    job_id = models.CharField(max_length=32, unique=True, null=True, verbose_name='清理任务ID')
+    policy = models.ForeignKey('RetentionPolicy', on_delete=models.SET_NULL, to_field='policy_id', null=True, blank=True, verbose_name='保留策略')
+    scope = models.CharField(max_length=20, default='build_history', verbose_name='清理对象')  # build_history, login_log
+    params = models.JSONField(default=dict, verbose_name='清理参数')
+    status = models.CharField(max_length=20, default='pending', verbose_name='状态')  # pending, running, success, failed, cancelled
+    total_count = models.IntegerField(default=0, verbose_name='待清理记录数')
+    deleted_count = models.IntegerField(default=0, verbose_name='已删除记录数')
+    workspace_count = models.IntegerField(default=0, verbose_name='已清理构建目录数')
+    freed_bytes = models.BigIntegerField(default=0, verbose_name='释放的磁盘空间(字节)')
+    error_message = models.TextField(null=True, blank=True, verbose_name='错误信息')
+    operator = models.ForeignKey('User', on_delete=models.SET_NULL, to_field='user_id', null=True, verbose_name='操作人')
+    start_time = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
+    finish_time = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
+    create_time = models.DateTimeField(auto_now_add=True, null=True, verbose_name='创建时间')
+    update_time = models.DateTimeField(auto_now=True, null=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'retention_job'
+        verbose_name = '数据清理任务'
+        verbose_name_plural = verbose_name
+        ordering = ['-create_time']
+        indexes = [
+            models.Index(fields=['status', 'create_time'], name='retention_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} {self.status}"
+
+
 class LoginLog(models.Model):
     """
     登录日志表
@@ -408,6 +580,7 @@ class LDAPConfig(models.Model):
     user_search_filter = models.CharField(max_length=255, default='(uid={username})', verbose_name='用户搜索过滤器')
     user_attr_map = models.JSONField(default=dict, verbose_name='用户属性映射', help_text='LDAP属性到系统属性的映射')
     timeout = models.IntegerField(default=10, verbose_name='连接超时时间(秒)')
+    sync_state = models.JSONField(default=dict, null=True, blank=True, verbose_name='用户同步状态', help_text='上次同步的变更标记及结果')
     update_time = models.DateTimeField(auto_now=True, null=True, verbose_name='更新时间')
 
     class Meta:
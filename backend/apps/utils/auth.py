@@ -1,17 +1,152 @@
 import jwt
+import time
 import logging
+import threading
 from functools import wraps
 from django.http import JsonResponse
 from django.conf import settings
+from django.core.cache import cache
 from ..models import UserToken
+from .metrics import AUTH_REQUESTS, AUTH_DURATION
 
 logger = logging.getLogger('apps')
 
+# 有效Token在本进程内的缓存时间（秒），超过后回源数据库确认是否已被吊销
+TOKEN_CACHE_TTL = getattr(settings, 'TOKEN_CACHE_TTL', 30)
+
+# 吊销状态的存储方式：local 仅本进程；cache 同时写入Django缓存，多进程部署时配合共享缓存使用
+TOKEN_REVOCATION_BACKEND = getattr(settings, 'TOKEN_REVOCATION_BACKEND', 'local')
+
+# 吊销记录在无法得知Token过期时间时的保留时长（秒）
+DEFAULT_REVOKE_TTL = 24 * 60 * 60
+
+# 本进程缓存的最大条目数，超过时清理过期条目
+MAX_LOCAL_ENTRIES = 10000
+
+
+class TokenRevokedError(jwt.InvalidTokenError):
+    """Token已被吊销（退出登录或在其他地方重新登录）"""
+
+
+class TokenRegistry:
+    """
+    Token吊销状态缓存
+
+    以jti（即UserToken.token_id）为键记录有效和已吊销的Token，登录/退出时同步更新，
+    缓存未命中时按token_id（唯一索引）回源数据库
+    """
+
+    def __init__(self, ttl, backend='local'):
+        self.ttl = ttl
+        self.shared = backend == 'cache'
+        self._active = {}   # jti -> 缓存过期时间
+        self._revoked = {}  # jti -> 吊销记录过期时间
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _shared_key(jti):
+        return f'liteops:token_revoked:{jti}'
+
+    def _prune(self, entries, now):
+        if len(entries) > MAX_LOCAL_ENTRIES:
+            for key in [key for key, expires in entries.items() if expires <= now]:
+                del entries[key]
+
+    def register(self, jti):
+        """登录时登记新的有效Token"""
+        now = time.monotonic()
+        with self._lock:
+            self._revoked.pop(jti, None)
+            self._prune(self._active, now)
+            self._active[jti] = now + self.ttl
+
+    def revoke(self, jti, exp=None):
+        """吊销Token
+
+        Args:
+            jti: Token ID
+            exp: Token的过期时间戳（UTC秒），吊销记录保留到Token过期为止
+        """
+        if not jti:
+            return
+        remaining = exp - time.time() if exp else DEFAULT_REVOKE_TTL
+        if remaining <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._active.pop(jti, None)
+            self._prune(self._revoked, now)
+            self._revoked[jti] = now + remaining
+        if self.shared:
+            try:
+                cache.set(self._shared_key(jti), 1, timeout=int(remaining) + 1)
+            except Exception as e:
+                logger.error(f'写入Token吊销缓存失败: {str(e)}', exc_info=True)
+
+    def is_active(self, jti, exp=None):
+        """判断Token是否仍然有效"""
+        now = time.monotonic()
+        with self._lock:
+            revoked_until = self._revoked.get(jti)
+            if revoked_until and revoked_until > now:
+                return False
+            active_until = self._active.get(jti)
+
+        if self.shared:
+            try:
+                if cache.get(self._shared_key(jti)):
+                    self.revoke(jti, exp)
+                    return False
+            except Exception as e:
+                logger.error(f'读取Token吊销缓存失败: {str(e)}', exc_info=True)
+
+        if active_until and active_until > now:
+            return True
+
+        # 缓存未命中或已过期，回源数据库
+        if UserToken.objects.filter(token_id=jti).exists():
+            with self._lock:
+                self._active[jti] = now + self.ttl
+            return True
+
+        self.revoke(jti, exp)
+        return False
+
+
+token_registry = TokenRegistry(TOKEN_CACHE_TTL, TOKEN_REVOCATION_BACKEND)
+
+
+def verify_token(token):
+    """
+    验证Token的签名、有效期和吊销状态
+
+    Args:
+        token: JWT Token
+    Returns:
+        dict: Token载荷
+    Raises:
+        jwt.ExpiredSignatureError: Token已过期
+        jwt.InvalidTokenError: Token无效或已被吊销
+    """
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+
+    jti = payload.get('jti')
+    if jti:
+        if not token_registry.is_active(jti, payload.get('exp')):
+            raise TokenRevokedError('Token已被吊销')
+    # 兼容升级前签发的不带jti的Token
+    elif not UserToken.objects.filter(token=token).exists():
+        raise TokenRevokedError('Token不存在')
+
+    return payload
+
+
 def jwt_auth_required(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
         token = request.headers.get('Authorization')
         if not token:
+            AUTH_REQUESTS.inc(result='missing')
             logger.info('认证失败: 未提供Token')
             return JsonResponse({
                 'code': 401,
@@ -19,28 +154,30 @@ def jwt_auth_required(view_func):
             }, status=401)
 
         try:
-            # 验证token是否存在于数据库
-            user_token = UserToken.objects.filter(token=token).first()
-            if not user_token:
-                logger.info('认证失败: Token无效')
-                return JsonResponse({
-                    'code': 401,
-                    'message': 'Token无效'
-                }, status=401)
-
-            # 解析token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            # 本地验证签名和有效期，并检查是否已被吊销
+            with AUTH_DURATION.time():
+                payload = verify_token(token)
             request.user_id = payload.get('user_id')
-            
+            AUTH_REQUESTS.inc(result='success')
+
             return view_func(request, *args, **kwargs)
 
         except jwt.ExpiredSignatureError:
+            AUTH_REQUESTS.inc(result='expired')
             logger.info('认证失败: Token已过期')
             return JsonResponse({
                 'code': 401,
                 'message': 'Token已过期'
             }, status=401)
+        except TokenRevokedError:
+            AUTH_REQUESTS.inc(result='revoked')
+            logger.info('认证失败: Token无效')
+            return JsonResponse({
+                'code': 401,
+                'message': 'Token无效'
+            }, status=401)
         except jwt.InvalidTokenError:
+            AUTH_REQUESTS.inc(result='invalid')
             logger.info('认证失败: Token格式无效')
             return JsonResponse({
                 'code': 401,
@@ -53,4 +190,4 @@ def jwt_auth_required(view_func):
                 'message': '服务器错误'
             }, status=500)
 
-    return wrapper 
\ No newline at end of file
+    return wrapper
@@ -0,0 +1,177 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from ..models import BuildStageTiming
+
+logger = logging.getLogger('apps')
+
+# 计算的分位数
+PERCENTILES = (50, 90, 99)
+
+# 判定耗时退化的阈值：近期中位数相对基线增长比例、绝对增长秒数、两侧最少样本数
+REGRESSION_RATIO = 1.2
+REGRESSION_MIN_DELTA = 10
+REGRESSION_MIN_SAMPLES = 3
+
+
+def percentile(sorted_values, percent):
+    """计算分位数（线性插值），输入需已排序"""
+    if not sorted_values:
+        return 0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(durations):
+    """汇总一组耗时，返回样本数、平均值和各分位数"""
+    values = sorted(durations)
+    summary = {
+        'count': len(values),
+        'avg': round(sum(values) / len(values), 1) if values else 0,
+        'max': round(values[-1], 1) if values else 0,
+    }
+    for percent in PERCENTILES:
+        summary[f'p{percent}'] = round(percentile(values, percent), 1)
+    return summary
+
+
+def summarize_resources(resources):
+    """汇总阶段资源占用，resources 为 [(耗时, CPU时间, 内存峰值, 读字节, 写字节)]，没有采集数据时返回None
+
+    cpu_ratio 为CPU时间与耗时之比：接近或超过1（多核并行）说明阶段受CPU限制，
+    远小于1且读写量大说明主要在等待IO，两者都小通常是在等待网络
+    """
+    if not resources:
+        return None
+    count = len(resources)
+    total_duration = sum(item[0] for item in resources)
+    total_cpu = sum(item[1] for item in resources)
+    return {
+        'count': count,
+        'avg_cpu_time': round(total_cpu / count, 2),
+        'cpu_ratio': round(total_cpu / total_duration, 2) if total_duration else 0,
+        'avg_max_rss': int(sum(item[2] or 0 for item in resources) / count),
+        'max_rss': max(item[2] or 0 for item in resources),
+        'avg_read_bytes': int(sum(item[3] or 0 for item in resources) / count),
+        'avg_write_bytes': int(sum(item[4] or 0 for item in resources) / count),
+    }
+
+
+def get_task_analytics(task_id, days=30, recent_days=7, slowest_limit=5):
+    """获取单个任务的构建耗时分析
+
+    Args:
+        task_id: 任务ID
+        days: 分析的时间范围（天）
+        recent_days: 判定退化时使用的近期窗口（天），其余时间作为基线
+        slowest_limit: 返回最慢阶段的数量
+    Returns:
+        dict: 整体耗时、按天趋势、各阶段耗时、最慢阶段和耗时退化
+    """
+    now = datetime.now()
+    start_time = now - timedelta(days=days)
+    recent_start = now - timedelta(days=recent_days)
+
+    # 只统计成功的执行，避免失败/终止时提前退出拉低耗时
+    rows = BuildStageTiming.objects.filter(
+        task_id=task_id,
+        status='success',
+        start_time__gte=start_time
+    ).values_list('timing_type', 'stage_name', 'stage_index', 'start_time', 'duration',
+                  'cpu_time', 'max_rss', 'read_bytes', 'write_bytes')
+
+    build_durations = []
+    daily_durations = defaultdict(list)
+    stage_durations = defaultdict(list)
+    stage_indexes = {}
+    stage_resources = defaultdict(list)
+    # 各指标的(基线, 近期)耗时，用于判定退化，整体构建的键为None
+    windows = defaultdict(lambda: ([], []))
+
+    for timing_type, stage_name, stage_index, row_start, duration, cpu_time, max_rss, read_bytes, write_bytes in rows:
+        is_recent = row_start >= recent_start
+        if timing_type == 'build':
+            build_durations.append(duration)
+            daily_durations[row_start.strftime('%Y-%m-%d')].append(duration)
+            key = None
+        else:
+            stage_durations[stage_name].append(duration)
+            stage_indexes[stage_name] = min(stage_index, stage_indexes.get(stage_name, stage_index))
+            if cpu_time is not None:
+                stage_resources[stage_name].append((duration, cpu_time, max_rss, read_bytes, write_bytes))
+            key = stage_name
+        windows[key][1 if is_recent else 0].append(duration)
+
+    build_summary = summarize(build_durations)
+    total_p50 = build_summary['p50']
+
+    stages = []
+    for stage_name, durations in stage_durations.items():
+        summary = summarize(durations)
+        summary['name'] = stage_name
+        summary['index'] = stage_indexes[stage_name]
+        # 阶段中位数占整次构建中位数的比例
+        summary['share'] = round(summary['p50'] / total_p50 * 100, 1) if total_p50 else 0
+        summary['resources'] = summarize_resources(stage_resources[stage_name])
+        stages.append(summary)
+    stages.sort(key=lambda item: item['index'])
+
+    slowest_stages = sorted(stages, key=lambda item: item['p50'], reverse=True)[:slowest_limit]
+
+    trend = []
+    for date in sorted(daily_durations):
+        summary = summarize(daily_durations[date])
+        summary['date'] = date
+        trend.append(summary)
+
+    regressions = []
+    for key, (baseline, recent) in windows.items():
+        if len(baseline) < REGRESSION_MIN_SAMPLES or len(recent) < REGRESSION_MIN_SAMPLES:
+            continue
+        baseline_p50 = percentile(sorted(baseline), 50)
+        recent_p50 = percentile(sorted(recent), 50)
+        delta = recent_p50 - baseline_p50
+        if baseline_p50 > 0 and recent_p50 / baseline_p50 >= REGRESSION_RATIO and delta >= REGRESSION_MIN_DELTA:
+            regressions.append({
+                'type': 'build' if key is None else 'stage',
+                'name': key or '整体构建',
+                'baseline_p50': round(baseline_p50, 1),
+                'recent_p50': round(recent_p50, 1),
+                'delta': round(delta, 1),
+                'ratio': round(recent_p50 / baseline_p50, 2),
+            })
+    regressions.sort(key=lambda item: item['delta'], reverse=True)
+
+    return {
+        'build': build_summary,
+        'trend': trend,
+        'stages': stages,
+        'slowest_stages': slowest_stages,
+        'regressions': regressions,
+    }
+
+
+def get_tasks_summary(task_ids, days=30):
+    """获取多个任务的整体构建耗时分位数
+
+    Args:
+        task_ids: 任务ID列表
+        days: 分析的时间范围（天）
+    Returns:
+        dict: 任务ID -> 耗时汇总
+    """
+    rows = BuildStageTiming.objects.filter(
+        task_id__in=task_ids,
+        timing_type='build',
+        status='success',
+        start_time__gte=datetime.now() - timedelta(days=days)
+    ).values_list('task_id', 'duration')
+
+    durations = defaultdict(list)
+    for task_id, duration in rows:
+        durations[task_id].append(duration)
+    return {task_id: summarize(values) for task_id, values in durations.items()}
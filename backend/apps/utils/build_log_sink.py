@@ -0,0 +1,217 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from logging.handlers import QueueListener
+from pathlib import Path
+from django.conf import settings
+from .metrics import registry
+
+# 是否将构建日志按任务写入文件（BUILD_LOG_FILE_DIR/<task_id>.log）
+BUILD_LOG_FILE_ENABLED = getattr(settings, 'BUILD_LOG_FILE_ENABLED', True)
+BUILD_LOG_FILE_DIR = getattr(settings, 'BUILD_LOG_FILE_DIR', Path(settings.BASE_DIR) / 'logs' / 'builds')
+BUILD_LOG_FILE_MAX_BYTES = getattr(settings, 'BUILD_LOG_FILE_MAX_BYTES', 1024 * 1024 * 20)
+BUILD_LOG_FILE_BACKUP_COUNT = getattr(settings, 'BUILD_LOG_FILE_BACKUP_COUNT', 3)
+# 构建日志输出到控制台的采样间隔：每N行输出1行，0表示不输出，1表示全部输出
+BUILD_LOG_CONSOLE_SAMPLE_RATE = getattr(settings, 'BUILD_LOG_CONSOLE_SAMPLE_RATE', 0)
+# 待写入的构建日志队列长度，写入速度跟不上时丢弃新日志，不阻塞构建线程
+BUILD_LOG_SINK_QUEUE_SIZE = getattr(settings, 'BUILD_LOG_SINK_QUEUE_SIZE', 10000)
+
+# 同时打开的任务日志文件数
+MAX_OPEN_FILES = 32
+
+BUILD_LOG_SINK_DROPPED = registry.counter('liteops_build_log_sink_dropped_total', '队列已满被丢弃的构建日志文件/控制台输出行数')
+
+
+class BuildLogFormatter(logging.Formatter):
+    """[时间] #构建号 日志，同一秒内的日志复用格式化好的时间"""
+
+    def __init__(self):
+        super().__init__()
+        self._second = None
+        self._asctime = ''
+
+    def format(self, record):
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._asctime = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        return f'[{self._asctime}] #{record.build_number} {record.msg}'
+
+
+class TaskLogFile:
+    """单个任务的日志文件，按写入的字节数判断是否轮转（不像 RotatingFileHandler 每条日志都 seek 和格式化两次），
+    写入有缓冲，由 flush() 统一刷新"""
+
+    def __init__(self, path, max_bytes, backup_count):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = open(path, 'ab')
+        self.size = self.file.tell()
+
+    def write(self, text):
+        data = (text + '\n').encode('utf-8', 'replace')
+        if self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.size += len(data)
+
+    def rotate(self):
+        """<task_id>.log -> <task_id>.log.1 -> ... -> <task_id>.log.N"""
+        self.file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+            self.file = open(self.path, 'ab')
+        else:
+            self.file = open(self.path, 'wb')
+        self.size = 0
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class PerTaskFileHandler(logging.Handler):
+    """按任务写入独立的日志文件，每个文件单独按大小轮转，只保持最近使用的若干个文件打开"""
+
+    def __init__(self, directory, max_bytes, backup_count):
+        super().__init__()
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._files = OrderedDict()
+
+    def _get_file(self, task_id):
+        log_file = self._files.get(task_id)
+        if log_file is not None:
+            self._files.move_to_end(task_id)
+            return log_file
+        if len(self._files) >= MAX_OPEN_FILES:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        log_file = self._files[task_id] = TaskLogFile(
+            str(self.directory / f'{task_id}.log'), self.max_bytes, self.backup_count
+        )
+        return log_file
+
+    def emit(self, record):
+        try:
+            self._get_file(record.task_id).write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        for log_file in self._files.values():
+            try:
+                log_file.flush()
+            except OSError:
+                pass
+
+    def close(self):
+        for log_file in self._files.values():
+            log_file.close()
+        self._files.clear()
+        super().close()
+
+
+class BuildLogListener(QueueListener):
+    """队列处理完时才刷新文件缓冲，连续输出时批量写入磁盘"""
+
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+    def enqueue_sentinel(self):
+        # 停止时队列可能已满，等待后台线程腾出空间
+        self.queue.put(self._sentinel)
+
+
+class SampledConsoleHandler(logging.StreamHandler):
+    """每 rate 条日志输出一条到控制台"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._count = 0
+
+    def emit(self, record):
+        self._count += 1
+        if self._count >= self.rate:
+            self._count = 0
+            super().emit(record)
+
+
+class BuildLogSink:
+    """
+    构建日志的文件/控制台输出
+
+    构建日志不再经过应用日志（apps）的控制台和 django.log 处理器，而是写入独立的队列，
+    由后台线程（QueueListener）按任务写入文件、按采样率输出到控制台；
+    构建线程只创建日志记录并入队（不经过 Logger，省去调用栈查找和处理器加锁），队列已满时丢弃
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._listener = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        handlers = []
+        if BUILD_LOG_FILE_ENABLED:
+            file_handler = PerTaskFileHandler(BUILD_LOG_FILE_DIR, BUILD_LOG_FILE_MAX_BYTES, BUILD_LOG_FILE_BACKUP_COUNT)
+            file_handler.setFormatter(BuildLogFormatter())
+            handlers.append(file_handler)
+        if BUILD_LOG_CONSOLE_SAMPLE_RATE > 0:
+            console_handler = SampledConsoleHandler(BUILD_LOG_CONSOLE_SAMPLE_RATE)
+            console_handler.setFormatter(logging.Formatter('[{task_id}#{build_number}] {message}', style='{'))
+            handlers.append(console_handler)
+
+        if handlers:
+            self._queue = queue.Queue(BUILD_LOG_SINK_QUEUE_SIZE)
+            self._listener = BuildLogListener(self._queue, *handlers)
+            self._listener.start()
+            atexit.register(self.stop)
+        self._started = True
+
+    def emit(self, task_id, build_number, message):
+        """写入一行构建日志"""
+        if not self._started:
+            with self._lock:
+                if not self._started:
+                    self._start()
+        if self._queue is None:
+            return
+        record = logging.LogRecord('liteops.build', logging.INFO, '', 0, message, None, None)
+        record.task_id = task_id
+        record.build_number = build_number
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            BUILD_LOG_SINK_DROPPED.inc()
+
+    def stop(self):
+        """停止后台线程并写完队列中剩余的日志"""
+        with self._lock:
+            self._queue = None
+            if self._listener is not None:
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+                self._listener = None
+
+
+build_log_sink = BuildLogSink()
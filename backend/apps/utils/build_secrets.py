@@ -0,0 +1,59 @@
+import re
+import logging
+from urllib.parse import quote
+from django.conf import settings
+from ..models import GitlabTokenCredential, SSHKeyCredential, KubeconfigCredential
+
+logger = logging.getLogger('apps')
+
+# 短于该长度的密文不脱敏，避免把日志中的普通单词替换掉
+BUILD_LOG_SECRET_MIN_LENGTH = getattr(settings, 'BUILD_LOG_SECRET_MIN_LENGTH', 6)
+
+# Kubeconfig 中的敏感字段
+KUBECONFIG_SECRET_PATTERN = re.compile(
+    r'^\s*(?:token|client-key-data|password|client-secret)\s*:\s*["\']?([^\s"\']+)', re.M
+)
+
+
+def _credential_secrets():
+    """所有凭证中的密文：GitLab Token、SSH私钥密码、Kubeconfig中的Token和私钥"""
+    secrets = list(GitlabTokenCredential.objects.exclude(token__isnull=True).values_list('token', flat=True))
+    secrets.extend(SSHKeyCredential.objects.exclude(passphrase__isnull=True).values_list('passphrase', flat=True))
+    for content in KubeconfigCredential.objects.exclude(kubeconfig_content__isnull=True).values_list(
+            'kubeconfig_content', flat=True):
+        secrets.extend(KUBECONFIG_SECRET_PATTERN.findall(content))
+    return secrets
+
+
+def _parameter_secrets(task, parameter_values):
+    """标记为敏感的构建参数的取值"""
+    sensitive = {param.get('name') for param in task.parameters or [] if param.get('sensitive')}
+    secrets = []
+    for name, values in (parameter_values or {}).items():
+        if name in sensitive:
+            secrets.extend(values)
+            # 多选参数以逗号拼接后导出为环境变量
+            secrets.append(','.join(values))
+    return secrets
+
+
+def collect_build_secrets(task, parameter_values=None):
+    """收集构建日志中需要脱敏的密文
+
+    凭证Token会拼接到克隆地址中，敏感参数会导出为环境变量，都可能通过 set -x 或错误信息出现在日志中；
+    同时加入URL编码后的形式
+    """
+    try:
+        secrets = _credential_secrets() + _parameter_secrets(task, parameter_values)
+    except Exception as e:
+        logger.error(f"加载构建日志脱敏密文失败: {str(e)}", exc_info=True)
+        return set()
+
+    result = set()
+    for secret in secrets:
+        secret = str(secret).strip()
+        if len(secret) < BUILD_LOG_SECRET_MIN_LENGTH:
+            continue
+        result.add(secret)
+        result.add(quote(secret, safe=''))
+    return result
@@ -1,12 +1,33 @@
 import os
+import signal
 import subprocess
 import logging
 import time
 import tempfile
 from typing import List, Dict, Any, Callable
+from django.conf import settings
+from .metrics import BUILD_STAGE_DURATION
+from .proc_stats import ProcessTreeSampler, has_exited
 
 logger = logging.getLogger('apps')
 
+# 终止脚本时发送SIGTERM后等待进程退出的时间（秒），超时后发送SIGKILL
+BUILD_KILL_GRACE_PERIOD = getattr(settings, 'BUILD_KILL_GRACE_PERIOD', 10)
+
+def get_stage_timeout(stage: Dict[str, Any]):
+    """阶段超时时间（秒），阶段配置中 timeout 的单位为分钟，未配置或无效时返回None"""
+    try:
+        timeout = float(stage.get('timeout') or 0)
+    except (TypeError, ValueError):
+        return None
+    return timeout * 60 if timeout > 0 else None
+
+
+def format_timeout(seconds: float) -> str:
+    minutes = seconds / 60
+    return f"{minutes:g}分钟" if minutes >= 1 else f"{int(seconds)}秒"
+
+
 class BuildStageExecutor:
     """构建阶段执行器"""
 
@@ -22,6 +43,8 @@ class BuildStageExecutor:
         self.send_log = send_log
         self.record_time = record_time
         self.env = {} # 初始化为空字典，将由 Builder 设置
+        self.stage_resources = None  # 当前阶段脚本进程的资源占用
+        self.cgroup = None  # 构建的cgroup（未启用资源限制时为None），由 Builder 设置
 
         # 用于存储临时变量文件的路径
         self.vars_file = os.path.join(self.build_path, '.build_vars')
@@ -191,23 +214,59 @@ class BuildStageExecutor:
             self.send_log(f"创建临时脚本文件失败: {str(e)}", stage_name)
             return None
 
-    def _execute_script_unified(self, script_path: str, stage_name: str, check_termination: Callable = None) -> bool:
+    def _kill_process_group(self, process, stage_name: str):
+        """终止脚本进程组：先发送SIGTERM，等待 BUILD_KILL_GRACE_PERIOD 秒后对仍在运行的进程发送SIGKILL
+
+        脚本在独立的会话中运行，进程组包含脚本启动的所有子孙进程（docker、java等），
+        自行调用setsid脱离进程组的进程在构建结束时由cgroup清理（启用资源限制时）
+        """
+        try:
+            pgid = os.getpgid(process.pid)
+        except ProcessLookupError:
+            pgid = process.pid
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        try:
+            process.wait(timeout=BUILD_KILL_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            self.send_log(f"脚本进程在 {BUILD_KILL_GRACE_PERIOD} 秒内未退出，强制终止", stage_name)
+        # 脚本进程退出后，进程组中可能仍有忽略SIGTERM的子进程
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+    def _execute_script_unified(self, script_path: str, stage_name: str, check_termination: Callable = None,
+                                timeout: float = None) -> bool:
+        """执行脚本并实时输出日志
+        Args:
+            timeout: 阶段超时时间（秒），为空时不限制
+        """
         try:
             # 检查是否应该终止
             if check_termination and check_termination():
                 self.send_log("构建已被终止，跳过脚本执行", stage_name)
                 return False
 
+            command = ['/bin/bash', script_path]
+            if self.cgroup:
+                command = self.cgroup.wrap_command(command)
+
             # 执行脚本，合并stdout和stderr到同一个流，保持输出顺序
             process = subprocess.Popen(
-                ['/bin/bash', script_path],
+                command,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,  # 将stderr重定向到stdout，保持输出顺序
                 cwd=self.build_path,
                 env=self.env,
                 universal_newlines=True,
-                bufsize=1  # 行缓冲，确保输出能够实时获取
+                bufsize=1,  # 行缓冲，确保输出能够实时获取
+                start_new_session=True  # 独立的会话和进程组，终止时可以结束所有子孙进程
             )
+            deadline = time.monotonic() + timeout if timeout else None
 
             # 实时读取并发送输出
             import fcntl
@@ -218,12 +277,26 @@ class BuildStageExecutor:
             fl = fcntl.fcntl(fd, fcntl.F_GETFL)
             fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
 
+            # 采样脚本进程树的资源占用
+            sampler = ProcessTreeSampler(process.pid)
+            self.stage_resources = sampler.result()
+
             # 持续读取直到进程结束
-            while process.poll() is None:
+            while not has_exited(process.pid):
+                sampler.maybe_sample()
+
                 # 检查是否终止
                 if check_termination and check_termination():
-                    process.terminate()
                     self.send_log("构建已被终止，停止当前脚本", stage_name)
+                    self._kill_process_group(process, stage_name)
+                    self.stage_resources = sampler.result()
+                    return False
+
+                # 检查阶段是否超时
+                if deadline and time.monotonic() >= deadline:
+                    self.send_log(f"阶段执行超时（{format_timeout(timeout)}），停止当前脚本", stage_name)
+                    self._kill_process_group(process, stage_name)
+                    self.stage_resources = sampler.result()
                     return False
 
                 try:
@@ -235,6 +308,11 @@ class BuildStageExecutor:
                     time.sleep(0.01)
                     continue
 
+            # 进程已退出但尚未回收，此时做最后一次采样
+            sampler.sample()
+            self.stage_resources = sampler.result()
+            process.wait()
+
             remaining_output = process.stdout.read()
             if remaining_output:
                 for line in remaining_output.splitlines():
@@ -246,6 +324,8 @@ class BuildStageExecutor:
 
             if not success:
                 self.send_log(f"脚本执行失败，返回码: {process.returncode}", stage_name)
+            if self.cgroup and self.cgroup.new_oom_kills():
+                self.send_log("有进程因超出内存上限被终止（OOM），请检查内存占用或调整资源限制", stage_name)
 
             return success
 
@@ -279,13 +359,15 @@ class BuildStageExecutor:
 
             # 记录阶段开始时间
             stage_start_time = time.time()
+            self.stage_resources = None
 
             # 执行脚本
             success = self._execute_inline_script(stage, check_termination)
 
-            # 记录阶段耗时
+            # 记录阶段耗时和资源占用
             stage_duration = time.time() - stage_start_time
-            self.record_time(stage_name, stage_start_time, stage_duration)
+            self.record_time(stage_name, stage_start_time, stage_duration, success, self.stage_resources)
+            BUILD_STAGE_DURATION.observe(stage_duration, status='success' if success else 'failed')
 
             return success
 
@@ -315,7 +397,9 @@ class BuildStageExecutor:
                 return False
 
             # 脚本执行方法
-            success = self._execute_script_unified(script_path, stage_name, check_termination)
+            success = self._execute_script_unified(
+                script_path, stage_name, check_termination, timeout=get_stage_timeout(stage)
+            )
             
             return success
 
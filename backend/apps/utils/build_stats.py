@@ -0,0 +1,163 @@
+import logging
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Sum
+from ..models import BuildStatsRollup
+
+logger = logging.getLogger('apps')
+
+# 构建耗时分布的分档上限（秒），最后额外一档表示超过3600秒
+DURATION_BUCKETS = [30, 60, 120, 300, 600, 1200, 1800, 3600]
+
+# 会计入统计的构建最终状态
+FINAL_STATUSES = ('success', 'failed', 'terminated')
+
+# 支持的统计粒度
+PERIODS = ('hour', 'day')
+
+STATUS_FIELDS = {
+    'success': 'success_count',
+    'failed': 'failed_count',
+    'terminated': 'terminated_count',
+}
+
+
+def truncate_time(value, period):
+    """将时间截断到统计时间段的起点"""
+    if period == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_bucket_index(duration):
+    """获取耗时所属的分档下标"""
+    for index, upper in enumerate(DURATION_BUCKETS):
+        if duration <= upper:
+            return index
+    return len(DURATION_BUCKETS)
+
+
+def parse_duration(build_time):
+    """从构建时间信息中解析总耗时（秒），没有则返回None"""
+    if not build_time or 'total_duration' not in build_time:
+        return None
+    try:
+        return int(build_time['total_duration'])
+    except (TypeError, ValueError):
+        return None
+
+
+def empty_histogram():
+    return [0] * (len(DURATION_BUCKETS) + 1)
+
+
+def apply_result(row, status, duration, count=1):
+    """将一次（或多次相同的）构建结果累加到汇总行上"""
+    row.total_count += count
+    status_field = STATUS_FIELDS.get(status)
+    if status_field:
+        setattr(row, status_field, getattr(row, status_field) + count)
+
+    if duration is not None:
+        histogram = list(row.duration_histogram or []) or empty_histogram()
+        histogram[get_bucket_index(duration)] += count
+        row.duration_histogram = histogram
+        row.duration_sum += duration * count
+        row.duration_count += count
+
+
+def record_build_result(history):
+    """构建结束后更新小时/天两个粒度的汇总统计
+
+    Args:
+        history: 已结束的构建历史记录
+    """
+    try:
+        if history.status not in FINAL_STATUSES:
+            return
+
+        task = history.task
+        occurred_at = history.create_time or datetime.now()
+        duration = parse_duration(history.build_time)
+
+        for period in PERIODS:
+            with transaction.atomic():
+                row, created = BuildStatsRollup.objects.select_for_update().get_or_create(
+                    period=period,
+                    bucket_time=truncate_time(occurred_at, period),
+                    task_id=task.task_id,
+                    defaults={
+                        'project_id': task.project_id,
+                        'environment_id': task.environment_id,
+                        'duration_histogram': empty_histogram(),
+                    }
+                )
+                apply_result(row, history.status, duration)
+                row.save()
+    except Exception as e:
+        logger.error(f"更新构建统计汇总失败: {str(e)}", exc_info=True)
+
+
+def aggregate_rollups(period, start_time, end_time=None, **filters):
+    """汇总指定时间段内的统计行
+
+    Args:
+        period: 统计粒度 hour/day
+        start_time: 起始时间（包含）
+        end_time: 结束时间（不包含），为空表示至今
+        filters: 额外过滤条件，如 task_id、project_id、environment_id
+    Returns:
+        dict: 各计数字段的合计
+    """
+    queryset = BuildStatsRollup.objects.filter(
+        period=period,
+        bucket_time__gte=truncate_time(start_time, period),
+        **filters
+    )
+    if end_time:
+        queryset = queryset.filter(bucket_time__lt=end_time)
+
+    totals = queryset.aggregate(
+        total_count=Sum('total_count'),
+        success_count=Sum('success_count'),
+        failed_count=Sum('failed_count'),
+        terminated_count=Sum('terminated_count'),
+        duration_sum=Sum('duration_sum'),
+        duration_count=Sum('duration_count'),
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def get_daily_series(start_date, end_date, group_by=None, **filters):
+    """按天读取汇总数据
+
+    Args:
+        start_date: 开始日期（包含）
+        end_date: 结束日期（包含）
+        group_by: 额外分组字段，可选 task_id、project_id、environment_id
+        filters: 额外过滤条件
+    Returns:
+        list: 每个(日期, 分组)一条的合计数据
+    """
+    start_time = datetime.combine(start_date, datetime.min.time())
+    end_time = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+    group_fields = ['bucket_time']
+    if group_by:
+        group_fields.append(group_by)
+
+    rows = BuildStatsRollup.objects.filter(
+        period='day',
+        bucket_time__gte=start_time,
+        bucket_time__lt=end_time,
+        **filters
+    ).values(*group_fields).annotate(
+        total=Sum('total_count'),
+        success=Sum('success_count'),
+        failed=Sum('failed_count'),
+        terminated=Sum('terminated_count'),
+        duration_sum=Sum('duration_sum'),
+        duration_count=Sum('duration_count'),
+    ).order_by(*group_fields)
+
+    return list(rows)
@@ -1,25 +1,42 @@
 import os
+import signal
 import logging
 import time
 import subprocess
 import tempfile
-import re
 import shutil
 from datetime import datetime
 from pathlib import Path
 from django.conf import settings
-from git import Repo
+from git import Git
 from git.exc import GitCommandError
-from .build_stages import BuildStageExecutor
+from .build_stages import BuildStageExecutor, format_timeout
 from .notifier import BuildNotifier
 from .log_stream import log_stream_manager
+from .log_filters import LogFilterPipeline
+from .build_log_sink import build_log_sink
+from .build_secrets import collect_build_secrets
+from .build_stats import record_build_result
+from .log_codec import compress_history_log, BUILD_LOG_COMPRESS_ENABLED
+from .log_search import build_log_index, BUILD_LOG_SEARCH_ENABLED
+from .cgroups import cgroup_manager, get_resource_limits, describe_limits, BUILD_CGROUP_ENABLED
+from .metrics import BUILDS_STARTED, BUILDS_FINISHED, BUILDS_RUNNING, BUILD_DURATION, BUILD_LOG_LINES, BUILD_LOG_SAVE_DURATION
 from django.db.models import F
-from ..models import BuildTask, BuildHistory
+from ..models import BuildTask, BuildHistory, BuildStageTiming
 # from ..utils.builder import Builder
 # from ..utils.crypto import decrypt_sensitive_data
 
 logger = logging.getLogger('apps')
 
+# 任务未配置构建超时时间时使用的默认值（分钟），0表示不限制
+BUILD_DEFAULT_TIMEOUT = getattr(settings, 'BUILD_DEFAULT_TIMEOUT', 0)
+# HTTP 克隆的传输速度低于 GIT_HTTP_LOW_SPEED_LIMIT（字节/秒）持续 GIT_HTTP_LOW_SPEED_TIME 秒时中止，
+# 未配置构建超时时，连接挂起的克隆也不会一直等待
+GIT_HTTP_LOW_SPEED_LIMIT = getattr(settings, 'GIT_HTTP_LOW_SPEED_LIMIT', 1000)
+GIT_HTTP_LOW_SPEED_TIME = getattr(settings, 'GIT_HTTP_LOW_SPEED_TIME', 300)
+# 克隆期间检查构建是否被终止或超时的间隔（秒）
+GIT_CLONE_CHECK_INTERVAL = 5
+
 class Builder:
     def __init__(self, task, build_number, commit_id, history):
         self.task = task
@@ -27,6 +44,10 @@ class Builder:
         self.commit_id = commit_id
         self.history = history  # 构建历史记录
         self.log_buffer = []  # 缓存日志
+        self.log_filter = self._create_log_filter()
+        self.cgroup = None  # 构建的cgroup，启用资源限制时创建
+        self.deadline = None  # 构建超时的时间点（time.monotonic），开始执行时设置
+        self.timed_out = False
 
         # 检查是否已有指定的版本号
         if self.history.version:
@@ -55,8 +76,21 @@ class Builder:
         # 创建实时日志流
         log_stream_manager.create_build_stream(self.task.task_id, self.build_number)
 
+    def _get_build_timeout(self):
+        """构建超时时间（分钟），任务未配置时使用默认值，0表示不限制"""
+        if self.task.build_timeout is None:
+            return BUILD_DEFAULT_TIMEOUT
+        return self.task.build_timeout
+
     def check_if_terminated(self):
-        """检查构建是否已被终止"""
+        """检查构建是否已被终止或已超时"""
+        if self.deadline and time.monotonic() >= self.deadline:
+            if not self.timed_out:
+                self.timed_out = True
+                timeout = self._get_build_timeout() * 60
+                self.send_log(f"构建执行超时（{format_timeout(timeout)}），停止后续步骤", "System")
+            return True
+
         # 从数据库重新加载构建历史记录，以获取最新状态
         try:
             history_record = BuildHistory.objects.get(history_id=self.history.history_id)
@@ -69,24 +103,15 @@ class Builder:
             logger.error(f"检查构建状态时出错: {str(e)}", exc_info=True)
             return False
 
-    def _filter_maven_progress(self, message):
-        # 只过滤Maven下载进度信息中的Progress()部分
-        if 'Progress (' in message and ('KB' in message or 'MB' in message or 'B/s' in message):
-            return None
-
-        # 过滤Maven下载进度条
-        if re.match(r'^Progress \(\d+\): .+', message.strip()):
-            return None
-
-        # 过滤空的进度行
-        if re.match(r'^\s*Progress\s*$', message.strip()):
-            return None
-
-        # 过滤下载进度百分比
-        if re.match(r'^\s*\d+%\s*$', message.strip()):
-            return None
-
-        return message
+    def _create_log_filter(self):
+        """按任务配置创建日志过滤管道，配置无效时使用默认配置；凭证和敏感参数在所有日志输出前脱敏"""
+        try:
+            log_filter = LogFilterPipeline.from_config(self.task.log_filters)
+        except Exception as e:
+            logger.error(f"任务 {self.task.name} 的日志过滤配置无效，使用默认配置: {str(e)}")
+            log_filter = LogFilterPipeline.from_config(None)
+        log_filter.set_secrets(collect_build_secrets(self.task, self.history.parameter_values))
+        return log_filter
 
     def send_log(self, message, stage=None, console_only=False, raw_output=False):
         """发送日志到缓存、实时流和控制台
@@ -96,11 +121,16 @@ class Builder:
             console_only: 是否只输出到控制台（保留参数兼容性）
             raw_output: 是否为原始输出（不添加阶段标记）
         """
-        # 过滤Maven Progress信息
-        filtered_message = self._filter_maven_progress(message)
-        if filtered_message is None:
-            return  # 跳过被过滤的消息
+        # 经过日志过滤管道（丢弃、进度行合并、脱敏、截断）
+        for line, (line_stage, line_raw) in self.log_filter.process(message, (stage, raw_output)):
+            self._write_log(line, line_stage, line_raw)
+
+    def _flush_log_filter(self):
+        """输出日志过滤管道中暂存的进度行"""
+        for line, (stage, raw_output) in self.log_filter.flush():
+            self._write_log(line, stage, raw_output)
 
+    def _write_log(self, filtered_message, stage=None, raw_output=False):
         # 格式化消息
         if raw_output:
             formatted_message = filtered_message
@@ -113,6 +143,7 @@ class Builder:
 
         # 缓存日志
         self.log_buffer.append(formatted_message)
+        BUILD_LOG_LINES.inc()
 
         # 推送到实时日志流
         try:
@@ -140,26 +171,43 @@ class Builder:
             if should_update_db:
                 current_log = '\n'.join(self.log_buffer)
                 self.history.build_log = current_log
-                self.history.save(update_fields=['build_log'])
+                with BUILD_LOG_SAVE_DURATION.time():
+                    self.history.save(update_fields=['build_log'])
                 self._last_db_update = time.time()
         except Exception as e:
             logger.error(f"批量更新构建日志失败: {str(e)}", exc_info=True)
 
-        # 输出到控制台 - 确保构建日志在控制台显示
-        logger.info(formatted_message, extra={
-            'from_builder': True,  # 添加标记以区分构建日志
-            'task_id': self.task.task_id,
-            'build_number': self.build_number
-        })
+        # 写入按任务区分的构建日志文件（及采样输出到控制台），由后台线程完成，不经过应用日志
+        build_log_sink.emit(self.task.task_id, self.build_number, formatted_message)
 
     def _save_build_log(self):
         """保存构建日志到历史记录"""
+        self._flush_log_filter()
         try:
             self.history.build_log = '\n'.join(self.log_buffer)
-            self.history.save(update_fields=['build_log'])
+            with BUILD_LOG_SAVE_DURATION.time():
+                self.history.save(update_fields=['build_log'])
         except Exception as e:
             logger.error(f"保存构建日志失败: {str(e)}", exc_info=True)
 
+    def _compress_build_log(self):
+        """压缩已结束构建的日志"""
+        if not BUILD_LOG_COMPRESS_ENABLED:
+            return
+        try:
+            compress_history_log(self.history)
+        except Exception as e:
+            logger.error(f"压缩构建日志失败: {str(e)}", exc_info=True)
+
+    def _index_build_log(self):
+        """将已结束构建的日志写入全文检索索引，直接使用内存中的日志，不必解压"""
+        if not BUILD_LOG_SEARCH_ENABLED:
+            return
+        try:
+            build_log_index.index(self.history, '\n'.join(self.log_buffer).split('\n'))
+        except Exception as e:
+            logger.error(f"写入构建日志索引失败: {str(e)}", exc_info=True)
+
     def clone_repository(self):
         """克隆Git仓库"""
         try:
@@ -191,16 +239,8 @@ class Builder:
             self.send_log(f"克隆分支: {branch}", "Git Clone")
             self.send_log("正在克隆代码，请稍候...", "Git Clone")
 
-            # 克隆指定分支的代码
-            Repo.clone_from(
-                repository,
-                str(self.build_path),
-                branch=branch,
-                progress=self.git_progress
-            )
-
-            # 检查构建是否已被终止
-            if self.check_if_terminated():
+            # 克隆指定分支的代码，构建被终止或超时时结束克隆
+            if not self._git_clone(repository, str(self.build_path), branch):
                 return False
 
             # 验证克隆是否成功
@@ -219,14 +259,45 @@ class Builder:
             self.send_log(f"发生错误: {str(e)}", "Git Clone")
             return False
 
-    def git_progress(self, op_code, cur_count, max_count=None, message=''):
-        """Git进度回调"""
-        # 每秒检查一次构建是否已被终止
-        if int(time.time()) % 5 == 0:  # 每5秒检查一次
-            if self.check_if_terminated():
-                # 如果构建已被终止，尝试引发异常停止Git克隆
-                raise Exception("Build terminated")
-        pass
+    def _git_clone(self, url, directory, branch):
+        """克隆指定分支，每隔 GIT_CLONE_CHECK_INTERVAL 秒检查一次构建是否被终止或超时，是则结束 git 进程
+
+        Returns:
+            bool: 克隆是否完成，构建被终止或超时时返回 False
+        Raises:
+            GitCommandError: git clone 执行失败
+        """
+        Git.check_unsafe_protocols(url)
+        command = ['git', 'clone', '--branch', branch, '--', url, directory]
+        env = dict(
+            os.environ,
+            GIT_TERMINAL_PROMPT='0',  # 凭证无效时直接失败，不等待输入
+            GIT_HTTP_LOW_SPEED_LIMIT=str(GIT_HTTP_LOW_SPEED_LIMIT),
+            GIT_HTTP_LOW_SPEED_TIME=str(GIT_HTTP_LOW_SPEED_TIME)
+        )
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            env=env,
+            universal_newlines=True,
+            start_new_session=True  # 独立的进程组，结束时包括 git-remote-https 等子进程
+        )
+        while True:
+            try:
+                _, stderr = process.communicate(timeout=GIT_CLONE_CHECK_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if self.check_if_terminated():
+                    try:
+                        os.killpg(process.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    process.communicate()
+                    return False
+        if process.returncode != 0:
+            raise GitCommandError(command, process.returncode, stderr)
+        return True
 
     def clone_external_scripts(self):
         """克隆外部脚本库"""
@@ -298,16 +369,8 @@ class Builder:
             # 克隆外部脚本库
             self.send_log("正在克隆外部脚本库，请稍候...", "External Scripts")
 
-            from git import Repo
-            # 使用指定分支克隆
-            Repo.clone_from(
-                repo_url,
-                directory,
-                branch=branch
-            )
-
-            # 再次检查构建是否已被终止
-            if self.check_if_terminated():
+            # 使用指定分支克隆，构建被终止或超时时结束克隆
+            if not self._git_clone(repo_url, directory, branch):
                 return False
 
             # 验证克隆是否成功
@@ -348,6 +411,11 @@ class Builder:
         """执行构建"""
         build_start_time = time.time()
         success = False # 初始化成功状态
+        BUILDS_STARTED.inc()
+        BUILDS_RUNNING.inc()
+        build_timeout = self._get_build_timeout()
+        if build_timeout:
+            self.deadline = time.monotonic() + build_timeout * 60
         try:
             # 在开始构建前检查构建是否已被终止
             if self.check_if_terminated():
@@ -377,10 +445,12 @@ class Builder:
                     return False
 
                 # 记录代码克隆阶段的时间
+                clone_duration = time.time() - clone_start_time
+                self._save_stage_timing('Git Clone', clone_start_time, clone_duration)
                 self.build_time['stages_time'].append({
                     'name': 'Git Clone',
                     'start_time': datetime.fromtimestamp(clone_start_time).strftime('%Y-%m-%d %H:%M:%S'),
-                    'duration': str(int(time.time() - clone_start_time))
+                    'duration': str(int(clone_duration))
                 })
             else:
                 # 预发布/生产环境使用版本模式，不克隆代码
@@ -406,10 +476,12 @@ class Builder:
 
             # 记录外部脚本库克隆阶段的时间（如果启用了外部脚本库）
             if self.task.use_external_script:
+                external_script_duration = time.time() - external_script_start_time
+                self._save_stage_timing('External Scripts Clone', external_script_start_time, external_script_duration)
                 self.build_time['stages_time'].append({
                     'name': 'External Scripts Clone',
                     'start_time': datetime.fromtimestamp(external_script_start_time).strftime('%Y-%m-%d %H:%M:%S'),
-                    'duration': str(int(time.time() - external_script_start_time))
+                    'duration': str(int(external_script_duration))
                 })
 
             # 检查构建是否已被终止
@@ -424,6 +496,7 @@ class Builder:
                 lambda msg, stage=None, raw_output=False: self.send_log(msg, stage, raw_output=raw_output),
                 self._record_stage_time
             )
+            stage_executor.cgroup = self._create_cgroup()
 
             # 设置系统内置环境变量
             system_variables = {
@@ -491,6 +564,9 @@ class Builder:
             success = False
             return False
         finally:
+            BUILDS_RUNNING.dec()
+            self._destroy_cgroup()
+
             # 更新构建统计和时间信息
             self._update_build_stats(success)
             self._update_build_time(build_start_time, success)
@@ -506,6 +582,15 @@ class Builder:
             # 确保构建完成状态日志也保存到数据库
             self._save_build_log()
 
+            BUILDS_FINISHED.inc(status=final_status)
+            BUILD_DURATION.observe(time.time() - build_start_time, status=final_status)
+
+            # 已结束构建的日志压缩保存
+            self._compress_build_log()
+
+            # 更新构建统计汇总
+            record_build_result(self.history)
+
             # 通知日志流管理器构建完成
             try:
                 log_stream_manager.complete_build(
@@ -520,18 +605,52 @@ class Builder:
             notifier = BuildNotifier(self.history)
             notifier.send_notifications()
 
-    def _record_stage_time(self, stage_name: str, start_time: float, duration: float):
+            # 已结束构建的日志写入全文检索索引
+            self._index_build_log()
+
+    def _create_cgroup(self):
+        """为构建创建cgroup并应用资源限制，未启用或cgroup不可用时返回None"""
+        if not BUILD_CGROUP_ENABLED:
+            return None
+        try:
+            limits = get_resource_limits(self.task)
+            self.cgroup, skipped = cgroup_manager.create(f'build-{self.task.task_id}-{self.build_number}', limits)
+            if self.cgroup:
+                self.send_log(f"资源限制: {describe_limits(limits)}", "Resources")
+                if skipped:
+                    self.send_log(f"以下限制因cgroup控制器未启用而未生效: {', '.join(skipped)}", "Resources")
+            elif limits:
+                self.send_log("cgroup不可用，本次构建不受资源限制", "Resources")
+        except Exception as e:
+            logger.error(f"创建构建cgroup失败: {str(e)}", exc_info=True)
+            self.cgroup = None
+        return self.cgroup
+
+    def _destroy_cgroup(self):
+        """构建结束后清理cgroup及其中残留的进程"""
+        if self.cgroup:
+            self.cgroup.destroy()
+            self.cgroup = None
+
+    def _record_stage_time(self, stage_name: str, start_time: float, duration: float, success: bool = True,
+                           resources: dict = None):
         """记录阶段执行时间
         Args:
             stage_name: 阶段名称
             start_time: 开始时间戳
             duration: 耗时（秒）
+            success: 阶段是否执行成功
+            resources: 阶段脚本进程的资源占用（cpu_time、max_rss、read_bytes、write_bytes、process_count）
         """
+        self._save_stage_timing(stage_name, start_time, duration, success, resources)
+
         stage_time = {
             'name': stage_name,
             'start_time': datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S'),
             'duration': str(int(duration))
         }
+        if resources:
+            stage_time['resources'] = resources
         self.build_time['stages_time'].append(stage_time)
 
         # 更新构建历史记录的阶段信息
@@ -560,9 +679,69 @@ class Builder:
 
             self.history.build_time = self.build_time
             self.history.save(update_fields=['status', 'build_time'])
+
+            self._save_build_timing(build_start_time, time.time() - build_start_time)
         except Exception as e:
             logger.error(f"更新构建时间信息失败: {str(e)}", exc_info=True)
 
+    def _save_stage_timing(self, stage_name: str, start_time: float, duration: float, success: bool = True,
+                           resources: dict = None):
+        """将阶段耗时写入耗时明细表
+        Args:
+            stage_name: 阶段名称
+            start_time: 开始时间戳
+            duration: 耗时（秒）
+            success: 阶段是否执行成功
+            resources: 阶段脚本进程的资源占用
+        """
+        try:
+            resources = resources or {}
+            BuildStageTiming.objects.create(
+                history=self.history,
+                task=self.task,
+                timing_type='stage',
+                stage_name=stage_name,
+                stage_index=len(self.build_time['stages_time']),
+                start_time=datetime.fromtimestamp(start_time),
+                duration=round(duration, 3),
+                status='success' if success else 'failed',
+                cpu_time=resources.get('cpu_time'),
+                max_rss=resources.get('max_rss'),
+                read_bytes=resources.get('read_bytes'),
+                write_bytes=resources.get('write_bytes'),
+                process_count=resources.get('process_count')
+            )
+        except Exception as e:
+            logger.error(f"记录阶段耗时明细失败: {str(e)}", exc_info=True)
+
+    def _save_build_timing(self, build_start_time: float, duration: float):
+        """将整次构建的耗时写入耗时明细表（重复调用时覆盖之前的记录）
+        Args:
+            build_start_time: 构建开始时间戳
+            duration: 耗时（秒）
+        """
+        try:
+            BuildStageTiming.objects.update_or_create(
+                history=self.history,
+                timing_type='build',
+                defaults={
+                    'task': self.task,
+                    'start_time': datetime.fromtimestamp(build_start_time),
+                    'duration': round(duration, 3),
+                    'status': self.history.status,
+                }
+            )
+
+            # 被终止的构建，将中断的阶段标记为终止
+            if self.history.status == 'terminated':
+                BuildStageTiming.objects.filter(
+                    history=self.history,
+                    timing_type='stage',
+                    status='failed'
+                ).update(status='terminated')
+        except Exception as e:
+            logger.error(f"记录构建耗时明细失败: {str(e)}", exc_info=True)
+
     def _update_build_stats(self, success: bool):
         """更新构建统计信息
         Args:
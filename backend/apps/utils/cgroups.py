@@ -0,0 +1,295 @@
+import os
+import time
+import signal
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger('apps')
+
+# 是否将构建进程放入 cgroup v2 并应用资源限制
+BUILD_CGROUP_ENABLED = getattr(settings, 'BUILD_CGROUP_ENABLED', False)
+# 构建cgroup的父目录（需已委派给运行LiteOps的用户），为空时在当前进程所在cgroup下自动创建
+BUILD_CGROUP_ROOT = getattr(settings, 'BUILD_CGROUP_ROOT', '')
+# 未在任务和环境中配置时使用的默认限制
+BUILD_DEFAULT_RESOURCE_LIMITS = getattr(settings, 'BUILD_DEFAULT_RESOURCE_LIMITS', {})
+# 所有构建合计的限制，避免并发构建占满主机影响接口服务
+BUILD_TOTAL_RESOURCE_LIMITS = getattr(settings, 'BUILD_TOTAL_RESOURCE_LIMITS', {})
+
+CGROUP_MOUNT = '/sys/fs/cgroup'
+CONTROLLERS = ('cpu', 'memory', 'pids')
+CPU_PERIOD = 100000
+# 构建结束时等待cgroup中残留进程退出的时间（秒）
+DESTROY_TIMEOUT = 5
+
+
+class CgroupUnavailable(Exception):
+    """cgroup v2 不可用或没有写权限"""
+
+
+def normalize_resource_limits(data):
+    """校验并规范化资源限制配置
+
+    Args:
+        data: {'cpu_weight': 1-10000, 'cpu_max': CPU核数, 'memory_max': 内存上限(MB), 'pids_max': 进程数上限}，
+              值为空的项表示不限制
+    Returns:
+        tuple: (规范化后的配置, 错误信息)
+    """
+    if not data:
+        return {}, None
+    if not isinstance(data, dict):
+        return None, '资源限制格式错误'
+
+    limits = {}
+    try:
+        if data.get('cpu_weight') not in (None, ''):
+            limits['cpu_weight'] = int(data['cpu_weight'])
+            if not 1 <= limits['cpu_weight'] <= 10000:
+                return None, 'CPU权重必须在1-10000之间'
+        if data.get('cpu_max') not in (None, ''):
+            limits['cpu_max'] = round(float(data['cpu_max']), 2)
+            if limits['cpu_max'] < 0.01:
+                return None, 'CPU核数上限必须大于0'
+        if data.get('memory_max') not in (None, ''):
+            limits['memory_max'] = int(data['memory_max'])
+            if limits['memory_max'] < 16:
+                return None, '内存上限不能小于16MB'
+        if data.get('pids_max') not in (None, ''):
+            limits['pids_max'] = int(data['pids_max'])
+            if limits['pids_max'] < 16:
+                return None, '进程数上限不能小于16'
+    except (TypeError, ValueError):
+        return None, '资源限制必须为数字'
+    return limits, None
+
+
+def get_resource_limits(task):
+    """构建的资源限制：默认配置 < 环境配置 < 任务配置"""
+    limits = dict(BUILD_DEFAULT_RESOURCE_LIMITS)
+    if task.environment and task.environment.resource_limits:
+        limits.update(task.environment.resource_limits)
+    if task.resource_limits:
+        limits.update(task.resource_limits)
+    return limits
+
+
+def describe_limits(limits):
+    parts = []
+    if limits.get('cpu_weight'):
+        parts.append(f"CPU权重 {limits['cpu_weight']}")
+    if limits.get('cpu_max'):
+        parts.append(f"CPU上限 {limits['cpu_max']} 核")
+    if limits.get('memory_max'):
+        parts.append(f"内存上限 {limits['memory_max']}MB")
+    if limits.get('pids_max'):
+        parts.append(f"进程数上限 {limits['pids_max']}")
+    return '，'.join(parts) or '不限制'
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _write(path, value):
+    with open(path, 'w') as f:
+        f.write(str(value))
+
+
+def _apply_limits(path, limits):
+    """写入cgroup限制文件，控制器未启用的项跳过并返回"""
+    skipped = []
+    values = {
+        'cpu.weight': limits.get('cpu_weight'),
+        'cpu.max': f"{int(limits['cpu_max'] * CPU_PERIOD)} {CPU_PERIOD}" if limits.get('cpu_max') else None,
+        'memory.max': limits['memory_max'] * 1024 * 1024 if limits.get('memory_max') else None,
+        # 不使用swap，超出内存上限时直接触发OOM，而不是让构建机大量换页
+        'memory.swap.max': 0 if limits.get('memory_max') else None,
+        'pids.max': limits.get('pids_max'),
+    }
+    for name, value in values.items():
+        if value is None:
+            continue
+        try:
+            _write(os.path.join(path, name), value)
+        except OSError:
+            if name != 'memory.swap.max':
+                skipped.append(name)
+    return skipped
+
+
+class BuildCgroup:
+    """单次构建的cgroup，构建的所有阶段脚本都运行在其中"""
+
+    def __init__(self, path):
+        self.path = path
+        self._oom_kills = 0
+
+    def wrap_command(self, command):
+        """包装执行命令：进程先将自己加入cgroup再exec目标命令，子进程从一开始就受限制"""
+        script = (
+            '{ echo $$ > "$0"; } 2>/dev/null || echo "[Resources] 无法加入资源限制组，本阶段不受资源限制" >&2; '
+            'exec "$@"'
+        )
+        return ['/bin/sh', '-c', script, os.path.join(self.path, 'cgroup.procs')] + list(command)
+
+    def read_oom_kills(self):
+        """累计被OOM终止的进程数"""
+        try:
+            for line in _read(os.path.join(self.path, 'memory.events')).splitlines():
+                key, _, value = line.partition(' ')
+                if key == 'oom_kill':
+                    return int(value)
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def new_oom_kills(self):
+        """距上次调用新增的OOM终止次数"""
+        total = self.read_oom_kills()
+        count, self._oom_kills = total - self._oom_kills, total
+        return count
+
+    def destroy(self):
+        """终止cgroup中残留的进程（如后台运行的Gradle守护进程）并删除cgroup"""
+        procs_file = os.path.join(self.path, 'cgroup.procs')
+        kill_file = os.path.join(self.path, 'cgroup.kill')
+        deadline = time.monotonic() + DESTROY_TIMEOUT
+        try:
+            while True:
+                pids = [int(pid) for pid in _read(procs_file).split()]
+                if not pids:
+                    break
+                if os.path.exists(kill_file):
+                    _write(kill_file, 1)
+                else:
+                    for pid in pids:
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                if time.monotonic() > deadline:
+                    logger.warning(f'构建cgroup中仍有进程未退出: {self.path}')
+                    return
+                time.sleep(0.1)
+            os.rmdir(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f'删除构建cgroup失败 {self.path}: {str(e)}')
+
+
+class CgroupManager:
+    """
+    构建cgroup管理
+
+    在 BUILD_CGROUP_ROOT（为空时为当前进程所在cgroup下的 liteops-builds）中为每次构建创建子cgroup，
+    启用 cpu、memory、pids 控制器。cgroup v2 未挂载、没有写权限或控制器未委派时记录一次警告，构建不受限制地继续执行
+    """
+
+    def __init__(self):
+        self._root = None
+        self._error = None
+        self._lock = threading.Lock()
+
+    def get_root(self):
+        with self._lock:
+            if self._root is None and self._error is None:
+                try:
+                    self._root = self._setup()
+                    logger.info(f'构建资源限制已启用，cgroup: {self._root}')
+                except Exception as e:
+                    self._error = str(e)
+                    logger.warning(f'cgroup不可用，构建将不受资源限制: {self._error}')
+            return self._root
+
+    def _setup(self):
+        if not os.path.isfile(os.path.join(CGROUP_MOUNT, 'cgroup.controllers')):
+            raise CgroupUnavailable('未挂载 cgroup v2')
+
+        if BUILD_CGROUP_ROOT:
+            root = BUILD_CGROUP_ROOT
+            parent = os.path.dirname(root.rstrip('/'))
+            try:
+                self._enable_controllers(parent)
+            except OSError:
+                # 父cgroup的控制器由管理员委派，这里只是尽力启用
+                pass
+        else:
+            root = self._delegate_current()
+
+        try:
+            os.makedirs(root, exist_ok=True)
+        except OSError as e:
+            raise CgroupUnavailable(f'无法创建cgroup {root}: {str(e)}')
+        self._enable_controllers(root)
+        if BUILD_TOTAL_RESOURCE_LIMITS:
+            skipped = _apply_limits(root, BUILD_TOTAL_RESOURCE_LIMITS)
+            if skipped:
+                logger.warning(f'构建总资源限制未生效: {", ".join(skipped)}')
+        return root
+
+    def _delegate_current(self):
+        """在当前进程所在cgroup下创建构建cgroup
+
+        cgroup v2 中非根cgroup不能既包含进程又为子cgroup启用控制器，
+        因此先将当前cgroup中的进程（服务进程）移入 liteops-server 子cgroup
+        """
+        current = ''
+        for line in _read('/proc/self/cgroup').splitlines():
+            if line.startswith('0::'):
+                current = line[3:].strip()
+        if not current:
+            raise CgroupUnavailable('当前进程不在 cgroup v2 中')
+
+        base = os.path.join(CGROUP_MOUNT, current.lstrip('/'))
+        if os.path.basename(base) == 'liteops-server':
+            # 同一服务的其他进程已完成迁移
+            base = os.path.dirname(base)
+        elif current != '/':
+            server = os.path.join(base, 'liteops-server')
+            try:
+                os.makedirs(server, exist_ok=True)
+                for pid in _read(os.path.join(base, 'cgroup.procs')).split():
+                    try:
+                        _write(os.path.join(server, 'cgroup.procs'), pid)
+                    except ProcessLookupError:
+                        pass
+            except OSError as e:
+                raise CgroupUnavailable(f'cgroup {base} 未委派给当前用户: {str(e)}')
+        self._enable_controllers(base)
+        return os.path.join(base, 'liteops-builds')
+
+    def _enable_controllers(self, path):
+        available = _read(os.path.join(path, 'cgroup.controllers')).split()
+        enabled = _read(os.path.join(path, 'cgroup.subtree_control')).split()
+        missing = [name for name in CONTROLLERS if name not in available]
+        if missing:
+            logger.warning(f'cgroup {path} 未委派控制器: {", ".join(missing)}，相应的资源限制不会生效')
+        for name in CONTROLLERS:
+            if name in available and name not in enabled:
+                _write(os.path.join(path, 'cgroup.subtree_control'), f'+{name}')
+
+    def create(self, name, limits):
+        """为构建创建cgroup并写入限制，cgroup不可用时返回None
+
+        Returns:
+            tuple: (BuildCgroup或None, 未生效的限制项列表)
+        """
+        root = self.get_root()
+        if root is None:
+            return None, []
+        cgroup = BuildCgroup(os.path.join(root, name))
+        try:
+            if os.path.isdir(cgroup.path):
+                # 同名cgroup是异常退出的构建遗留的
+                cgroup.destroy()
+            os.makedirs(cgroup.path)
+        except OSError as e:
+            logger.warning(f'创建构建cgroup失败 {cgroup.path}: {str(e)}')
+            return None, []
+        return cgroup, _apply_limits(cgroup.path, limits)
+
+
+cgroup_manager = CgroupManager()
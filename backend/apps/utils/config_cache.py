@@ -0,0 +1,110 @@
+import time
+import uuid
+import logging
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from ..models import SecurityConfig, LDAPConfig
+
+logger = logging.getLogger('apps')
+
+# 本进程缓存的配置在该时间内直接使用（秒），超过后比对版本号，版本变化才重新读取数据库
+CONFIG_CACHE_CHECK_INTERVAL = getattr(settings, 'CONFIG_CACHE_CHECK_INTERVAL', 5)
+
+# 未配置共享缓存时无法感知其他进程的更新，超过该时间强制重新读取数据库（秒）
+CONFIG_CACHE_TTL = getattr(settings, 'CONFIG_CACHE_TTL', 300)
+
+_NOT_LOADED = object()
+
+
+class CachedConfig:
+    """
+    单例配置的进程内缓存
+
+    配置保存后通过 invalidate() 更新Django缓存中的版本号，各进程比对版本号后重新加载；
+    本进程内的更新会立即生效
+    """
+
+    def __init__(self, name, loader):
+        """
+        Args:
+            name: 配置名称，用于版本号的缓存键
+            loader: 从数据库加载配置的函数，返回配置对象或None
+        """
+        self.name = name
+        self.loader = loader
+        self._value = _NOT_LOADED
+        self._version = None
+        self._checked_at = 0
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version_key(self):
+        return f'liteops:config_version:{self.name}'
+
+    def _get_version(self):
+        try:
+            return cache.get(self.version_key)
+        except Exception as e:
+            logger.error(f'读取配置[{self.name}]版本号失败: {str(e)}', exc_info=True)
+            return None
+
+    def get(self):
+        """获取配置（返回的对象为共享实例，调用方不应修改）"""
+        now = time.monotonic()
+        value = self._value
+        if value is not _NOT_LOADED and now - self._checked_at < CONFIG_CACHE_CHECK_INTERVAL:
+            return value
+
+        version = self._get_version()
+        with self._lock:
+            if (self._value is not _NOT_LOADED
+                    and version == self._version
+                    and now - self._loaded_at < CONFIG_CACHE_TTL):
+                self._checked_at = now
+                return self._value
+
+            value = self.loader()
+            self._value = value
+            self._version = version
+            self._checked_at = self._loaded_at = now
+            return value
+
+    def invalidate(self):
+        """配置已更新，在当前事务提交后使所有进程的缓存失效"""
+        transaction.on_commit(self._invalidate)
+
+    def _invalidate(self):
+        with self._lock:
+            self._value = _NOT_LOADED
+        try:
+            cache.set(self.version_key, uuid.uuid4().hex, timeout=None)
+        except Exception as e:
+            logger.error(f'更新配置[{self.name}]版本号失败: {str(e)}', exc_info=True)
+
+
+def load_security_config():
+    """从数据库加载安全配置，不存在时创建默认配置"""
+    config, created = SecurityConfig.objects.get_or_create(
+        id=1,
+        defaults={
+            'min_password_length': 8,
+            'password_complexity': ['lowercase', 'number'],
+            'session_timeout': 120,
+            'max_login_attempts': 5,
+            'lockout_duration': 30,
+            'enable_2fa': False
+        }
+    )
+    return config
+
+
+def load_ldap_config():
+    """从数据库加载LDAP配置，不存在时返回None"""
+    return LDAPConfig.objects.first()
+
+
+security_config_cache = CachedConfig('security', load_security_config)
+ldap_config_cache = CachedConfig('ldap', load_ldap_config)
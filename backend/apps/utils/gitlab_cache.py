@@ -0,0 +1,193 @@
+import time
+import uuid
+import hashlib
+import logging
+import gitlab
+from django.conf import settings
+from django.core.cache import cache
+from .gitlab_pool import gitlab_pool
+
+logger = logging.getLogger('apps')
+
+# 分支、提交记录的缓存有效期（秒），过期后携带ETag向GitLab确认是否有变化
+GITLAB_CACHE_TTL = getattr(settings, 'GITLAB_CACHE_TTL', 300)
+# 分支、提交记录（及其ETag）在缓存中的保留时间（秒）
+GITLAB_CACHE_RETENTION = getattr(settings, 'GITLAB_CACHE_RETENTION', 24 * 60 * 60)
+# 项目路径到项目ID映射的缓存时间（秒）
+GITLAB_PROJECT_CACHE_TTL = getattr(settings, 'GITLAB_PROJECT_CACHE_TTL', 24 * 60 * 60)
+
+# 分支列表每页数量（GitLab允许的最大值）
+BRANCH_PAGE_SIZE = 100
+
+
+def parse_repository(repository):
+    """从仓库地址中解析GitLab实例URL和项目路径
+
+    Returns:
+        tuple: (GitLab实例URL, group/project路径)
+    """
+    repository_parts = repository.split('/')
+    gitlab_url = '/'.join(repository_parts[:3])  # 获取到域名部分
+    if not gitlab_url.startswith('http'):
+        gitlab_url = f'http://{gitlab_url}'
+    project_path = '/'.join(repository_parts[3:])  # 获取group/project部分
+    project_path = project_path.replace('.git', '')
+    return gitlab_url, project_path
+
+
+def _hash(value):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+def _repository_key(gitlab_url, project_path):
+    return _hash(f'{gitlab_url}/{project_path}')
+
+
+def _version_key(repo_key):
+    return f'liteops:gitlab:version:{repo_key}'
+
+
+def _data_key(repo_key, name):
+    """带仓库版本号的缓存键，仓库收到推送后版本号变化，旧数据自然失效"""
+    version = cache.get(_version_key(repo_key)) or '0'
+    return f'liteops:gitlab:{repo_key}:{version}:{name}'
+
+
+def _conditional_get(gl, path, query_data, etag=None):
+    """发送带If-None-Match的GET请求
+
+    Returns:
+        tuple: (响应数据，未变化时为None, ETag, 响应头)
+    """
+    headers = {'If-None-Match': etag} if etag else None
+    try:
+        response = gl.http_request('get', path, query_data=query_data, extra_headers=headers)
+    except gitlab.exceptions.GitlabHttpError as e:
+        if e.response_code == 304:
+            return None, etag, {}
+        raise
+    return response.json(), response.headers.get('ETag'), response.headers
+
+
+def get_project_id(gl, gitlab_url, project_path, refresh=False):
+    """获取项目ID（缓存项目路径到ID的映射，避免每次解析项目或搜索）"""
+    key = f'liteops:gitlab:project:{_repository_key(gitlab_url, project_path)}'
+    if not refresh:
+        project_id = cache.get(key)
+        if project_id:
+            return project_id
+
+    try:
+        # python-gitlab会自行对路径编码，不能预先编码，否则会被二次编码导致404
+        project_id = gl.projects.get(project_path).id
+    except gitlab.exceptions.GitlabGetError:
+        # 失败，通过搜索项目名称获取项目id
+        project_id = None
+        for project in gl.projects.list(search=project_path.split('/')[-1]):
+            if project.path_with_namespace == project_path:
+                project_id = project.id
+                break
+        if project_id is None:
+            raise gitlab.exceptions.GitlabGetError(f"Project {project_path} not found")
+
+    cache.set(key, project_id, timeout=GITLAB_PROJECT_CACHE_TTL)
+    return project_id
+
+
+def _fetch_branches(gl, project_id, cached):
+    """获取全部分支；已有缓存时逐页携带ETag确认，全部未变化则沿用缓存"""
+    path = f'/projects/{project_id}/repository/branches'
+    etags = cached.get('etags') if cached else None
+    # 最后一页已满时可能有新增分支落在下一页，无法仅凭ETag判断，直接重新获取
+    if etags and cached.get('last_page_size', 0) < BRANCH_PAGE_SIZE:
+        unchanged = True
+        for page, etag in enumerate(etags, start=1):
+            data, _, _ = _conditional_get(gl, path, {'per_page': BRANCH_PAGE_SIZE, 'page': page}, etag)
+            if data is not None:
+                unchanged = False
+                break
+        if unchanged:
+            return cached['data'], etags, cached['last_page_size']
+
+    branches, etags, page = [], [], 1
+    while True:
+        data, etag, headers = _conditional_get(gl, path, {'per_page': BRANCH_PAGE_SIZE, 'page': page})
+        branches.extend(data)
+        etags.append(etag)
+        if not headers.get('X-Next-Page') or len(data) < BRANCH_PAGE_SIZE:
+            return branches, etags if all(etags) else None, len(data)
+        page += 1
+
+
+def _fetch_commits(gl, project_id, branch, per_page, cached):
+    """获取分支最近的提交记录；已有缓存时携带ETag确认"""
+    path = f'/projects/{project_id}/repository/commits'
+    query = {'ref_name': branch, 'per_page': per_page}
+    etag = (cached.get('etags') or [None])[0] if cached else None
+    data, etag, _ = _conditional_get(gl, path, query, etag)
+    if data is None:
+        return cached['data'], [etag], 0
+    return data, [etag] if etag else None, 0
+
+
+def _get_cached(repository, credential, name, fetch):
+    """缓存读取的通用流程：新鲜数据直接返回，过期后用ETag确认，GitLab不可用时返回旧数据"""
+    gitlab_url, project_path = parse_repository(repository)
+    repo_key = _repository_key(gitlab_url, project_path)
+    key = _data_key(repo_key, name)
+
+    cached = cache.get(key)
+    if cached and time.time() - cached['fetched_at'] < GITLAB_CACHE_TTL:
+        return cached['data']
+
+    try:
+        gl = gitlab_pool.get(gitlab_url, credential)
+        project_id = get_project_id(gl, gitlab_url, project_path)
+        try:
+            data, etags, last_page_size = fetch(gl, project_id, cached)
+        except gitlab.exceptions.GitlabHttpError as e:
+            if e.response_code != 404:
+                raise
+            # 项目可能已迁移，重新解析项目ID后重试一次
+            project_id = get_project_id(gl, gitlab_url, project_path, refresh=True)
+            data, etags, last_page_size = fetch(gl, project_id, None)
+    except gitlab.exceptions.GitlabAuthenticationError:
+        gitlab_pool.evict(gitlab_url, credential.credential_id)
+        raise
+    except Exception as e:
+        if cached:
+            logger.warning(f"从GitLab获取{name.split(':')[0]}失败，返回缓存数据: {str(e)}")
+            return cached['data']
+        raise
+
+    cache.set(key, {
+        'data': data,
+        'etags': etags,
+        'last_page_size': last_page_size,
+        'fetched_at': time.time()
+    }, timeout=GITLAB_CACHE_RETENTION)
+    return data
+
+
+def get_branches(repository, credential):
+    """获取仓库的全部分支（GitLab API原始数据）"""
+    return _get_cached(repository, credential, 'branches', _fetch_branches)
+
+
+def get_commits(repository, credential, branch, per_page=20):
+    """获取分支最近的提交记录（GitLab API原始数据）"""
+    return _get_cached(
+        repository, credential, f'commits:{_hash(branch)}:{per_page}',
+        lambda gl, project_id, cached: _fetch_commits(gl, project_id, branch, per_page, cached)
+    )
+
+
+def invalidate_repository(repository):
+    """仓库有新的推送，使其分支和提交记录缓存失效"""
+    if not repository:
+        return
+    try:
+        gitlab_url, project_path = parse_repository(repository)
+        cache.set(_version_key(_repository_key(gitlab_url, project_path)), uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        logger.error(f'清除GitLab缓存失败: {str(e)}', exc_info=True)
@@ -0,0 +1,153 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import gitlab
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from ..models import GitlabTokenCredential
+
+logger = logging.getLogger('apps')
+
+# 连接池最多保留的客户端数量，超过时淘汰最久未使用的客户端
+GITLAB_POOL_SIZE = getattr(settings, 'GITLAB_POOL_SIZE', 32)
+# 客户端空闲超过该时间（秒）后关闭
+GITLAB_POOL_IDLE_TIMEOUT = getattr(settings, 'GITLAB_POOL_IDLE_TIMEOUT', 600)
+# 每个客户端保持的最大连接数
+GITLAB_POOL_CONNECTIONS = getattr(settings, 'GITLAB_POOL_CONNECTIONS', 10)
+# GitLab接口请求超时时间（秒）
+GITLAB_TIMEOUT = getattr(settings, 'GITLAB_TIMEOUT', 15)
+# 默认GitLab凭证（未指定凭证时使用的第一个凭证）的缓存时间（秒）
+DEFAULT_CREDENTIAL_TTL = 60
+
+
+def _fingerprint(token):
+    return hashlib.sha256((token or '').encode('utf-8')).hexdigest()
+
+
+class PooledClient:
+    """连接池中的客户端及其使用信息"""
+
+    def __init__(self, client, fingerprint):
+        self.client = client
+        self.fingerprint = fingerprint
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.client.session.close()
+        except Exception:
+            pass
+
+
+class GitlabClientPool:
+    """
+    GitLab客户端连接池
+
+    按 (GitLab地址, 凭证ID) 复用客户端及其HTTP长连接，不再预先调用 auth() 校验Token，
+    Token无效时由实际请求返回401，调用方通过 evict() 移除对应客户端
+    """
+
+    def __init__(self, max_size, idle_timeout):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clients = OrderedDict()  # (gitlab_url, credential_id) -> PooledClient
+        self._lock = threading.Lock()
+        self._default_credential = None
+        self._default_loaded_at = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _create_client(self, gitlab_url, token):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GITLAB_POOL_CONNECTIONS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return gitlab.Gitlab(url=gitlab_url, private_token=token, timeout=GITLAB_TIMEOUT, session=session)
+
+    def _prune(self, now):
+        """移除空闲超时的客户端，并将数量控制在上限内（调用方需持有锁）"""
+        removed = []
+        for key, pooled in list(self._clients.items()):
+            if now - pooled.last_used > self.idle_timeout:
+                removed.append(self._clients.pop(key))
+        while len(self._clients) > self.max_size:
+            removed.append(self._clients.popitem(last=False)[1])
+        self._stats['evictions'] += len(removed)
+        return removed
+
+    def get(self, gitlab_url, credential):
+        """获取客户端
+
+        Args:
+            gitlab_url: GitLab实例地址
+            credential: GitLab Token凭证
+        Returns:
+            gitlab.Gitlab: 客户端（多个线程共享，调用方不应修改其配置）
+        """
+        key = (gitlab_url, credential.credential_id)
+        fingerprint = _fingerprint(credential.token)
+        now = time.monotonic()
+        with self._lock:
+            pooled = self._clients.get(key)
+            # Token已被修改的客户端不再使用
+            if pooled and pooled.fingerprint == fingerprint and now - pooled.last_used <= self.idle_timeout:
+                pooled.last_used = now
+                self._clients.move_to_end(key)
+                self._stats['hits'] += 1
+                return pooled.client
+            self._stats['misses'] += 1
+
+        client = self._create_client(gitlab_url, credential.token)
+        with self._lock:
+            stale = self._clients.pop(key, None)
+            self._clients[key] = PooledClient(client, fingerprint)
+            removed = self._prune(now)
+        for item in ([stale] if stale else []) + removed:
+            item.close()
+        return client
+
+    def evict(self, gitlab_url=None, credential_id=None):
+        """移除客户端（Token失效、凭证修改或删除时）"""
+        with self._lock:
+            keys = [
+                key for key in self._clients
+                if (gitlab_url is None or key[0] == gitlab_url) and (credential_id is None or key[1] == credential_id)
+            ]
+            removed = [self._clients.pop(key) for key in keys]
+            self._stats['evictions'] += len(removed)
+            if credential_id is None or (self._default_credential and self._default_credential.credential_id == credential_id):
+                self._default_credential = None
+        for pooled in removed:
+            pooled.close()
+
+    def get_default_credential(self):
+        """获取默认GitLab凭证（第一个凭证），短时间内复用查询结果"""
+        now = time.monotonic()
+        credential = self._default_credential
+        if credential is not None and now - self._default_loaded_at < DEFAULT_CREDENTIAL_TTL:
+            return credential
+        credential = GitlabTokenCredential.objects.first()
+        if not credential:
+            raise ValueError('未找到GitLab Token凭证')
+        with self._lock:
+            self._default_credential = credential
+            self._default_loaded_at = now
+        return credential
+
+    def stats(self):
+        """连接池统计信息"""
+        with self._lock:
+            hits, misses = self._stats['hits'], self._stats['misses']
+            return {
+                'size': len(self._clients),
+                'max_size': self.max_size,
+                'hits': hits,
+                'misses': misses,
+                'evictions': self._stats['evictions'],
+                'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0
+            }
+
+
+gitlab_pool = GitlabClientPool(GITLAB_POOL_SIZE, GITLAB_POOL_IDLE_TIMEOUT)
@@ -0,0 +1,223 @@
+import time
+import queue
+import hashlib
+import logging
+import threading
+import ldap3
+from ldap3.utils.conv import escape_filter_chars
+from django.conf import settings
+from .crypto import CryptoUtils
+
+logger = logging.getLogger('apps')
+
+# 用户DN缓存时间（秒），缓存期内登录无需再搜索用户
+LDAP_DN_CACHE_TTL = getattr(settings, 'LDAP_DN_CACHE_TTL', 300)
+# 长连接空闲超过该时间（秒）后，使用前先做健康检查
+LDAP_HEALTH_CHECK_INTERVAL = getattr(settings, 'LDAP_HEALTH_CHECK_INTERVAL', 60)
+# 用于校验用户密码的连接数量上限
+LDAP_BIND_POOL_SIZE = getattr(settings, 'LDAP_BIND_POOL_SIZE', 4)
+
+# 连接异常（连接被服务器关闭、网络中断等），出现时丢弃连接并重连
+CONNECTION_ERRORS = (
+    ldap3.core.exceptions.LDAPSocketOpenError,
+    ldap3.core.exceptions.LDAPSocketReceiveError,
+    ldap3.core.exceptions.LDAPSocketSendError,
+    ldap3.core.exceptions.LDAPSessionTerminatedByServerError,
+    ldap3.core.exceptions.LDAPCommunicationError,
+)
+
+
+def format_search_filter(config, username):
+    """将用户名填入用户搜索过滤器（支持 {username} 和 %(user)s 两种格式）"""
+    username = escape_filter_chars(username)
+    search_filter = config.user_search_filter
+    if '%(user)s' in search_filter:
+        return search_filter.replace('%(user)s', username)
+    return search_filter.format(username=username)
+
+
+def _safe_unbind(connection):
+    try:
+        connection.unbind()
+    except Exception:
+        pass
+
+
+class LDAPConnectionPool:
+    """
+    LDAP登录认证连接池
+
+    管理员账户使用一个长连接搜索用户DN，用户DN短时间缓存；校验密码的连接保持打开并通过 rebind 复用，
+    登录时通常只需一次用户绑定。配置变化时自动关闭旧连接并清空缓存
+    """
+
+    def __init__(self):
+        self._signature = None
+        self._server = None
+        self._admin = None
+        self._admin_used_at = 0
+        self._admin_lock = threading.Lock()
+        self._bind_connections = queue.LifoQueue(maxsize=LDAP_BIND_POOL_SIZE)
+        self._dn_cache = {}  # username -> (DN, 过期时间)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _config_signature(config):
+        values = [
+            config.server_host, config.server_port, config.use_ssl, config.base_dn,
+            config.bind_dn, config.bind_password, config.user_search_filter, config.timeout,
+        ]
+        return hashlib.sha256(repr(values).encode('utf-8')).hexdigest()
+
+    def _prepare(self, config):
+        """配置变化时重建服务器对象并丢弃旧连接和DN缓存"""
+        signature = self._config_signature(config)
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            self._reset()
+            server_uri = f"{'ldaps://' if config.use_ssl else 'ldap://'}{config.server_host}:{config.server_port}"
+            # 认证只需搜索和绑定，不读取服务器schema，减少建立连接时的往返
+            self._server = ldap3.Server(server_uri, use_ssl=config.use_ssl, connect_timeout=config.timeout, get_info=ldap3.NONE)
+            self._signature = signature
+
+    def _reset(self):
+        with self._admin_lock:
+            if self._admin is not None:
+                _safe_unbind(self._admin)
+                self._admin = None
+        while True:
+            try:
+                _safe_unbind(self._bind_connections.get_nowait())
+            except queue.Empty:
+                break
+        self._dn_cache.clear()
+
+    def invalidate(self):
+        """关闭全部连接并清空DN缓存（LDAP配置保存后调用）"""
+        with self._lock:
+            self._reset()
+            self._signature = None
+
+    def _admin_connection(self, config):
+        """获取管理员长连接，空闲较久时先检查连接是否可用（调用方需持有 _admin_lock）"""
+        now = time.monotonic()
+        if self._admin is not None and now - self._admin_used_at > LDAP_HEALTH_CHECK_INTERVAL:
+            try:
+                if self._admin.closed or not self._admin.extend.standard.who_am_i():
+                    raise ldap3.core.exceptions.LDAPCommunicationError('连接不可用')
+            except Exception as e:
+                logger.info(f'LDAP管理员连接健康检查失败，重新连接: {str(e)}')
+                _safe_unbind(self._admin)
+                self._admin = None
+
+        if self._admin is None:
+            bind_password = CryptoUtils.decrypt_password(config.bind_password)
+            self._admin = ldap3.Connection(
+                self._server, user=config.bind_dn, password=bind_password,
+                auto_bind=True, receive_timeout=config.timeout
+            )
+        self._admin_used_at = now
+        return self._admin
+
+    def _search_dn(self, config, username):
+        """使用管理员长连接搜索用户DN，连接异常时重连并重试一次"""
+        search_filter = format_search_filter(config, username)
+        with self._admin_lock:
+            for attempt in range(2):
+                connection = self._admin_connection(config)
+                try:
+                    connection.search(
+                        search_base=config.base_dn,
+                        search_filter=search_filter,
+                        attributes=[],
+                        size_limit=1
+                    )
+                    return connection.entries[0].entry_dn if connection.entries else None
+                except CONNECTION_ERRORS:
+                    _safe_unbind(connection)
+                    self._admin = None
+                    if attempt:
+                        raise
+
+    def get_user_dn(self, config, username, use_cache=True):
+        """获取用户DN
+
+        Returns:
+            tuple: (DN，用户不存在时为None, 是否来自缓存)
+        """
+        self._prepare(config)
+        now = time.monotonic()
+        if use_cache:
+            cached = self._dn_cache.get(username)
+            if cached and cached[1] > now:
+                return cached[0], True
+
+        dn = self._search_dn(config, username)
+        if dn:
+            self._dn_cache[username] = (dn, now + LDAP_DN_CACHE_TTL)
+        else:
+            self._dn_cache.pop(username, None)
+        return dn, False
+
+    def _bind(self, dn, password):
+        """使用池中的连接以用户身份绑定校验密码
+
+        Raises:
+            LDAPBindError: 用户名或密码错误
+        """
+        try:
+            connection = self._bind_connections.get_nowait()
+        except queue.Empty:
+            connection = ldap3.Connection(self._server)
+
+        try:
+            if connection.closed:
+                connection.open()
+            success = connection.rebind(user=dn, password=password)
+        except CONNECTION_ERRORS:
+            # 复用的连接已失效，使用新连接重试一次
+            _safe_unbind(connection)
+            connection = ldap3.Connection(self._server)
+            connection.open()
+            success = connection.rebind(user=dn, password=password)
+        except Exception:
+            _safe_unbind(connection)
+            raise
+
+        error = connection.result.get('description') if connection.result else None
+        try:
+            self._bind_connections.put_nowait(connection)
+        except queue.Full:
+            _safe_unbind(connection)
+        if not success:
+            raise ldap3.core.exceptions.LDAPBindError(error or 'invalidCredentials')
+
+    def authenticate(self, config, username, password):
+        """校验LDAP用户的密码
+
+        Returns:
+            str: 用户DN，用户不存在时返回None
+        Raises:
+            LDAPBindError: 用户名或密码错误
+        """
+        dn, cached = self.get_user_dn(config, username)
+        if not dn:
+            return None
+        try:
+            self._bind(dn, password)
+        except ldap3.core.exceptions.LDAPBindError:
+            if not cached:
+                raise
+            # 缓存的DN可能已失效（用户被移动或重命名），重新搜索后再试一次
+            fresh_dn, _ = self.get_user_dn(config, username, use_cache=False)
+            if not fresh_dn or fresh_dn == dn:
+                raise
+            self._bind(fresh_dn, password)
+            return fresh_dn
+        return dn
+
+
+ldap_pool = LDAPConnectionPool()
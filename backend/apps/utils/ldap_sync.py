@@ -0,0 +1,256 @@
+import uuid
+import hashlib
+import logging
+from datetime import datetime, timezone
+import ldap3
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from ..models import User, LDAPConfig
+from .crypto import CryptoUtils
+from .config_cache import ldap_config_cache
+
+logger = logging.getLogger('apps')
+
+# 分页搜索每页条目数（Simple Paged Results）
+LDAP_PAGE_SIZE = getattr(settings, 'LDAP_PAGE_SIZE', 500)
+# 每批写入数据库的用户数
+LDAP_SYNC_BATCH_SIZE = getattr(settings, 'LDAP_SYNC_BATCH_SIZE', 500)
+
+# 条目变更标记属性，按优先级选择服务器支持的第一个：
+# uSNChanged（Active Directory）、entryUSN（OpenLDAP entryUSN overlay）、modifyTimestamp（通用）
+CHANGE_ATTRIBUTES = ('uSNChanged', 'entryUSN', 'modifyTimestamp')
+
+SYNC_FIELDS = ['name', 'email', 'ldap_dn', 'ldap_modified']
+
+
+def generate_id():
+    """生成唯一ID"""
+    return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:32]
+
+
+def create_admin_connection(config):
+    """使用管理员账户连接LDAP服务器"""
+    server_uri = f"{'ldaps://' if config.use_ssl else 'ldap://'}{config.server_host}:{config.server_port}"
+    server = ldap3.Server(server_uri, use_ssl=config.use_ssl, connect_timeout=config.timeout)
+    bind_password = CryptoUtils.decrypt_password(config.bind_password)
+    return ldap3.Connection(server, user=config.bind_dn, password=bind_password, auto_bind=True)
+
+
+def get_change_attribute(connection):
+    """根据服务器schema选择可用的变更标记属性"""
+    schema = connection.server.schema
+    if schema is not None:
+        for attribute in CHANGE_ATTRIBUTES:
+            if attribute in schema.attribute_types:
+                return attribute
+    return 'modifyTimestamp'
+
+
+def format_marker(attribute, value):
+    """将变更标记属性值转为可存储、可用于过滤器的字符串"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None or value == '':
+        return None
+    if attribute == 'modifyTimestamp':
+        if isinstance(value, datetime):
+            if value.tzinfo:
+                value = value.astimezone(timezone.utc)
+            return value.strftime('%Y%m%d%H%M%SZ')
+        return str(value)
+    return str(int(value))
+
+
+def is_newer_marker(attribute, marker, current):
+    """判断marker是否比current更新"""
+    if current is None:
+        return marker is not None
+    if marker is None:
+        return False
+    if attribute == 'modifyTimestamp':
+        return marker > current
+    return int(marker) > int(current)
+
+
+def build_user_filter(search_filter='', change_attribute=None, changed_since=None):
+    """构建用户搜索过滤器，指定changed_since时只搜索此后变更的条目"""
+    conditions = ['(objectClass=person)']
+    if search_filter:
+        conditions.append(f'({search_filter})')
+    if change_attribute and changed_since:
+        conditions.append(f'({change_attribute}>={changed_since})')
+    if len(conditions) == 1:
+        return conditions[0]
+    return f"(&{''.join(conditions)})"
+
+
+def extract_user_info(entry, attr_map, change_attribute=None):
+    """从分页搜索结果中提取用户信息"""
+    attributes = entry.get('attributes', {})
+    user_info = {'dn': entry.get('dn')}
+    for local_attr, ldap_attr in attr_map.items():
+        value = attributes.get(ldap_attr)
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if value:
+            user_info[local_attr] = str(value)
+    if change_attribute:
+        user_info['modified'] = format_marker(change_attribute, attributes.get(change_attribute))
+    return user_info
+
+
+def iter_directory_users(connection, config, search_filter='', change_attribute=None, changed_since=None):
+    """分页搜索LDAP用户，逐条返回用户信息（不会一次性加载整个目录）"""
+    attributes = list(config.user_attr_map.values())
+    if change_attribute:
+        attributes.append(change_attribute)
+    entries = connection.extend.standard.paged_search(
+        search_base=config.base_dn,
+        search_filter=build_user_filter(search_filter, change_attribute, changed_since),
+        attributes=attributes,
+        paged_size=LDAP_PAGE_SIZE,
+        generator=True
+    )
+    for entry in entries:
+        if entry.get('type') != 'searchResEntry':
+            continue
+        user_info = extract_user_info(entry, config.user_attr_map, change_attribute)
+        if user_info.get('username'):  # 确保有用户名
+            yield user_info
+
+
+def _sync_batch(batch, result):
+    """同步一批用户：一次查询已有用户，批量创建和更新"""
+    # 同一批次内用户名重复时以最后一条为准
+    users_data = {user_data['username']: user_data for user_data in batch}
+    existing = {user.username: user for user in User.objects.filter(username__in=list(users_data))}
+    emails = [user_data['email'] for user_data in users_data.values() if user_data.get('email')]
+    email_owners = dict(User.objects.filter(email__in=emails).values_list('email', 'username'))
+
+    to_create, to_update = [], []
+    for username, user_data in users_data.items():
+        values = {
+            'name': user_data.get('name', username),
+            'email': user_data.get('email'),
+            'ldap_dn': user_data.get('dn'),
+            'ldap_modified': user_data.get('modified'),
+        }
+        user = existing.get(username)
+        if user and user.user_type != 'ldap':
+            logger.warning(f'用户{username}已存在但不是LDAP用户，跳过')
+            result['skipped'].append({'username': username, 'reason': '已存在同名的系统用户'})
+            continue
+
+        email = values['email']
+        owner = email_owners.get(email) if email else None
+        if owner and owner != username:
+            logger.warning(f'用户{username}的邮箱{email}已被用户{owner}使用，跳过')
+            result['skipped'].append({'username': username, 'reason': f'邮箱已被用户{owner}使用'})
+            continue
+        if email:
+            email_owners[email] = username
+
+        if user is None:
+            to_create.append(User(
+                user_id=generate_id(),
+                username=username,
+                user_type='ldap',
+                status=1,
+                **values
+            ))
+        elif any(getattr(user, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(user, field, value)
+            to_update.append(user)
+        else:
+            result['unchanged'] += 1
+
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(to_create, batch_size=LDAP_SYNC_BATCH_SIZE)
+            now = datetime.now()
+            for user in to_update:
+                user.update_time = now
+            User.objects.bulk_update(to_update, SYNC_FIELDS + ['update_time'], batch_size=LDAP_SYNC_BATCH_SIZE)
+        result['created'].extend(user.username for user in to_create)
+        result['updated'].extend(user.username for user in to_update)
+    except IntegrityError as e:
+        # 批量写入冲突（如同时有其他同步在运行），退回逐个写入，跳过失败的用户
+        logger.warning(f'批量同步LDAP用户冲突，改为逐个同步: {str(e)}')
+        for user in to_create + to_update:
+            created = user.pk is None
+            try:
+                with transaction.atomic():
+                    user.save()
+                result['created' if created else 'updated'].append(user.username)
+            except Exception as e:
+                logger.error(f'同步用户{user.username}失败: {str(e)}')
+                result['skipped'].append({'username': user.username, 'reason': str(e)})
+
+
+def sync_users(users_data):
+    """将LDAP用户同步到系统，按批次批量写入，未变化的用户不会写库
+
+    Args:
+        users_data: 用户信息（dn、username、name、email、modified）的可迭代对象
+    Returns:
+        dict: created/updated/skipped 用户列表及 unchanged 数量
+    """
+    result = {'created': [], 'updated': [], 'unchanged': 0, 'skipped': []}
+    batch = []
+    for user_data in users_data:
+        if not user_data.get('username'):
+            continue
+        batch.append(user_data)
+        if len(batch) >= LDAP_SYNC_BATCH_SIZE:
+            _sync_batch(batch, result)
+            batch = []
+    if batch:
+        _sync_batch(batch, result)
+    return result
+
+
+def sync_directory(config, full=False):
+    """同步LDAP目录中的全部用户
+
+    默认增量同步，只搜索上次同步以来变更过的条目；full为True或变更标记属性变化时全量同步
+
+    Returns:
+        dict: 同步结果统计
+    """
+    state = config.sync_state or {}
+    connection = create_admin_connection(config)
+    try:
+        change_attribute = get_change_attribute(connection)
+        incremental = not full and state.get('attribute') == change_attribute and bool(state.get('marker'))
+        changed_since = state.get('marker') if incremental else None
+
+        latest = {'marker': changed_since}
+
+        def tracked_users():
+            for user_info in iter_directory_users(connection, config, change_attribute=change_attribute, changed_since=changed_since):
+                if is_newer_marker(change_attribute, user_info.get('modified'), latest['marker']):
+                    latest['marker'] = user_info['modified']
+                yield user_info
+
+        result = sync_users(tracked_users())
+    finally:
+        connection.unbind()
+
+    stats = {
+        'mode': 'incremental' if incremental else 'full',
+        'created': len(result['created']),
+        'updated': len(result['updated']),
+        'unchanged': result['unchanged'],
+        'skipped': len(result['skipped']),
+    }
+    LDAPConfig.objects.filter(id=config.id).update(sync_state={
+        'attribute': change_attribute,
+        'marker': latest['marker'],
+        'last_sync_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'last_result': stats,
+    })
+    ldap_config_cache.invalidate()
+    logger.info(f"LDAP用户同步完成({stats['mode']}): 新建{stats['created']}，更新{stats['updated']}，"
+                f"未变化{stats['unchanged']}，跳过{stats['skipped']}")
+    return dict(stats, skipped_users=result['skipped'])
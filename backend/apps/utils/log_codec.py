@@ -0,0 +1,141 @@
+import zlib
+import codecs
+import logging
+from django.conf import settings
+from ..models import BuildHistory
+
+logger = logging.getLogger('apps')
+
+# 压缩级别（1-9），级别越高压缩率越高、耗时越长
+BUILD_LOG_COMPRESS_LEVEL = getattr(settings, 'BUILD_LOG_COMPRESS_LEVEL', 6)
+# 构建结束后是否自动压缩日志
+BUILD_LOG_COMPRESS_ENABLED = getattr(settings, 'BUILD_LOG_COMPRESS_ENABLED', True)
+# 流式解压每次读取的压缩数据大小
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 已结束的构建状态，只有这些构建的日志会被压缩
+FINAL_STATUSES = ('success', 'failed', 'terminated')
+
+# zlib预设字典：构建日志中反复出现的片段。zlib优先匹配距离近的内容，越常见的片段放在越靠后的位置。
+# 字典内容一旦发布不可修改，调整字典时新增编码版本（如 zlib-d2），旧日志仍使用原字典解压
+_DICTIONARY_D1 = '\n'.join([
+    'npm WARN deprecated ',
+    'npm notice ',
+    'added packages, and audited packages in ',
+    'found 0 vulnerabilities',
+    'Step 1/ : FROM ',
+    ' ---> Running in ',
+    'Removing intermediate container ',
+    ' ---> Using cache',
+    'Successfully built ',
+    'Successfully tagged ',
+    'Sending build context to Docker daemon ',
+    'The push refers to repository ',
+    'digest: sha256: size: ',
+    'Downloading from central: https://repo.maven.apache.org/maven2/',
+    'Downloaded from central: https://repo.maven.apache.org/maven2/',
+    ' kB at  kB/s)',
+    '[INFO] --- maven-compiler-plugin:',
+    '[INFO] ------------------------------------------------------------------------',
+    '[INFO] BUILD SUCCESS',
+    '[INFO] BUILD FAILURE',
+    '[INFO] Total time: ',
+    '[INFO] Finished at: ',
+    '[WARNING] ',
+    '[ERROR] ',
+    '[INFO] ',
+    '[Git Clone] 仓库地址: ',
+    '[Git Clone] 开始克隆代码，分支: ',
+    '[Git Clone] 正在克隆代码，请稍候...',
+    '[Git Clone] 构建目录: ',
+    '[Git Clone] 克隆目录验证成功: ',
+    '[Build Stages] 所有阶段执行完成',
+    '[Build] 构建完成，状态: success',
+    '[Build] 构建完成，状态: failed',
+    '脚本执行失败，返回码: ',
+    '[Build Stages] 阶段  执行完成',
+    '[Build Stages] 开始执行阶段: ',
+]).encode('utf-8')
+
+LOG_DICTIONARIES = {
+    'zlib-d1': _DICTIONARY_D1,
+}
+# 新压缩的日志使用的编码
+DEFAULT_LOG_CODEC = 'zlib-d1'
+
+
+def _get_dictionary(codec):
+    try:
+        return LOG_DICTIONARIES[codec]
+    except KeyError:
+        raise ValueError(f'不支持的日志编码: {codec}')
+
+
+def compress_log(text, codec=DEFAULT_LOG_CODEC):
+    """压缩日志文本"""
+    compressor = zlib.compressobj(BUILD_LOG_COMPRESS_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS, zdict=_get_dictionary(codec))
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+def iter_decompress(data, codec, chunk_size=STREAM_CHUNK_SIZE):
+    """流式解压日志，逐块返回文本，不会一次性在内存中生成完整日志"""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS, zdict=_get_dictionary(codec))
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    data = memoryview(data)
+    for offset in range(0, len(data), chunk_size):
+        text = decoder.decode(decompressor.decompress(data[offset:offset + chunk_size]))
+        if text:
+            yield text
+    text = decoder.decode(decompressor.flush(), final=True)
+    if text:
+        yield text
+
+
+def decompress_log(data, codec):
+    """解压日志"""
+    return ''.join(iter_decompress(data, codec))
+
+
+def get_build_log(history):
+    """获取构建日志文本（已压缩的日志自动解压）"""
+    # 原文字段非空时以原文为准：压缩后构建线程仍可能写入最后的日志，随后会再次压缩
+    if history.build_log or not history.build_log_compressed:
+        return history.build_log
+    return decompress_log(history.build_log_compressed, history.log_codec)
+
+
+def iter_build_log(history):
+    """流式获取构建日志文本块"""
+    if history.build_log:
+        yield history.build_log
+    elif history.build_log_compressed:
+        yield from iter_decompress(history.build_log_compressed, history.log_codec)
+
+
+def iter_build_log_lines(history):
+    """逐行获取构建日志，找到所需内容后可提前结束，不必解压整份日志"""
+    pending = ''
+    for chunk in iter_build_log(history):
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        yield from lines
+    yield pending
+
+
+def compress_history_log(history):
+    """压缩已结束构建的日志，压缩后清空原文本字段
+
+    Returns:
+        int: 压缩节省的字节数，未压缩时返回0
+    """
+    if not history.build_log or history.status not in FINAL_STATUSES:
+        return 0
+    raw = history.build_log
+    data = compress_log(raw)
+    BuildHistory.objects.filter(id=history.id).update(
+        build_log=None, build_log_compressed=data, log_codec=DEFAULT_LOG_CODEC
+    )
+    history.build_log = None
+    history.build_log_compressed = data
+    history.log_codec = DEFAULT_LOG_CODEC
+    return len(raw.encode('utf-8')) - len(data)
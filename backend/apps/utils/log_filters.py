@@ -0,0 +1,293 @@
+import re
+import json
+from functools import lru_cache
+from django.conf import settings
+
+# 任务未配置的项使用的默认日志过滤配置，保持原有的Maven下载进度过滤
+BUILD_DEFAULT_LOG_FILTERS = getattr(settings, 'BUILD_DEFAULT_LOG_FILTERS', {'presets': ['maven']})
+# 单行日志的默认最大长度（字符），0表示不限制
+BUILD_LOG_MAX_LINE_LENGTH = getattr(settings, 'BUILD_LOG_MAX_LINE_LENGTH', 0)
+
+MASK = '******'
+
+# 预置规则：drop 为直接丢弃的行，progress 为进度行（连续的进度行只保留最后一行）
+# 规则尽量以 ^ 开头，匹配时只需在行首尝试一次
+PRESETS = {
+    'maven': {
+        'name': 'Maven',
+        'drop': [
+            # 同时包含 "Progress (" 和 KB/MB/B/s 的行
+            r'^(?=(?s:.*)Progress \()(?s:.*)(?:KB|MB|B/s)',
+            r'^\s*Progress \(\d+\): .+',
+            r'^\s*Progress\s*$',
+            r'^\s*\d+%\s*$',
+        ],
+        'progress': [],
+    },
+    'npm': {
+        'name': 'npm',
+        'drop': [
+            r'^npm (?:timing|http fetch) ',
+        ],
+        'progress': [
+            r'^\s*\[[#.\s]*\] [\\|/-] ',
+            r'^\s*[⠁-⣿] ',
+        ],
+    },
+    'docker': {
+        'name': 'Docker',
+        'drop': [],
+        'progress': [
+            # docker pull / 旧版构建器的镜像层进度
+            r'^[0-9a-f]{12}: (?:Waiting|Downloading|Extracting|Verifying Checksum|Download complete|Pulling fs layer)',
+            # BuildKit plain 输出的传输进度
+            r'^#\d+ (?:sha256:[0-9a-f]+ )?[\d.]+[kMG]?B / [\d.]+[kMG]?B',
+            r'^#\d+ transferring \S+: [\d.]+[kMG]?B',
+        ],
+    },
+    'gradle': {
+        'name': 'Gradle',
+        'drop': [],
+        'progress': [
+            r'^\s*<[-=]*> \d+% ',
+            r'^Download https?://',
+        ],
+    },
+    'pip': {
+        'name': 'pip',
+        'drop': [],
+        'progress': [
+            r'^\s*━+',
+            r'^\s*\|[█▉▊▋▌▍▎▏ ]+\|',
+        ],
+    },
+}
+
+# ANSI 转义序列（颜色、光标移动等）
+ANSI_PATTERN = re.compile(r'\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])')
+
+
+def _compile_patterns(patterns):
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+
+def compile_literals(words):
+    """将多个字面量编译为一个按前缀树组织的正则，一次扫描即可找出所有出现位置
+
+    等价于按长度降序排列的 a|b|c 交替，但共享前缀的字面量合并为一个分支，
+    每个位置只需比较首字符不同的分支，字面量数量较多时比平铺的交替快数倍；
+    某个字面量是另一个的前缀时，较长的优先匹配
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = []
+        for char in sorted(key for key in node if key):
+            # 没有分叉的路径合并为一段字面量，减少正则的嵌套层数
+            run, child = char, node[char]
+            while len(child) == 1 and '' not in child:
+                (next_char, child), = child.items()
+                run += next_char
+            branches.append(re.escape(run) + build(child))
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f'(?:{body})?' if '' in node else body
+
+    return re.compile(build(trie)) if trie else None
+
+
+def _has_top_level_alternation(pattern):
+    """正则最外层是否有 |（如 ^a|b 中的 b 不限于行首）"""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '[':
+            # 跳过字符集，字符集开头的 ] 是普通字符
+            i += 1
+            if i < len(pattern) and pattern[i] == '^':
+                i += 1
+            if i < len(pattern) and pattern[i] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def _anchor(pattern):
+    """转换为从行首匹配（re.match）的分支，与 re.search 的结果一致
+
+    合并后的正则如果用 search，每个位置都要尝试所有分支，且无法利用字面量前缀的快速查找；
+    改为 match 后以 ^ 开头的规则只在行首尝试一次，其他规则加上贪婪的 .* 前缀，匹配失败时只回溯一遍
+    """
+    if pattern.startswith('^') and not _has_top_level_alternation(pattern):
+        return pattern
+    return f'(?s:.*)(?:{pattern})'
+
+
+def normalize_log_filters(data):
+    """校验并规范化日志过滤配置
+
+    Args:
+        data: {
+            'presets': 预置规则名称列表（maven、npm、docker、gradle、pip）,
+            'strip_ansi': 是否去除ANSI转义序列,
+            'drop_patterns': 丢弃行的正则列表,
+            'mask_patterns': 需要脱敏的内容的正则列表（匹配部分替换为 ******）,
+            'max_line_length': 单行最大长度，0表示不限制
+        }，未设置的项使用默认配置
+    Returns:
+        tuple: (规范化后的配置, 错误信息)
+    """
+    if not data:
+        return {}, None
+    if not isinstance(data, dict):
+        return None, '日志过滤配置格式错误'
+
+    config = {}
+    if data.get('presets') is not None:
+        presets = data['presets']
+        if not isinstance(presets, list):
+            return None, '预置规则格式错误'
+        unknown = [name for name in presets if name not in PRESETS]
+        if unknown:
+            return None, f'不支持的预置规则: {", ".join(map(str, unknown))}'
+        config['presets'] = presets
+    if data.get('strip_ansi') is not None:
+        config['strip_ansi'] = bool(data['strip_ansi'])
+    for key, label in (('drop_patterns', '丢弃规则'), ('mask_patterns', '脱敏规则')):
+        if data.get(key) is None:
+            continue
+        patterns = data[key]
+        if not isinstance(patterns, list):
+            return None, f'{label}格式错误'
+        patterns = [str(pattern) for pattern in patterns if str(pattern).strip()]
+        for pattern in patterns:
+            try:
+                compiled = re.compile(pattern)
+            except re.error as e:
+                return None, f'{label} "{pattern}" 不是有效的正则表达式: {str(e)}'
+            if compiled.search('') is not None:
+                return None, f'{label} "{pattern}" 会匹配空字符串'
+        config[key] = patterns
+    if data.get('max_line_length') not in (None, ''):
+        try:
+            config['max_line_length'] = int(data['max_line_length'])
+        except (TypeError, ValueError):
+            return None, '单行最大长度必须为整数'
+        if config['max_line_length'] < 0:
+            return None, '单行最大长度不能小于0'
+    return config, None
+
+
+class LogFilterPipeline:
+    """
+    构建日志过滤管道
+
+    每行依次处理：
+    1. 含回车符的行只保留最后一段（进度条刷新）
+    2. 去除ANSI转义序列（可选）
+    3. 按丢弃/进度规则分类：所有规则合并为一个预编译的正则，每行只从行首匹配一次，
+       通过命名分组区分丢弃行和进度行；连续的进度行只保留最后一行，在下一条普通日志前或 flush() 时输出
+    4. 脱敏：凭证等密文（set_secrets）及匹配脱敏规则的内容替换为 ******
+    5. 截断超长的行
+
+    进度行暂存时需要记录其附带的上下文（如阶段名称），process() 返回 [(行, 上下文)]
+    """
+
+    def __init__(self, presets=(), strip_ansi=False, drop_patterns=(), mask_patterns=(), max_line_length=0):
+        drop = list(drop_patterns)
+        progress = []
+        for name in presets:
+            drop.extend(PRESETS[name]['drop'])
+            progress.extend(PRESETS[name]['progress'])
+
+        groups = []
+        if drop:
+            groups.append(f'(?P<drop>{_compile_patterns(map(_anchor, drop)).pattern})')
+        if progress:
+            groups.append(f'(?P<progress>{_compile_patterns(map(_anchor, progress)).pattern})')
+        self.classifier = re.compile('|'.join(groups)) if groups else None
+        self.masker = _compile_patterns(mask_patterns) if mask_patterns else None
+        self.secret_masker = None
+        self.strip_ansi = strip_ansi
+        self.max_line_length = max_line_length
+        self._held = None
+
+    def set_secrets(self, secrets):
+        """设置需要脱敏的密文（凭证、敏感参数等），输出的日志中出现的密文替换为 ******"""
+        self.secret_masker = compile_literals(secrets)
+
+    @classmethod
+    def from_config(cls, config):
+        """按任务配置创建，未配置的项使用 BUILD_DEFAULT_LOG_FILTERS"""
+        return cls(**_merged_config(json.dumps(config or {}, sort_keys=True)))
+
+    def process(self, line, context=None):
+        """处理一行日志
+
+        Returns:
+            list: 需要输出的 [(行, 上下文)]，行被丢弃或作为进度行暂存时为空
+        """
+        if '\r' in line:
+            line = line.rstrip('\r')
+            line = line[line.rfind('\r') + 1:]
+        if self.strip_ansi and '\x1b' in line:
+            line = ANSI_PATTERN.sub('', line)
+
+        if self.classifier is not None:
+            match = self.classifier.match(line)
+            if match is not None:
+                if match.lastgroup == 'drop':
+                    return []
+                # 进度行在输出时才做脱敏和截断，被后续进度行替换的行不需要处理
+                self._held = (line, context)
+                return []
+
+        line = self._transform(line)
+        if self._held is None:
+            return [(line, context)]
+        return self.flush() + [(line, context)]
+
+    def flush(self):
+        """输出暂存的进度行"""
+        if self._held is None:
+            return []
+        (line, context), self._held = self._held, None
+        return [(self._transform(line), context)]
+
+    def _transform(self, line):
+        if self.secret_masker is not None:
+            line = self.secret_masker.sub(MASK, line)
+        if self.masker is not None:
+            line = self.masker.sub(MASK, line)
+        if self.max_line_length and len(line) > self.max_line_length:
+            line = f'{line[:self.max_line_length]}...（已截断 {len(line) - self.max_line_length} 个字符）'
+        return line
+
+
+@lru_cache(maxsize=256)
+def _merged_config(config_json):
+    config = {'max_line_length': BUILD_LOG_MAX_LINE_LENGTH}
+    config.update(BUILD_DEFAULT_LOG_FILTERS)
+    config.update(json.loads(config_json))
+    # 配置在保存时已校验，这里只保留已知的项，并忽略已删除的预置规则
+    config['presets'] = [name for name in config.get('presets', []) if name in PRESETS]
+    keys = ('presets', 'strip_ansi', 'drop_patterns', 'mask_patterns', 'max_line_length')
+    return {key: config[key] for key in keys if key in config}
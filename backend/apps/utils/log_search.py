@@ -0,0 +1,294 @@
+import sqlite3
+import logging
+import itertools
+import threading
+from datetime import datetime
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from .log_codec import iter_build_log_lines, FINAL_STATUSES
+
+logger = logging.getLogger('apps')
+
+# 是否在构建结束后将日志写入全文检索索引
+BUILD_LOG_SEARCH_ENABLED = getattr(settings, 'BUILD_LOG_SEARCH_ENABLED', True)
+# 索引文件（SQLite FTS5），与业务数据库分开存放，可随时删除后通过 rebuild_build_log_index 重建
+BUILD_LOG_SEARCH_DB = getattr(settings, 'BUILD_LOG_SEARCH_DB', Path(settings.BASE_DIR) / 'data' / 'build_log_index.sqlite3')
+# 单行日志写入索引的最大长度（字符），超出部分不参与检索
+BUILD_LOG_SEARCH_MAX_LINE_LENGTH = getattr(settings, 'BUILD_LOG_SEARCH_MAX_LINE_LENGTH', 2000)
+
+# 等待其他进程写入索引的最长时间（秒）
+BUSY_TIMEOUT = 30
+# 结果中单行的最大长度，超出时截取关键词附近的内容
+SNIPPET_LENGTH = 300
+
+SCHEMA = [
+    # 已索引的构建，id 为 BuildHistory.id；first_rowid/last_rowid 为该构建的日志行在 log_lines 中的 rowid 范围，
+    # 按范围删除，避免按未索引的 build_id 列扫描全表
+    '''CREATE TABLE IF NOT EXISTS builds (
+        id INTEGER PRIMARY KEY,
+        task_id TEXT NOT NULL,
+        build_number INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        first_rowid INTEGER NOT NULL,
+        last_rowid INTEGER NOT NULL,
+        indexed_at TEXT NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_builds_task_time ON builds (task_id, start_time)',
+    'CREATE INDEX IF NOT EXISTS idx_builds_time ON builds (start_time)',
+]
+
+# trigram 分词按连续的3个字符建立索引，可检索任意子串（包括中文、路径、类名的一部分），不区分大小写；
+# SQLite 3.34 之前不支持 trigram，退回 unicode61 按单词检索
+LINES_TABLE = "CREATE VIRTUAL TABLE IF NOT EXISTS log_lines USING fts5(content, build_id UNINDEXED, line_no UNINDEXED, tokenize='{}')"
+TOKENIZERS = ('trigram', 'unicode61')
+
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def _snippet(content, keyword):
+    """截取关键词附近的内容"""
+    if len(content) <= SNIPPET_LENGTH:
+        return content
+    position = max(content.lower().find(keyword.lower()), 0)
+    start = max(position - SNIPPET_LENGTH // 3, 0)
+    end = start + SNIPPET_LENGTH
+    return ('...' if start > 0 else '') + content[start:end] + ('...' if end < len(content) else '')
+
+
+class BuildLogIndex:
+    """
+    构建日志全文检索索引
+
+    已结束构建的日志按行写入 SQLite FTS5 倒排索引，跨构建检索只需查询索引，不必逐个解压日志；
+    索引中只保存构建不会再变化的信息（任务、构建号、状态、开始时间），项目、环境及数据权限
+    由调用方换算为任务ID后过滤，任务调整项目或环境后无需重建索引
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.tokenizer = None
+        self._lock = threading.Lock()
+
+    def _ensure_initialized(self):
+        if self.tokenizer is None:
+            with self._lock:
+                if self.tokenizer is None:
+                    self._initialize()
+
+    def _connect(self):
+        self._ensure_initialized()
+        conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _initialize(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT, isolation_level=None)
+        try:
+            # WAL 模式下检索不会被写入阻塞
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'log_lines'").fetchone()
+            if row is None:
+                for tokenizer in TOKENIZERS:
+                    try:
+                        conn.execute(LINES_TABLE.format(tokenizer))
+                        break
+                    except sqlite3.OperationalError:
+                        logger.warning(f'SQLite {sqlite3.sqlite_version} 不支持 {tokenizer} 分词')
+                row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'log_lines'").fetchone()
+            self.tokenizer = 'trigram' if 'trigram' in row[0] else 'unicode61'
+        finally:
+            conn.close()
+
+    @property
+    def min_keyword_length(self):
+        self._ensure_initialized()
+        return 3 if self.tokenizer == 'trigram' else 1
+
+    def index(self, history, lines=None):
+        """将已结束构建的日志写入索引，已索引的构建会先删除旧的索引
+
+        Args:
+            history: BuildHistory
+            lines: 日志行，默认从构建记录中读取（已压缩的日志边解压边写入）
+        Returns:
+            int: 写入的行数
+        """
+        if history.status not in FINAL_STATUSES:
+            return 0
+        if lines is None:
+            lines = iter_build_log_lines(history)
+        conn = self._connect()
+        try:
+            # IMMEDIATE 事务获取写锁，多个进程同时写入时 rowid 范围不会重叠
+            conn.execute('BEGIN IMMEDIATE')
+            self._delete(conn, [history.id])
+            # FTS5 表上的 max(rowid) 需要扫描全表，从已索引构建的 rowid 范围中获取
+            first_rowid = (conn.execute('SELECT max(last_rowid) FROM builds').fetchone()[0] or 0) + 1
+            rowids = itertools.count(first_rowid)
+            conn.executemany(
+                'INSERT INTO log_lines (rowid, content, build_id, line_no) VALUES (?, ?, ?, ?)',
+                ((next(rowids), line[:BUILD_LOG_SEARCH_MAX_LINE_LENGTH], history.id, line_no)
+                 for line_no, line in enumerate(lines, 1) if line.strip())
+            )
+            last_rowid = next(rowids) - 1
+            conn.execute(
+                'INSERT INTO builds (id, task_id, build_number, status, start_time, first_rowid, last_rowid, indexed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (history.id, history.task_id or '', history.build_number, history.status,
+                 _format_time(history.create_time), first_rowid, last_rowid, _format_time(datetime.now()))
+            )
+            conn.execute('COMMIT')
+            return last_rowid - first_rowid + 1
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _delete(self, conn, ids):
+        for build_id in ids:
+            row = conn.execute('SELECT first_rowid, last_rowid FROM builds WHERE id = ?', (build_id,)).fetchone()
+            if row is None:
+                continue
+            conn.execute('DELETE FROM log_lines WHERE rowid BETWEEN ? AND ?', row)
+            conn.execute('DELETE FROM builds WHERE id = ?', (build_id,))
+
+    def remove(self, ids):
+        """删除构建的索引（构建记录被删除时调用）
+
+        Args:
+            ids: BuildHistory.id 列表
+        """
+        ids = list(ids)
+        if not ids:
+            return
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._delete(conn, ids)
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def indexed_ids(self):
+        """已索引的构建ID集合"""
+        conn = self._connect()
+        try:
+            return {row[0] for row in conn.execute('SELECT id FROM builds')}
+        finally:
+            conn.close()
+
+    def search(self, keyword, task_ids=None, status=None, start_time=None, end_time=None,
+               order='desc', offset=0, limit=20, lines_per_build=5):
+        """检索日志中包含关键词的构建
+
+        关键词作为一个整体匹配（trigram 分词下相当于不区分大小写的子串匹配，与 grep -i -F 一致）
+
+        Args:
+            keyword: 关键词
+            task_ids: 限定的任务ID列表，None 表示不限
+            status: 构建状态
+            start_time/end_time: 构建开始时间范围（'YYYY-MM-DD HH:MM:SS'）
+            order: desc 最近的构建在前，asc 最早的构建在前（查找首次出现某个错误的构建）
+            offset/limit: 按构建分页
+            lines_per_build: 每个构建返回的匹配行数
+        Returns:
+            tuple: (匹配的构建总数, [{'id', 'task_id', 'build_number', 'status', 'start_time', 'match_count', 'lines'}])
+        """
+        if task_ids is not None and not task_ids:
+            return 0, []
+
+        match = '"{}"'.format(keyword.replace('"', '""'))
+        conditions = ['log_lines MATCH ?']
+        params = [match]
+        if task_ids is not None:
+            conditions.append(f"b.task_id IN ({','.join('?' * len(task_ids))})")
+            params.extend(task_ids)
+        if status:
+            conditions.append('b.status = ?')
+            params.append(status)
+        if start_time:
+            conditions.append('b.start_time >= ?')
+            params.append(start_time)
+        if end_time:
+            conditions.append('b.start_time <= ?')
+            params.append(end_time)
+        where = ' AND '.join(conditions)
+        direction = 'ASC' if order == 'asc' else 'DESC'
+
+        conn = self._connect()
+        try:
+            total = conn.execute(
+                f'SELECT count(DISTINCT b.id) FROM log_lines JOIN builds b ON b.id = log_lines.build_id WHERE {where}',
+                params
+            ).fetchone()[0]
+            if not total:
+                return 0, []
+
+            builds = conn.execute(
+                f'SELECT b.id, b.task_id, b.build_number, b.status, b.start_time, count(*) '
+                f'FROM log_lines JOIN builds b ON b.id = log_lines.build_id WHERE {where} '
+                f'GROUP BY b.id ORDER BY b.start_time {direction}, b.id {direction} LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            ).fetchall()
+            results = {
+                row[0]: {
+                    'id': row[0], 'task_id': row[1], 'build_number': row[2], 'status': row[3],
+                    'start_time': row[4], 'match_count': row[5], 'lines': []
+                }
+                for row in builds
+            }
+            if results:
+                ids = list(results)
+                # 每个构建只取行号最小的若干匹配行
+                lines = conn.execute(
+                    f'SELECT build_id, line_no, content FROM ('
+                    f'SELECT build_id, line_no, content, '
+                    f'row_number() OVER (PARTITION BY build_id ORDER BY line_no) AS rank '
+                    f"FROM log_lines WHERE log_lines MATCH ? AND build_id IN ({','.join('?' * len(ids))})"
+                    f') WHERE rank <= ? ORDER BY build_id, line_no',
+                    [match] + ids + [lines_per_build]
+                ).fetchall()
+                for build_id, line_no, content in lines:
+                    results[build_id]['lines'].append({'line_no': line_no, 'content': _snippet(content, keyword)})
+            return total, [results[row[0]] for row in builds]
+        finally:
+            conn.close()
+
+
+build_log_index = BuildLogIndex(BUILD_LOG_SEARCH_DB)
+
+
+def remove_from_log_index(ids):
+    """从索引中删除构建，索引异常只记录日志，不影响删除构建记录
+
+    Args:
+        ids: BuildHistory.id 列表
+    """
+    try:
+        build_log_index.remove(ids)
+    except Exception as e:
+        logger.error(f'删除构建日志索引失败: {str(e)}', exc_info=True)
+
+
+def remove_from_log_index_on_commit(histories):
+    """删除任务、项目、环境前调用：记录随之级联删除的构建，在事务提交后删除其索引
+
+    Args:
+        histories: 将被删除的 BuildHistory 查询集
+    """
+    ids = list(histories.values_list('id', flat=True))
+    if ids:
+        transaction.on_commit(lambda: remove_from_log_index(ids))
@@ -1,9 +1,10 @@
 import threading
-import queue
 import time
 import logging
 from typing import Dict, Set, Optional
 from dataclasses import dataclass
+from .log_stream_backends import create_backend, LOG_STREAM_BACKEND, COMPLETE_PREFIX
+from .metrics import LOG_STREAM_MESSAGES, LOG_STREAM_DROPPED, SSE_CLIENTS, SSE_CONNECTIONS
 
 logger = logging.getLogger('apps')
 
@@ -15,13 +16,21 @@ class LogMessage:
     message: str
     stage: Optional[str] = None
     timestamp: float = None
+    seq: int = 0  # 消息序号，客户端重连时用于继续接收
+    epoch: Optional[str] = None  # 分配序号的分发中心，切换后序号重新开始
     
     def __post_init__(self):
         if self.timestamp is None:
             self.timestamp = time.time()
 
 class LogStreamManager:
-    
+    """
+    实时构建日志管理器
+
+    日志通过可配置的后端（LOG_STREAM_BACKEND）分发：memory 仅当前进程，socket 在同一主机的多个进程间转发，
+    database 从数据库轮询，后两者允许 uvicorn 以多个 worker 运行
+    """
+
     _instance = None
     _lock = threading.Lock()
     
@@ -37,15 +46,12 @@ class LogStreamManager:
             return
         
         self._initialized = True
-        # 存储每个构建的日志队列 {(task_id, build_number): queue.Queue}
-        self._log_queues: Dict[tuple, queue.Queue] = {}
-        # 存储每个构建的SSE客户端集合 {(task_id, build_number): set}
+        self._backend = create_backend()
+        # 存储当前进程中每个构建的SSE客户端集合 {(task_id, build_number): set}
         self._sse_clients: Dict[tuple, Set] = {}
-        # 线程锁
-        self._queues_lock = threading.Lock()
         self._clients_lock = threading.Lock()
         
-        logger.info("LogStreamManager initialized")
+        logger.info(f"LogStreamManager initialized, backend: {LOG_STREAM_BACKEND}")
     
     def get_build_key(self, task_id: str, build_number: int) -> tuple:
         """获取构建的唯一键"""
@@ -53,16 +59,8 @@ class LogStreamManager:
     
     def create_build_stream(self, task_id: str, build_number: int):
         """为新构建创建日志流"""
-        build_key = self.get_build_key(task_id, build_number)
-        
-        with self._queues_lock:
-            if build_key not in self._log_queues:
-                self._log_queues[build_key] = queue.Queue(maxsize=20000)  # 最大缓存20000条日志
-                logger.info(f"Created log stream for build {task_id}#{build_number}")
-        
-        with self._clients_lock:
-            if build_key not in self._sse_clients:
-                self._sse_clients[build_key] = set()
+        self._backend.open(self.get_build_key(task_id, build_number))
+        logger.info(f"Created log stream for build {task_id}#{build_number}")
     
     def add_sse_client(self, task_id: str, build_number: int, client_id: str):
         """添加SSE客户端"""
@@ -71,6 +69,9 @@ class LogStreamManager:
         with self._clients_lock:
             if build_key not in self._sse_clients:
                 self._sse_clients[build_key] = set()
+            if client_id not in self._sse_clients[build_key]:
+                SSE_CLIENTS.inc()
+                SSE_CONNECTIONS.inc()
             self._sse_clients[build_key].add(client_id)
             logger.info(f"Added SSE client {client_id} for build {task_id}#{build_number}")
     
@@ -79,58 +80,37 @@ class LogStreamManager:
         build_key = self.get_build_key(task_id, build_number)
         
         with self._clients_lock:
-            if build_key in self._sse_clients:
+            if build_key in self._sse_clients and client_id in self._sse_clients[build_key]:
                 self._sse_clients[build_key].discard(client_id)
+                SSE_CLIENTS.dec()
                 logger.info(f"Removed SSE client {client_id} for build {task_id}#{build_number}")
                 
                 if not self._sse_clients[build_key]:
                     del self._sse_clients[build_key]
-                    self._cleanup_build_stream(build_key)
-    
-    def _cleanup_build_stream(self, build_key: tuple):
-        """清理构建流资源"""
-        with self._queues_lock:
-            if build_key in self._log_queues:
-                del self._log_queues[build_key]
-                logger.info(f"Cleaned up log stream for build {build_key[0]}#{build_key[1]}")
     
     def push_log(self, task_id: str, build_number: int, message: str, stage: Optional[str] = None):
         """推送日志消息到流"""
-        build_key = self.get_build_key(task_id, build_number)
-        
-        # 创建日志消息
-        log_msg = LogMessage(
-            task_id=task_id,
-            build_number=build_number,
-            message=message,
-            stage=stage
-        )
-        
-        # 推送到队列
-        with self._queues_lock:
-            if build_key not in self._log_queues:
-                # 如果队列不存在，先创建
-                self._log_queues[build_key] = queue.Queue(maxsize=20000)
-                logger.debug(f"Created log queue for build {task_id}#{build_number} during push")
-            
-            try:
-                # 非阻塞推送，如果队列满了就丢弃最老的消息
-                if self._log_queues[build_key].full():
-                    try:
-                        self._log_queues[build_key].get_nowait()  # 移除最老的消息
-                    except queue.Empty:
-                        pass
-                
-                self._log_queues[build_key].put_nowait(log_msg)
-            except queue.Full:
-                logger.warning(f"Log queue full for build {task_id}#{build_number}, dropping message")
+        try:
+            self._backend.publish(self.get_build_key(task_id, build_number), {
+                'message': message,
+                'stage': stage,
+                'timestamp': time.time()
+            })
+        except Exception:
+            LOG_STREAM_DROPPED.inc(reason='error')
+            raise
+        LOG_STREAM_MESSAGES.inc()
     
-    def get_log_stream(self, task_id: str, build_number: int, client_id: str):
-        """获取日志流生成器"""
+    def get_log_stream(self, task_id: str, build_number: int, client_id: str, since: int = 0,
+                       epoch: Optional[str] = None):
+        """获取日志流生成器
+
+        Args:
+            since: 已收到的最后一条消息的序号，重连时从该位置之后继续
+            epoch: since 所属的分发中心，与当前不一致时从头接收
+        """
         build_key = self.get_build_key(task_id, build_number)
-        
-        # 确保流存在
-        self.create_build_stream(task_id, build_number)
+        subscription = self._backend.subscribe(build_key, since, epoch)
         self.add_sse_client(task_id, build_number, client_id)
         
         try:
@@ -142,53 +122,44 @@ class LogStreamManager:
                             logger.info(f"Client {client_id} disconnected from build {task_id}#{build_number}")
                             break
                     
-                    # 获取日志队列
-                    with self._queues_lock:
-                        log_queue = self._log_queues.get(build_key)
-                    
-                    if log_queue is None:
-                        break
-                    
-                    try:
-                        # 等待新日志消息，超时时间为1秒
-                        log_msg = log_queue.get(timeout=1.0)
-                        yield log_msg
-                    except queue.Empty:
-                        # 超时，发送心跳
-                        yield None  # None表示心跳
+                    # 等待新日志消息，超时时间为1秒，超时返回None表示心跳
+                    message = subscription.get(timeout=1.0)
+                    if message is None:
+                        yield None
+                        continue
+
+                    yield LogMessage(
+                        task_id=task_id,
+                        build_number=build_number,
+                        message=message['message'],
+                        stage=message.get('stage'),
+                        timestamp=message.get('timestamp'),
+                        seq=message.get('seq', 0),
+                        epoch=message.get('epoch')
+                    )
                         
                 except Exception as e:
                     logger.error(f"Error in log stream for {task_id}#{build_number}: {str(e)}")
                     break
         finally:
             # 清理客户端
+            subscription.close()
             self.remove_sse_client(task_id, build_number, client_id)
     
     def complete_build(self, task_id: str, build_number: int, status: str):
         """标记构建完成"""
-        build_key = self.get_build_key(task_id, build_number)
-        
-        # 推送完成消息
-        completion_msg = LogMessage(
-            task_id=task_id,
-            build_number=build_number,
-            message=f"BUILD_COMPLETE:{status}",
-            stage="SYSTEM"
-        )
-        
-        with self._queues_lock:
-            if build_key in self._log_queues:
-                try:
-                    self._log_queues[build_key].put_nowait(completion_msg)
-                except queue.Full:
-                    pass
+        self._backend.publish(self.get_build_key(task_id, build_number), {
+            'message': f"{COMPLETE_PREFIX}{status}",
+            'stage': "SYSTEM",
+            'timestamp': time.time()
+        })
     
     def has_active_clients(self, task_id: str, build_number: int) -> bool:
-        """检查是否有活跃的SSE客户端"""
+        """检查当前进程中是否有活跃的SSE客户端"""
         build_key = self.get_build_key(task_id, build_number)
         
         with self._clients_lock:
             return build_key in self._sse_clients and len(self._sse_clients[build_key]) > 0
 
 # 全局单例实例
-log_stream_manager = LogStreamManager() 
\ No newline at end of file
+log_stream_manager = LogStreamManager()
@@ -0,0 +1,488 @@
+import os
+import json
+import time
+import uuid
+import queue
+import socket
+import logging
+import tempfile
+import threading
+from collections import deque
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Substr
+from .metrics import LOG_STREAM_DROPPED
+
+logger = logging.getLogger('apps')
+
+# 实时日志后端：memory 仅当前进程；socket 通过Unix域套接字在同一主机的多个进程间转发；database 从数据库轮询构建日志
+LOG_STREAM_BACKEND = getattr(settings, 'LOG_STREAM_BACKEND', 'memory')
+# socket 后端的套接字路径，同一主机上的进程需使用相同路径
+LOG_STREAM_SOCKET = getattr(settings, 'LOG_STREAM_SOCKET', os.path.join(tempfile.gettempdir(), 'liteops_log_stream.sock'))
+# database 后端轮询构建日志的间隔（秒）
+LOG_STREAM_DB_POLL_INTERVAL = getattr(settings, 'LOG_STREAM_DB_POLL_INTERVAL', 1.0)
+# 每个构建缓存的日志条数，后连接的客户端先收到缓存的日志
+LOG_STREAM_BUFFER_SIZE = 20000
+# 构建完成后缓存保留的时间（秒），期间连接的客户端仍可收到完整日志
+LOG_STREAM_RETENTION = 60
+# 长时间没有新日志的缓存视为构建进程异常退出遗留，予以清理（秒）
+LOG_STREAM_IDLE_TIMEOUT = 3600
+
+COMPLETE_PREFIX = 'BUILD_COMPLETE:'
+FINAL_STATUSES = ('success', 'failed', 'terminated')
+
+
+def is_complete_message(message):
+    return message.get('message', '').startswith(COMPLETE_PREFIX)
+
+
+class StreamHub:
+    """
+    进程内的日志分发中心
+
+    每个构建缓存最近的日志并为消息分配递增序号，订阅者先收到序号大于 since 的缓存日志，再接收新日志。
+    序号只在同一个分发中心内有效：消息附带分发中心的 epoch，转发服务切换到其他进程（或进程重启）后 epoch 改变，
+    订阅时传入的 epoch 与当前不一致说明 since 来自之前的分发中心，从头补发缓存的日志
+    """
+
+    def __init__(self, buffer_size=LOG_STREAM_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.epoch = uuid.uuid4().hex[:12]
+        self._streams = {}  # build_key -> {'seq', 'buffer', 'subscribers', 'completed_at', 'updated_at'}
+        self._lock = threading.Lock()
+
+    def _get_stream(self, build_key):
+        stream = self._streams.get(build_key)
+        if stream is None:
+            stream = {
+                'seq': 0,
+                'buffer': deque(maxlen=self.buffer_size),
+                'subscribers': set(),
+                'completed_at': None,
+                'updated_at': time.monotonic(),
+            }
+            self._streams[build_key] = stream
+        return stream
+
+    def _prune(self, now):
+        """清理已完成且无订阅者的构建缓存（调用方需持有锁）"""
+        for build_key, stream in list(self._streams.items()):
+            if stream['subscribers']:
+                continue
+            completed_at = stream['completed_at']
+            if (completed_at and now - completed_at > LOG_STREAM_RETENTION) or now - stream['updated_at'] > LOG_STREAM_IDLE_TIMEOUT:
+                del self._streams[build_key]
+
+    def open(self, build_key):
+        """为新构建创建日志流（同一构建重新开始时清空之前的缓存）"""
+        with self._lock:
+            stream = self._streams.get(build_key)
+            if stream and stream['completed_at']:
+                stream['buffer'].clear()
+                stream['completed_at'] = None
+            self._get_stream(build_key)
+
+    def publish(self, build_key, message):
+        """分发日志消息"""
+        now = time.monotonic()
+        with self._lock:
+            stream = self._get_stream(build_key)
+            stream['seq'] += 1
+            message = dict(message, seq=stream['seq'], epoch=self.epoch)
+            stream['buffer'].append(message)
+            stream['updated_at'] = now
+            if is_complete_message(message):
+                stream['completed_at'] = now
+                self._prune(now)
+            subscribers = list(stream['subscribers'])
+        for subscriber in subscribers:
+            if not subscriber(message):
+                self.unsubscribe(build_key, subscriber)
+
+    def subscribe(self, build_key, subscriber, since=0, epoch=None):
+        """订阅构建日志
+
+        Args:
+            subscriber: 接收消息的回调，返回False时取消订阅
+            since: 只补发序号大于该值的缓存日志
+            epoch: since 所属的分发中心，与当前不一致时忽略 since
+        """
+        if epoch and epoch != self.epoch:
+            since = 0
+        with self._lock:
+            stream = self._get_stream(build_key)
+            backlog = [message for message in stream['buffer'] if message['seq'] > since]
+            stream['subscribers'].add(subscriber)
+        for message in backlog:
+            if not subscriber(message):
+                self.unsubscribe(build_key, subscriber)
+                break
+
+    def unsubscribe(self, build_key, subscriber):
+        with self._lock:
+            stream = self._streams.get(build_key)
+            if stream:
+                stream['subscribers'].discard(subscriber)
+            self._prune(time.monotonic())
+
+
+class QueueSubscription:
+    """基于队列的订阅，get() 超时返回None"""
+
+    def __init__(self, maxsize=LOG_STREAM_BUFFER_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            LOG_STREAM_DROPPED.inc(reason='subscriber_full')
+            logger.warning('实时日志订阅队列已满，断开订阅')
+            return False
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        pass
+
+
+class MemoryBackend:
+    """进程内后端：构建和SSE请求需在同一进程中"""
+
+    def __init__(self):
+        self.hub = StreamHub()
+
+    def open(self, build_key):
+        self.hub.open(build_key)
+
+    def publish(self, build_key, message):
+        self.hub.publish(build_key, message)
+
+    def subscribe(self, build_key, since=0, epoch=None):
+        subscription = QueueSubscription()
+        self.hub.subscribe(build_key, subscription.put, since, epoch)
+        subscription.close = lambda: self.hub.unsubscribe(build_key, subscription.put)
+        return subscription
+
+
+def _send_json(sock, data):
+    sock.sendall((json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8'))
+
+
+class SocketBroker:
+    """
+    Unix域套接字日志转发服务
+
+    由同一主机上抢到文件锁的进程在后台线程中运行，其他进程作为客户端连接。
+    消息为逐行的JSON：{"op": "open|publish|subscribe", "key": [...], ...}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hub = StreamHub()
+
+    def serve(self, server):
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=self._handle, args=(conn,), name='log-stream-conn', daemon=True).start()
+
+    def _handle(self, conn):
+        outbox = queue.Queue(maxsize=LOG_STREAM_BUFFER_SIZE)
+        subscriptions = []
+
+        def send(message):
+            # 由写线程发送，读取缓慢的客户端不会阻塞日志分发，积压过多时断开该客户端
+            try:
+                outbox.put_nowait(message)
+                return True
+            except queue.Full:
+                LOG_STREAM_DROPPED.inc(reason='subscriber_full')
+                return False
+
+        def write():
+            while True:
+                message = outbox.get()
+                if message is None:
+                    return
+                try:
+                    _send_json(conn, message)
+                except OSError:
+                    return
+
+        writer = None
+        try:
+            reader = conn.makefile('r', encoding='utf-8')
+            for line in reader:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                build_key = tuple(request.get('key') or ())
+                op = request.get('op')
+                if op == 'publish':
+                    self.hub.publish(build_key, request['message'])
+                elif op == 'open':
+                    self.hub.open(build_key)
+                elif op == 'subscribe':
+                    if writer is None:
+                        writer = threading.Thread(target=write, name='log-stream-writer', daemon=True)
+                        writer.start()
+                    subscriptions.append(build_key)
+                    self.hub.subscribe(build_key, send, request.get('since', 0), request.get('epoch'))
+        except OSError:
+            pass
+        finally:
+            for build_key in subscriptions:
+                self.hub.unsubscribe(build_key, send)
+            if writer is not None:
+                try:
+                    outbox.put_nowait(None)
+                except queue.Full:
+                    pass
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+
+class SocketSubscription:
+    """套接字订阅：连接中断时重新连接，并从最后收到的序号继续
+
+    重连的可能是接替的新转发服务，订阅时带上最后收到的消息的 epoch，由转发服务判断序号是否仍然有效
+    """
+
+    def __init__(self, backend, build_key, since, epoch=None):
+        self.backend = backend
+        self.build_key = build_key
+        self.last_seq = since
+        self.epoch = epoch
+        self.sock = None
+        self.buffer = b''
+
+    def _connect(self):
+        self.sock = self.backend.connect()
+        _send_json(self.sock, {'op': 'subscribe', 'key': list(self.build_key), 'since': self.last_seq, 'epoch': self.epoch})
+        self.buffer = b''
+
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            if b'\n' in self.buffer:
+                line, self.buffer = self.buffer.split(b'\n', 1)
+                message = json.loads(line.decode('utf-8'))
+                self.last_seq = message.get('seq', self.last_seq)
+                self.epoch = message.get('epoch', self.epoch)
+                return message
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                if self.sock is None:
+                    self._connect()
+                self.sock.settimeout(remaining)
+                data = self.sock.recv(65536)
+                if not data:
+                    raise ConnectionResetError('日志转发服务已断开')
+                self.buffer += data
+            except socket.timeout:
+                return None
+            except OSError as e:
+                logger.debug(f'实时日志订阅连接中断，稍后重连: {str(e)}')
+                self.close()
+                time.sleep(min(0.5, max(deadline - time.monotonic(), 0)))
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class SocketBackend:
+    """
+    Unix域套接字后端：同一主机上的多个 uvicorn worker 和构建进程共享日志流
+
+    第一个拿到文件锁的进程负责运行转发服务，该进程退出后其他进程在下次连接时接替
+    """
+
+    def __init__(self, path=LOG_STREAM_SOCKET):
+        self.path = path
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._lock_file = None
+        self._publisher = None
+
+    def _try_become_broker(self):
+        """尝试获取文件锁并启动转发服务（调用方需持有 _lock）"""
+        if self._lock_file is not None:
+            return
+        import fcntl
+        lock_file = open(self.path + '.lock', 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+
+        # 持有锁时残留的套接字文件一定来自已退出的进程
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(128)
+        self._lock_file = lock_file
+        broker = SocketBroker(self.path)
+        threading.Thread(target=broker.serve, args=(server,), name='log-stream-broker', daemon=True).start()
+        logger.info(f'实时日志转发服务已启动: {self.path}')
+
+    def connect(self):
+        """连接转发服务，服务不存在时尝试在当前进程启动"""
+        for attempt in range(2):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                return sock
+            except OSError:
+                sock.close()
+                if attempt:
+                    raise
+                with self._lock:
+                    self._try_become_broker()
+
+    def _send(self, data):
+        """通过共享的发布连接发送消息，连接断开时重连一次；转发服务不可用时丢弃消息"""
+        with self._send_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self.connect()
+                    _send_json(self._publisher, data)
+                    return
+                except OSError as e:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                        self._publisher = None
+                    if attempt:
+                        LOG_STREAM_DROPPED.inc(reason='broker_unavailable')
+                        logger.debug(f'发送实时日志失败: {str(e)}')
+
+    def open(self, build_key):
+        self._send({'op': 'open', 'key': list(build_key)})
+
+    def publish(self, build_key, message):
+        self._send({'op': 'publish', 'key': list(build_key), 'message': message})
+
+    def subscribe(self, build_key, since=0, epoch=None):
+        return SocketSubscription(self, build_key, since, epoch)
+
+
+class DatabaseSubscription:
+    """轮询数据库中构建日志新增内容的订阅，消息序号为该行结束处的字符偏移量"""
+
+    def __init__(self, build_key, since):
+        self.build_key = build_key
+        self.offset = since
+        self.pending = deque()
+        self.final_seen = False
+        self.completed = False
+        self.next_poll = 0
+
+    def _poll(self):
+        from ..models import BuildHistory
+        from .log_codec import get_build_log
+
+        task_id, build_number = self.build_key
+        history = BuildHistory.objects.filter(task_id=task_id, build_number=build_number).annotate(
+            tail=Substr('build_log', self.offset + 1)
+        ).only('id', 'status', 'build_log_compressed', 'log_codec').first()
+        if history is None:
+            self._complete('failed')
+            return
+
+        if history.tail is not None:
+            text = history.tail
+        elif history.build_log_compressed:
+            # 构建结束后日志已被压缩
+            history.build_log = None
+            text = get_build_log(history)[self.offset:]
+        else:
+            text = ''
+
+        is_final = history.status in FINAL_STATUSES
+        # 构建未结束时最后一行可能还未写完整，只读取到最后一个换行为止
+        end = len(text) if is_final else text.rfind('\n') + 1
+        position = self.offset
+        for line in text[:end].splitlines(keepends=True):
+            position += len(line)
+            if line.strip('\n'):
+                self.pending.append({'message': line.rstrip('\n') + '\n', 'stage': None, 'seq': position})
+        self.offset += max(end, 0)
+
+        # 构建结束后再等待一轮没有新内容的轮询，确保最后的日志已写入
+        if is_final and end == 0 and self.final_seen:
+            self._complete(history.status)
+        self.final_seen = is_final
+
+    def _complete(self, status):
+        self.pending.append({'message': f'{COMPLETE_PREFIX}{status}', 'stage': 'SYSTEM', 'seq': self.offset})
+        self.completed = True
+
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.pending:
+                return self.pending.popleft()
+            if self.completed:
+                return None
+            now = time.monotonic()
+            if now >= self.next_poll:
+                self.next_poll = now + LOG_STREAM_DB_POLL_INTERVAL
+                self._poll()
+                continue
+            if now >= deadline:
+                return None
+            time.sleep(min(self.next_poll, deadline) - now)
+
+    def close(self):
+        # 订阅在SSE的读取线程中运行，结束时关闭该线程的数据库连接
+        connection.close()
+
+
+class DatabaseBackend:
+    """
+    数据库后端：SSE请求从数据库轮询构建日志，不需要与构建在同一主机
+
+    构建过程中日志每10条或5秒写入一次数据库，实时性低于其他后端
+    """
+
+    def open(self, build_key):
+        pass
+
+    def publish(self, build_key, message):
+        # 日志由构建过程写入数据库
+        pass
+
+    def subscribe(self, build_key, since=0, epoch=None):
+        # 序号为日志在数据库中的位置，不随进程变化，忽略 epoch
+        return DatabaseSubscription(build_key, since)
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'socket': SocketBackend,
+    'database': DatabaseBackend,
+}
+
+
+def create_backend(name=LOG_STREAM_BACKEND):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f'不支持的实时日志后端: {name}')
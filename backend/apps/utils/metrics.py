@@ -0,0 +1,239 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from ..models import BuildHistory, NotificationOutbox
+
+logger = logging.getLogger('apps')
+
+# 默认的耗时分桶（秒），覆盖从毫秒级的数据库写入到小时级的构建
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 600, 1800, 3600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """指标基类，按标签值分别记录，所有操作线程安全"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames and self.type != 'histogram':
+            # 无标签的指标从0开始输出，采集端不必区分"没有数据"和"值为0"
+            self._values[()] = 0
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """返回 [(后缀, 标签值, 额外标签, 值)]"""
+        with self._lock:
+            return [('', key, None, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        for suffix, labelvalues, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    """只增不减的计数"""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """可增可减的当前值；设置了取值函数时在采集时计算"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """设置取值函数，无标签时返回数值，有标签时返回 {标签值元组: 数值}"""
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            return super().samples()
+        try:
+            value = self._function()
+        except Exception as e:
+            logger.error(f'采集指标 {self.name} 失败: {str(e)}')
+            return []
+        if self.labelnames:
+            return [('', tuple(str(v) for v in key), None, item) for key, item in value.items()]
+        return [('', (), None, value)]
+
+
+class Histogram(Metric):
+    """按分桶统计观测值的分布（如耗时）"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            state['counts'][index] += 1
+            state['sum'] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """统计代码块的执行耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            states = [(key, list(state['counts']), state['sum']) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total in states:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', key, ('le', _format_value(float(bound))), cumulative))
+            samples.append(('_sum', key, None, total))
+            samples.append(('_count', key, None, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    指标保存在当前进程内存中；uvicorn 以多个 worker 运行时，每次采集得到的是处理该请求的 worker 的数据，
+    构建相关指标在执行构建的进程中累计
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f'指标 {name} 已注册为 {metric.type}')
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """生成 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# 构建
+BUILDS_STARTED = registry.counter('liteops_builds_started_total', '开始执行的构建数')
+BUILDS_FINISHED = registry.counter('liteops_builds_finished_total', '结束的构建数', ['status'])
+BUILDS_RUNNING = registry.gauge('liteops_builds_running', '当前进程中正在执行的构建数')
+BUILD_QUEUE_DEPTH = registry.gauge('liteops_build_queue_depth', '等待执行的构建数')
+BUILD_DURATION = registry.histogram('liteops_build_duration_seconds', '构建耗时', ['status'])
+BUILD_STAGE_DURATION = registry.histogram('liteops_build_stage_duration_seconds', '构建阶段耗时', ['status'])
+
+# 构建日志
+BUILD_LOG_LINES = registry.counter('liteops_build_log_lines_total', '构建产生的日志行数')
+BUILD_LOG_SAVE_DURATION = registry.histogram(
+    'liteops_build_log_save_seconds', '构建日志写入数据库的耗时',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+# 实时日志流
+LOG_STREAM_MESSAGES = registry.counter('liteops_log_stream_messages_total', '推送到实时日志流的消息数')
+LOG_STREAM_DROPPED = registry.counter('liteops_log_stream_dropped_total', '实时日志流丢弃的消息数', ['reason'])
+SSE_CLIENTS = registry.gauge('liteops_sse_clients', '当前进程中连接的SSE客户端数')
+SSE_CONNECTIONS = registry.counter('liteops_sse_connections_total', 'SSE客户端连接次数')
+
+# 通知
+NOTIFICATIONS_ENQUEUED = registry.counter('liteops_notifications_enqueued_total', '写入发件箱的构建通知数', ['type'])
+NOTIFICATION_ERRORS = registry.counter('liteops_notification_errors_total', '生成或写入构建通知失败的次数', ['stage'])
+NOTIFICATION_OUTBOX_PENDING = registry.gauge('liteops_notification_outbox_pending', '发件箱中等待发送的通知数')
+
+# 认证
+AUTH_REQUESTS = registry.counter('liteops_auth_requests_total', '接口Token认证次数', ['result'])
+AUTH_DURATION = registry.histogram(
+    'liteops_auth_duration_seconds', 'Token校验耗时',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+# 队列类指标在采集时从数据库读取，多进程部署时各 worker 结果一致
+BUILD_QUEUE_DEPTH.set_function(lambda: BuildHistory.objects.filter(status='pending').count())
+NOTIFICATION_OUTBOX_PENDING.set_function(lambda: NotificationOutbox.objects.filter(status='pending').count())
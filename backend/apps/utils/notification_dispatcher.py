@@ -0,0 +1,471 @@
+import time
+import uuid
+import hmac
+import base64
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import close_old_connections
+from ..models import NotificationOutbox
+
+logger = logging.getLogger('apps')
+
+# 并发发送的线程数
+NOTIFICATION_WORKERS = getattr(settings, 'NOTIFICATION_WORKERS', 4)
+# 请求超时时间（连接超时, 读取超时），单位秒
+NOTIFICATION_TIMEOUT = getattr(settings, 'NOTIFICATION_TIMEOUT', (3, 10))
+# 最大尝试次数，超过后标记为失败
+NOTIFICATION_MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+# 重试退避的基础间隔和最大间隔（秒），第N次重试等待 base * 2^(N-1)
+NOTIFICATION_RETRY_BASE = getattr(settings, 'NOTIFICATION_RETRY_BASE', 10)
+NOTIFICATION_RETRY_MAX = getattr(settings, 'NOTIFICATION_RETRY_MAX', 600)
+# 发件箱轮询间隔（秒），新通知入队时会立即唤醒
+NOTIFICATION_POLL_INTERVAL = getattr(settings, 'NOTIFICATION_POLL_INTERVAL', 5)
+# 处于发送中超过该时间（秒）的记录视为进程异常退出遗留，重新放回待发送
+NOTIFICATION_STALE_SENDING = 300
+# 检查遗留记录的间隔（秒）；进程崩溃后很快重启时，遗留记录要等超过 NOTIFICATION_STALE_SENDING 才能识别，不能只在启动时检查
+NOTIFICATION_RECOVER_INTERVAL = 60
+# 每次从发件箱领取的记录数
+CLAIM_BATCH_SIZE = 50
+# 已发送成功或最终失败的记录保留天数，过期后由发送线程定期删除，0表示不删除
+NOTIFICATION_OUTBOX_RETENTION_DAYS = getattr(settings, 'NOTIFICATION_OUTBOX_RETENTION_DAYS', 30)
+# 清理过期记录的间隔（秒）和每批删除的记录数
+OUTBOX_PRUNE_INTERVAL = 3600
+OUTBOX_PRUNE_BATCH_SIZE = 500
+# 汇总窗口（秒）：同一机器人在窗口内再次产生的通知先暂存，到期后合并为一条汇总消息发送，0表示不合并
+NOTIFICATION_DIGEST_WINDOW = getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', 60)
+# 单条汇总消息最多包含的通知数，超出部分进入下一条汇总
+NOTIFICATION_DIGEST_MAX_ITEMS = getattr(settings, 'NOTIFICATION_DIGEST_MAX_ITEMS', 20)
+# 各类型机器人每分钟允许发送的消息数（按单个机器人限流）
+NOTIFICATION_RATE_LIMITS = getattr(settings, 'NOTIFICATION_RATE_LIMITS', {
+    'dingtalk': 20,
+    'wecom': 20,
+    'feishu': 100,
+})
+# 汇总消息内容的最大字节数，企业微信markdown消息上限为4096字节
+DIGEST_CONTENT_LIMITS = {
+    'dingtalk': 18000,
+    'wecom': 4000,
+    'feishu': 18000,
+}
+
+
+def sign_webhook(secret: str, timestamp: str) -> str:
+    """钉钉/飞书机器人加签"""
+    string_to_sign = f'{timestamp}\n{secret}'
+    hmac_code = hmac.new(
+        secret.encode('utf-8'),
+        string_to_sign.encode('utf-8'),
+        digestmod=hashlib.sha256
+    ).digest()
+    return base64.b64encode(hmac_code).decode('utf-8')
+
+
+def build_webhook_request(robot):
+    """根据机器人的安全设置生成请求地址和请求头
+
+    Returns:
+        tuple: (webhook地址, 请求头)
+    """
+    webhook = robot.webhook
+    headers = {}
+    if robot.security_type == 'secret' and robot.secret:
+        timestamp = str(int(time.time() * 1000))
+        sign = sign_webhook(robot.secret, timestamp)
+        if robot.type == 'dingtalk':
+            webhook = f"{webhook}&timestamp={timestamp}&sign={quote_plus(sign)}"
+        elif robot.type == 'feishu':
+            headers.update({
+                "X-Timestamp": timestamp,
+                "X-Sign": sign
+            })
+    return webhook, headers
+
+
+def check_webhook_response(response):
+    """检查机器人接口的响应
+
+    Returns:
+        tuple: (是否成功, 错误信息)
+    """
+    if response.status_code != 200:
+        return False, f'HTTP {response.status_code}: {response.text[:500]}'
+    try:
+        resp_json = response.json()
+    except ValueError:
+        return False, f'响应格式错误: {response.text[:500]}'
+    if resp_json.get('errcode') == 0 or resp_json.get('StatusCode') == 0 or resp_json.get('code') == 0:
+        return True, None
+    return False, response.text[:500]
+
+
+def get_retry_delay(attempts):
+    """第attempts次失败后的重试等待时间（秒）"""
+    return min(NOTIFICATION_RETRY_BASE * (2 ** (attempts - 1)), NOTIFICATION_RETRY_MAX)
+
+
+def _fit_lines(header, lines, footer, limit):
+    """在内容字节数上限内尽量多地保留明细行，超出部分以省略说明代替"""
+    def size(items):
+        return len('\n'.join(items).encode('utf-8'))
+
+    kept = []
+    for index, line in enumerate(lines):
+        rest = len(lines) - index - 1
+        tail = [f'…… 另有 {rest} 条未展示'] if rest else []
+        if size(header + kept + [line] + tail + footer) > limit:
+            kept.append(f'…… 另有 {len(lines) - index} 条未展示')
+            break
+        kept.append(line)
+    return '\n'.join(header + kept + footer)
+
+
+def build_digest_message(robot_type, outboxes):
+    """将同一机器人的多条通知合并为一条汇总消息
+
+    Args:
+        robot_type: 机器人类型
+        outboxes: 发件箱记录列表（需预加载history）
+    Returns:
+        dict: 对应机器人类型的消息内容
+    """
+    counts = {}
+    for outbox in outboxes:
+        status = outbox.history.status if outbox.history else 'unknown'
+        counts[status] = counts.get(status, 0) + 1
+
+    title = f'构建通知汇总：共 {len(outboxes)} 次构建'
+    stats = f"成功 {counts.get('success', 0)} 次，失败 {counts.get('failed', 0)} 次，终止 {counts.get('terminated', 0)} 次"
+    lines = [f'- {outbox.summary}' for outbox in outboxes]
+    footer = ['', '---', '此为自动通知，请勿回复']
+    limit = DIGEST_CONTENT_LIMITS.get(robot_type, 4000)
+
+    if robot_type == 'dingtalk':
+        header = [f'## 🔔 {title}', '---', f'**{stats}**', '']
+        return {
+            "msgtype": "markdown",
+            "markdown": {
+                "title": title,
+                "text": _fit_lines(header, lines, footer, limit)
+            },
+            "at": {
+                "isAtAll": True
+            }
+        }
+    if robot_type == 'wecom':
+        header = [f'## 🔔 {title}', '---', '@all', '', f'**{stats}**', '']
+        return {
+            "msgtype": "markdown",
+            "markdown": {
+                "content": _fit_lines(header, lines, footer, limit)
+            }
+        }
+    header = [f'🔔 {title}', '---', '<at user_id="all">所有人</at>', '', stats, '']
+    return {
+        "msg_type": "text",
+        "content": {
+            "text": _fit_lines(header, lines, footer, limit)
+        }
+    }
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充令牌，允许不超过容量的突发"""
+
+    def __init__(self, rate, capacity):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 令牌桶容量
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def acquire(self):
+        """尝试取出一个令牌
+
+        Returns:
+            float: 0 表示成功取得令牌，否则为需要等待的秒数
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """按机器人维护令牌桶，速率由机器人类型决定"""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, robot_id, robot_type):
+        per_minute = self.limits.get(robot_type)
+        if not per_minute:
+            return 0
+        with self._lock:
+            bucket = self._buckets.get(robot_id)
+            if bucket is None or bucket.capacity != per_minute:
+                bucket = self._buckets[robot_id] = TokenBucket(per_minute / 60.0, per_minute)
+            return bucket.acquire()
+
+
+class NotificationDispatcher:
+    """
+    通知发送器
+
+    通知先写入发件箱，由后台线程领取后通过连接池并发发送，失败按指数退避重试，
+    构建线程不再等待第三方Webhook。同一机器人短时间内的多条通知合并为汇总消息，
+    并按机器人类型的频率限制发送
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max(NOTIFICATION_WORKERS, 10))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._rate_limiter = RateLimiter(NOTIFICATION_RATE_LIMITS)
+        self._next_prune = 0
+        self._next_recover = 0
+        # 本进程已领取、尚未发送完成的记录（可能还在线程池中排队），恢复遗留记录时跳过
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+
+    def post(self, url, message, headers=None):
+        """使用共享连接池发送请求（带超时）"""
+        return self.session.post(url, json=message, headers=headers or {}, timeout=NOTIFICATION_TIMEOUT)
+
+    def start(self):
+        """启动后台发送线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._executor = ThreadPoolExecutor(max_workers=NOTIFICATION_WORKERS, thread_name_prefix='notification')
+            self._thread = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+            self._thread.start()
+            logger.info('通知发送线程已启动')
+
+    def enqueue(self, robots, messages, history=None, summaries=None):
+        """将通知写入发件箱
+
+        Args:
+            robots: 通知机器人列表
+            messages: 机器人ID -> 消息内容
+            history: 关联的构建历史
+            summaries: 机器人ID -> 合并为汇总消息时使用的单行摘要，未提供时不参与合并
+        """
+        summaries = summaries or {}
+        now = datetime.now()
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(
+                robot=robot,
+                history=history,
+                message=messages[robot.robot_id],
+                summary=summaries.get(robot.robot_id),
+                status='pending',
+                next_attempt_time=self._get_due_time(robot, now) if summaries.get(robot.robot_id) else now
+            )
+            for robot in robots if robot.robot_id in messages
+        ])
+        self.start()
+        self._wakeup.set()
+
+    def _get_due_time(self, robot, now):
+        """计算新通知的发送时间
+
+        机器人在汇总窗口内没有其他通知时立即发送；已有暂存的通知时与其一同发送；
+        否则暂存到上一条通知之后一个窗口，期间的通知合并为一条汇总
+        """
+        if NOTIFICATION_DIGEST_WINDOW <= 0:
+            return now
+        last = NotificationOutbox.objects.filter(
+            robot=robot,
+            create_time__gte=now - timedelta(seconds=NOTIFICATION_DIGEST_WINDOW)
+        ).order_by('-create_time').values('status', 'attempts', 'next_attempt_time', 'create_time').first()
+        if not last:
+            return now
+        if last['status'] == 'pending' and last['attempts'] == 0 and last['next_attempt_time'] and last['next_attempt_time'] > now:
+            return last['next_attempt_time']
+        return max(now, last['create_time'] + timedelta(seconds=NOTIFICATION_DIGEST_WINDOW))
+
+    def _run(self):
+        while True:
+            try:
+                close_old_connections()
+                if time.monotonic() >= self._next_recover:
+                    self._next_recover = time.monotonic() + NOTIFICATION_RECOVER_INTERVAL
+                    self._recover_stale()
+                self._prune_finished()
+                batches, fetched = self._claim_due()
+                for outbox_ids in batches:
+                    self._submit(outbox_ids)
+                # 领取满一批时立即继续，否则等待新通知或下次轮询
+                if fetched < CLAIM_BATCH_SIZE:
+                    self._wakeup.wait(NOTIFICATION_POLL_INTERVAL)
+                    self._wakeup.clear()
+            except Exception as e:
+                logger.error(f'通知发送线程出错: {str(e)}', exc_info=True)
+                time.sleep(NOTIFICATION_POLL_INTERVAL)
+
+    def _submit(self, outbox_ids):
+        """提交到线程池发送，发送结束前记录为本进程处理中"""
+        with self._inflight_lock:
+            self._inflight.update(outbox_ids)
+        future = self._executor.submit(self._deliver, outbox_ids)
+        future.add_done_callback(lambda _: self._release(outbox_ids))
+
+    def _release(self, outbox_ids):
+        with self._inflight_lock:
+            self._inflight.difference_update(outbox_ids)
+
+    def _recover_stale(self):
+        """将异常退出时遗留在发送中的记录放回待发送（定期执行，跳过本进程仍在处理的记录）"""
+        try:
+            with self._inflight_lock:
+                inflight = list(self._inflight)
+            stale_before = datetime.now() - timedelta(seconds=NOTIFICATION_STALE_SENDING)
+            count = NotificationOutbox.objects.filter(
+                status='sending', update_time__lt=stale_before
+            ).exclude(id__in=inflight).update(status='pending', next_attempt_time=datetime.now())
+            if count:
+                logger.info(f'恢复 {count} 条未发送完成的通知')
+        except Exception as e:
+            logger.error(f'恢复未发送完成的通知失败: {str(e)}', exc_info=True)
+
+    def _prune_finished(self):
+        """定期删除超过保留天数的已结束记录，避免发件箱无限增长拖慢领取查询；按主键分批删除，避免长事务"""
+        now = time.monotonic()
+        if NOTIFICATION_OUTBOX_RETENTION_DAYS <= 0 or now < self._next_prune:
+            return
+        self._next_prune = now + OUTBOX_PRUNE_INTERVAL
+        try:
+            expired = NotificationOutbox.objects.filter(
+                status__in=('success', 'failed'),
+                update_time__lt=datetime.now() - timedelta(days=NOTIFICATION_OUTBOX_RETENTION_DAYS)
+            )
+            total = 0
+            while True:
+                ids = list(expired.order_by('id').values_list('id', flat=True)[:OUTBOX_PRUNE_BATCH_SIZE])
+                if not ids:
+                    break
+                total += NotificationOutbox.objects.filter(id__in=ids).delete()[0]
+            if total:
+                logger.info(f'清理 {total} 条过期的通知发件箱记录')
+        except Exception as e:
+            logger.error(f'清理通知发件箱失败: {str(e)}', exc_info=True)
+
+    def _group_due(self, rows):
+        """将到期记录分组：重试中的汇总按原批次发送，同一机器人带摘要的新通知合并，其余单独发送"""
+        groups = {}
+        for row in rows:
+            if row['batch_id']:
+                key = ('batch', row['batch_id'])
+            elif row['summary'] and NOTIFICATION_DIGEST_WINDOW > 0:
+                key = ('robot', row['robot_id'])
+            else:
+                key = ('single', row['id'])
+            groups.setdefault(key, []).append(row)
+
+        result = []
+        for (kind, _), items in groups.items():
+            if kind == 'robot':
+                for i in range(0, len(items), NOTIFICATION_DIGEST_MAX_ITEMS):
+                    result.append(items[i:i + NOTIFICATION_DIGEST_MAX_ITEMS])
+            else:
+                result.append(items)
+        return result
+
+    def _claim_due(self):
+        """领取到期的待发送记录，使用条件更新避免多个进程重复发送
+
+        Returns:
+            tuple: (待发送批次列表, 本次查询到的记录数)
+        """
+        now = datetime.now()
+        rows = list(NotificationOutbox.objects.filter(
+            status='pending',
+            next_attempt_time__lte=now
+        ).order_by('next_attempt_time', 'id').values(
+            'id', 'robot_id', 'robot__type', 'batch_id', 'summary'
+        )[:CLAIM_BATCH_SIZE])
+
+        batches = []
+        for group in self._group_due(rows):
+            ids = [row['id'] for row in group]
+            wait = self._rate_limiter.acquire(group[0]['robot_id'], group[0]['robot__type'])
+            if wait:
+                # 超过频率限制，推迟到有令牌时再发送，不计入尝试次数
+                NotificationOutbox.objects.filter(id__in=ids, status='pending').update(
+                    next_attempt_time=now + timedelta(seconds=wait), update_time=now
+                )
+                continue
+
+            claimed = [
+                outbox_id for outbox_id in ids
+                if NotificationOutbox.objects.filter(id=outbox_id, status='pending').update(status='sending', update_time=now)
+            ]
+            if not claimed:
+                continue
+            if len(claimed) > 1 and not group[0]['batch_id']:
+                NotificationOutbox.objects.filter(id__in=claimed).update(batch_id=uuid.uuid4().hex)
+            batches.append(claimed)
+        return batches, len(rows)
+
+    def _deliver(self, outbox_ids):
+        """发送一条通知或汇总消息，并更新对应发件箱记录的状态"""
+        close_old_connections()
+        outboxes = list(NotificationOutbox.objects.select_related('robot', 'history').filter(id__in=outbox_ids).order_by('id'))
+        if not outboxes:
+            return
+
+        robot = outboxes[0].robot
+        attempts = max(outbox.attempts for outbox in outboxes) + 1
+        try:
+            if not robot or not robot.webhook:
+                raise ValueError('通知机器人不存在或未配置Webhook')
+            if len(outboxes) > 1:
+                message = build_digest_message(robot.type, outboxes)
+            else:
+                message = outboxes[0].message
+            webhook, headers = build_webhook_request(robot)
+            response = self.post(webhook, message, headers)
+            success, error = check_webhook_response(response)
+        except Exception as e:
+            success, error = False, str(e)
+
+        now = datetime.now()
+        rows = NotificationOutbox.objects.filter(id__in=[outbox.id for outbox in outboxes])
+        description = f'{len(outboxes)} 条汇总' if len(outboxes) > 1 else ''
+        if success:
+            rows.update(status='success', attempts=attempts, sent_time=now, last_error=None, update_time=now)
+            logger.info(f"发送 {robot.type} 通知成功: {robot.name} {description}")
+        elif attempts >= NOTIFICATION_MAX_ATTEMPTS or not robot:
+            rows.update(status='failed', attempts=attempts, last_error=error, update_time=now)
+            logger.error(f"发送通知失败，已达到最大重试次数: {error}")
+        else:
+            delay = get_retry_delay(attempts)
+            rows.update(
+                status='pending', attempts=attempts, last_error=error,
+                next_attempt_time=now + timedelta(seconds=delay), update_time=now
+            )
+            logger.warning(f"发送 {robot.type} 通知失败，{delay}秒后重试: {error}")
+        close_old_connections()
+
+notification_dispatcher = NotificationDispatcher()
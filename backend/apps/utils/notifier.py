@@ -1,13 +1,8 @@
-import json
-import time
-import hmac
-import base64
-import hashlib
 import logging
-import requests
-from urllib.parse import quote_plus
 from django.conf import settings
 from ..models import NotificationRobot, BuildHistory
+from .notification_dispatcher import notification_dispatcher
+from .metrics import NOTIFICATIONS_ENQUEUED, NOTIFICATION_ERRORS
 
 logger = logging.getLogger('apps')
 
@@ -20,26 +15,6 @@ class BuildNotifier:
         self.project = history.task.project
         self.environment = history.task.environment
 
-    def _sign_dingtalk(self, secret: str, timestamp: str) -> str:
-        """钉钉机器人签名"""
-        string_to_sign = f'{timestamp}\n{secret}'
-        hmac_code = hmac.new(
-            secret.encode('utf-8'),
-            string_to_sign.encode('utf-8'),
-            digestmod=hashlib.sha256
-        ).digest()
-        return base64.b64encode(hmac_code).decode('utf-8')
-
-    def _sign_feishu(self, secret: str, timestamp: str) -> str:
-        """飞书机器人签名"""
-        string_to_sign = f'{timestamp}\n{secret}'
-        hmac_code = hmac.new(
-            secret.encode('utf-8'),
-            string_to_sign.encode('utf-8'),
-            digestmod=hashlib.sha256
-        ).digest()
-        return base64.b64encode(hmac_code).decode('utf-8')
-
     def _get_build_status_emoji(self) -> str:
         """获取构建状态对应的emoji"""
         status_emoji = {
@@ -198,55 +173,47 @@ class BuildNotifier:
             }
         }
 
+    def _format_summary_line(self) -> str:
+        """格式化合并为汇总消息时使用的单行摘要"""
+        return (
+            f"{self._get_build_status_emoji()} **{self.task.name}** #{self.history.build_number} "
+            f"{self._get_status_text()}｜{self.environment.name}｜{self.history.branch or '无'}｜"
+            f"{self._get_duration_text()}｜[查看日志]({self._get_build_url()})"
+        )
+
     def send_notifications(self):
-        """发送构建通知"""
+        """将构建通知写入发件箱，由后台发送线程异步投递"""
         if not self.task.notification_channels:
             logger.info(f"任务 {self.task.name} 未配置通知方式")
             return
         
         # 获取需要通知的机器人
-        robots = NotificationRobot.objects.filter(robot_id__in=self.task.notification_channels)
+        robots = list(NotificationRobot.objects.filter(robot_id__in=self.task.notification_channels))
         
+        messages = {}
+        summaries = {}
         for robot in robots:
             try:
-                webhook = robot.webhook
-                timestamp = str(int(time.time() * 1000))
-                headers = {}
-                
-                # 根据机器人类型处理安全设置
-                if robot.security_type == 'secret' and robot.secret:
-                    if robot.type == 'dingtalk':
-                        sign = self._sign_dingtalk(robot.secret, timestamp)
-                        webhook = f"{webhook}&timestamp={timestamp}&sign={quote_plus(sign)}"
-                    elif robot.type == 'feishu':
-                        sign = self._sign_feishu(robot.secret, timestamp)
-                        headers.update({
-                            "X-Timestamp": timestamp,
-                            "X-Sign": sign
-                        })
-                
                 # 根据机器人类型获取消息内容
                 if robot.type == 'dingtalk':
-                    message = self._format_dingtalk_message()
+                    messages[robot.robot_id] = self._format_dingtalk_message()
                 elif robot.type == 'wecom':
-                    message = self._format_wecom_message()
+                    messages[robot.robot_id] = self._format_wecom_message()
                 elif robot.type == 'feishu':
-                    message = self._format_feishu_message()
+                    messages[robot.robot_id] = self._format_feishu_message()
                 else:
                     logger.error(f"不支持的机器人类型: {robot.type}")
                     continue
-                
-                # 发送通知
-                response = requests.post(webhook, json=message, headers=headers)
-                
-                if response.status_code == 200:
-                    resp_json = response.json()
-                    if resp_json.get('errcode') == 0 or resp_json.get('StatusCode') == 0 or resp_json.get('code') == 0:
-                        logger.info(f"发送 {robot.type} 通知成功: {robot.name}")
-                    else:
-                        logger.error(f"发送 {robot.type} 通知失败: {response.text}")
-                else:
-                    logger.error(f"发送 {robot.type} 通知失败: {response.text}")
-                    
+                summaries[robot.robot_id] = self._format_summary_line()
             except Exception as e:
-                logger.error(f"发送 {robot.type} 通知出错: {str(e)}", exc_info=True) 
\ No newline at end of file
+                NOTIFICATION_ERRORS.inc(stage='format')
+                logger.error(f"生成 {robot.type} 通知内容出错: {str(e)}", exc_info=True)
+        
+        try:
+            notification_dispatcher.enqueue(robots, messages, history=self.history, summaries=summaries)
+            for robot in robots:
+                if robot.robot_id in messages:
+                    NOTIFICATIONS_ENQUEUED.inc(type=robot.type)
+        except Exception as e:
+            NOTIFICATION_ERRORS.inc(stage='enqueue')
+            logger.error(f"写入通知发件箱失败: {str(e)}", exc_info=True)
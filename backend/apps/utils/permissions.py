@@ -1,128 +1,258 @@
 import json
+import time
+import uuid
 import logging
-from ..models import User, UserRole
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from ..models import Role
 
 logger = logging.getLogger('apps')
 
-def get_user_permissions(user_id):
+# 权限缓存有效期（秒）；角色/用户角色变更时更新 Django 缓存中的版本号，各进程使用缓存前比对版本号，
+# 未配置共享缓存的多进程部署只能依赖此项感知其他进程的修改
+PERMISSION_CACHE_TTL = getattr(settings, 'PERMISSION_CACHE_TTL', 60)
+
+# 全部用户/单个用户的权限版本号缓存键
+PERMISSION_VERSION_KEY = 'liteops:permission_version'
+USER_PERMISSION_VERSION_KEY = 'liteops:permission_version:{}'
+
+
+class CompiledPermissions:
     """
-    获取用户的权限信息
-    
+    编译后的用户有效权限
+
+    将用户所有角色的权限合并为不可变集合，提供O(1)的权限判断和预先构造的数据权限过滤条件
+    """
+    __slots__ = ('menu', 'functions', 'project_ids', 'environment_types', '_project_q', '_environment_q')
+
+    def __init__(self, menu=(), functions=(), project_ids=None, environment_types=None):
+        """
+        Args:
+            menu: 菜单路径
+            functions: (模块, 操作) 二元组
+            project_ids: 可访问的项目ID，None表示全部项目
+            environment_types: 可访问的环境类型，None表示全部环境
+        """
+        self.menu = frozenset(menu)
+        self.functions = frozenset(functions)
+        self.project_ids = frozenset(project_ids) if project_ids is not None else None
+        self.environment_types = frozenset(environment_types) if environment_types is not None else None
+        self._project_q = {}
+        self._environment_q = {}
+
+    @property
+    def project_scope(self):
+        return 'all' if self.project_ids is None else 'custom'
+
+    @property
+    def environment_scope(self):
+        return 'all' if self.environment_types is None else 'custom'
+
+    def has(self, module, action):
+        """是否拥有指定模块的操作权限"""
+        return (module, action) in self.functions
+
+    def has_menu(self, path):
+        """是否拥有指定菜单权限"""
+        return path in self.menu
+
+    def can_access_project(self, project_id):
+        """是否可以访问指定项目"""
+        return self.project_ids is None or project_id in self.project_ids
+
+    def can_access_environment_type(self, environment_type):
+        """是否可以访问指定类型的环境"""
+        return self.environment_types is None or environment_type in self.environment_types
+
+    def project_q(self, field='project__project_id'):
+        """项目数据权限过滤条件
+
+        Args:
+            field: 查询中项目ID对应的字段路径
+        """
+        if field not in self._project_q:
+            self._project_q[field] = Q() if self.project_ids is None else Q(**{f'{field}__in': list(self.project_ids)})
+        return self._project_q[field]
+
+    def environment_q(self, field='environment__type'):
+        """环境数据权限过滤条件
+
+        Args:
+            field: 查询中环境类型对应的字段路径
+        """
+        if field not in self._environment_q:
+            self._environment_q[field] = Q() if self.environment_types is None else Q(**{f'{field}__in': list(self.environment_types)})
+        return self._environment_q[field]
+
+    def to_dict(self):
+        """转换为接口和旧代码使用的权限字典格式"""
+        functions = {}
+        for module, action in self.functions:
+            functions.setdefault(module, []).append(action)
+        return {
+            'menu': list(self.menu),
+            'function': functions,
+            'data': {
+                'project_scope': self.project_scope,
+                'project_ids': list(self.project_ids or []),
+                'environment_scope': self.environment_scope,
+                'environment_types': list(self.environment_types or []),
+            }
+        }
+
+
+# 空权限（用户不存在或没有角色时）
+EMPTY_PERMISSIONS = CompiledPermissions()
+
+
+def compile_permissions(role_permissions):
+    """
+    合并多个角色的权限配置
+
+    Args:
+        role_permissions: (角色名称, 权限配置) 列表
+    Returns:
+        CompiledPermissions: 编译后的有效权限
+    """
+    menu = set()
+    functions = set()
+    project_ids = None
+    environment_types = None
+
+    for role_name, permissions in role_permissions:
+        # 如果permissions是字符串，解析为JSON
+        if isinstance(permissions, str):
+            try:
+                permissions = json.loads(permissions)
+            except json.JSONDecodeError:
+                logger.error(f'解析角色[{role_name}]的权限数据失败')
+                permissions = {}
+        if not isinstance(permissions, dict):
+            continue
+
+        # 合并菜单权限
+        if permissions.get('menu') and isinstance(permissions['menu'], list):
+            menu.update(permissions['menu'])
+
+        # 合并功能权限
+        if permissions.get('function') and isinstance(permissions['function'], dict):
+            for module, actions in permissions['function'].items():
+                if not isinstance(actions, list):
+                    continue
+                functions.update((module, action) for action in actions)
+
+        # 合并数据权限，任一角色为自定义范围时取所有自定义范围的并集
+        if permissions.get('data') and isinstance(permissions['data'], dict):
+            data_perms = permissions['data']
+
+            if data_perms.get('project_scope') == 'custom':
+                project_ids = project_ids or set()
+                project_ids.update(data_perms.get('project_ids', []))
+
+            if data_perms.get('environment_scope') == 'custom':
+                environment_types = environment_types or set()
+                environment_types.update(data_perms.get('environment_types', []))
+
+    return CompiledPermissions(menu, functions, project_ids, environment_types)
+
+
+class PermissionCache:
+    """
+    进程内的用户权限缓存
+
+    失效时递增本进程的代数，避免失效前开始的查询把旧权限写回缓存；
+    同时更新 Django 缓存中的版本号（全部用户一个、每个用户一个），每次使用缓存的权限前比对版本号，
+    其他进程吊销的角色或权限立即生效，而不是等到缓存过期
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _get_versions(self, user_id):
+        """读取全部用户和指定用户的权限版本号，在查询数据库之前读取，查询期间的修改会在下次比对时发现"""
+        user_key = USER_PERMISSION_VERSION_KEY.format(user_id)
+        try:
+            versions = cache.get_many([PERMISSION_VERSION_KEY, user_key])
+        except Exception as e:
+            logger.error(f'读取权限版本号失败: {str(e)}', exc_info=True)
+            return None
+        return versions.get(PERMISSION_VERSION_KEY), versions.get(user_key)
+
+    def get(self, user_id):
+        versions = self._get_versions(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > time.monotonic() and entry[2] == versions:
+                return entry[1]
+            generation = self._generation
+
+        # 在锁外查询数据库
+        role_permissions = Role.objects.filter(userrole__user_id=user_id).values_list('name', 'permissions')
+        compiled = compile_permissions(role_permissions)
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[user_id] = (time.monotonic() + self.ttl, compiled, versions)
+        return compiled
+
+    def invalidate(self, user_id=None):
+        """失效指定用户的缓存，user_id为空时失效全部（包括其他进程）"""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+        key = PERMISSION_VERSION_KEY if user_id is None else USER_PERMISSION_VERSION_KEY.format(user_id)
+        try:
+            cache.set(key, uuid.uuid4().hex, timeout=None)
+        except Exception as e:
+            logger.error(f'更新权限版本号失败: {str(e)}', exc_info=True)
+
+
+permission_cache = PermissionCache(PERMISSION_CACHE_TTL)
+
+
+def get_compiled_permissions(user_id):
+    """
+    获取用户编译后的有效权限（带缓存）
+
     Args:
         user_id: 用户ID
-    
     Returns:
-        dict: 用户权限信息，包含菜单权限、功能权限和数据权限
+        CompiledPermissions: 用户有效权限
     """
     try:
-        # 获取用户信息
-        try:
-            user = User.objects.get(user_id=user_id)
-        except User.DoesNotExist:
-            logger.error(f'获取用户权限时用户不存在: {user_id}')
-            return {
-                'menu': [],
-                'function': {},
-                'data': {
-                    'project_scope': 'all',
-                    'project_ids': [],
-                    'environment_scope': 'all',
-                    'environment_types': []
-                }
-            }
-        
-        # 获取用户的所有角色
-        user_roles = UserRole.objects.filter(user=user).select_related('role')
-        
-        # 合并所有角色的权限
-        menu_permissions = set()
-        function_permissions = {}
-        data_permissions = {
-            'project_scope': 'all',
-            'project_ids': [],
-            'environment_scope': 'all',
-            'environment_types': []
-        }
-        
-        has_custom_project_scope = False
-        has_custom_environment_scope = False
-        
-        for user_role in user_roles:
-            role = user_role.role
-            permissions = role.permissions
-            
-            # 如果permissions是字符串，解析为JSON
-            if isinstance(permissions, str):
-                try:
-                    permissions = json.loads(permissions)
-                except:
-                    permissions = {}
-            
-            # 合并菜单权限
-            if permissions.get('menu'):
-                menu_permissions.update(permissions['menu'])
-            
-            # 合并功能权限
-            if permissions.get('function'):
-                for module, actions in permissions['function'].items():
-                    if module not in function_permissions:
-                        function_permissions[module] = []
-                    function_permissions[module].extend(actions)
-                    # 确保不重复
-                    function_permissions[module] = list(set(function_permissions[module]))
-            
-            # 合并数据权限
-            if permissions.get('data'):
-                data_perms = permissions['data']
-                
-                # 项目权限
-                if data_perms.get('project_scope') == 'custom':
-                    has_custom_project_scope = True
-                    if data_permissions['project_scope'] == 'all':
-                        data_permissions['project_scope'] = 'custom'
-                        data_permissions['project_ids'] = data_perms.get('project_ids', [])
-                    else:
-                        # 合并项目ID列表
-                        data_permissions['project_ids'].extend(data_perms.get('project_ids', []))
-                        # 确保不重复
-                        data_permissions['project_ids'] = list(set(data_permissions['project_ids']))
-                
-                # 环境权限
-                if data_perms.get('environment_scope') == 'custom':
-                    has_custom_environment_scope = True
-                    if data_permissions['environment_scope'] == 'all':
-                        data_permissions['environment_scope'] = 'custom'
-                        data_permissions['environment_types'] = data_perms.get('environment_types', [])
-                    else:
-                        # 合并环境类型列表
-                        data_permissions['environment_types'].extend(data_perms.get('environment_types', []))
-                        # 确保不重复
-                        data_permissions['environment_types'] = list(set(data_permissions['environment_types']))
-        
-        # 如果没有任何角色有自定义项目/环境范围，保持为'all'
-        if not has_custom_project_scope:
-            data_permissions['project_scope'] = 'all'
-            data_permissions['project_ids'] = []
-        
-        if not has_custom_environment_scope:
-            data_permissions['environment_scope'] = 'all'
-            data_permissions['environment_types'] = []
-        
-        return {
-            'menu': list(menu_permissions),
-            'function': function_permissions,
-            'data': data_permissions
-        }
+        return permission_cache.get(user_id)
     except Exception as e:
         logger.error(f'获取用户权限失败: {str(e)}', exc_info=True)
-        # 返回默认的空权限
-        return {
-            'menu': [],
-            'function': {},
-            'data': {
-                'project_scope': 'all',
-                'project_ids': [],
-                'environment_scope': 'all',
-                'environment_types': []
-            }
-        } 
\ No newline at end of file
+        return EMPTY_PERMISSIONS
+
+
+def invalidate_user_permissions(user_id=None):
+    """
+    失效用户权限缓存，在当前事务提交后执行（不在事务中时立即执行）
+
+    Args:
+        user_id: 用户ID，为空时失效所有用户（角色权限变更时使用）
+    """
+    transaction.on_commit(lambda: permission_cache.invalidate(user_id))
+
+
+def get_user_permissions(user_id):
+    """
+    获取用户的权限信息
+
+    Args:
+        user_id: 用户ID
+
+    Returns:
+        dict: 用户权限信息，包含菜单权限、功能权限和数据权限
+    """
+    return get_compiled_permissions(user_id).to_dict()
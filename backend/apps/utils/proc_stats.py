@@ -0,0 +1,160 @@
+import os
+import time
+import logging
+from django.conf import settings
+
+logger = logging.getLogger('apps')
+
+# 构建进程资源采样间隔（秒）
+BUILD_RESOURCE_SAMPLE_INTERVAL = getattr(settings, 'BUILD_RESOURCE_SAMPLE_INTERVAL', 0.5)
+
+PROC_ROOT = '/proc'
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _read_stat(pid):
+    """读取 /proc/<pid>/stat，返回 (父进程ID, 本进程CPU时间, 已回收子进程CPU时间, RSS字节数)"""
+    with open(f'{PROC_ROOT}/{pid}/stat') as f:
+        data = f.read()
+    # 进程名可能包含空格和括号，以最后一个右括号分隔
+    fields = data[data.rindex(')') + 2:].split()
+    ppid = int(fields[1])
+    own = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    children = (int(fields[13]) + int(fields[14])) / CLOCK_TICKS
+    rss = int(fields[21]) * PAGE_SIZE
+    return ppid, own, children, rss
+
+
+def _read_io(pid):
+    """读取 /proc/<pid>/io 中实际读写存储设备的字节数（包含已回收子进程），无权限时返回 (0, 0)"""
+    read_bytes = write_bytes = 0
+    try:
+        with open(f'{PROC_ROOT}/{pid}/io') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key == 'read_bytes':
+                    read_bytes = int(value)
+                elif key == 'write_bytes':
+                    write_bytes = int(value)
+    except OSError:
+        pass
+    return read_bytes, write_bytes
+
+
+def _list_children(pid):
+    """列出直接子进程，内核不支持 /proc/<pid>/task/<tid>/children 时返回None"""
+    children = []
+    try:
+        for tid in os.listdir(f'{PROC_ROOT}/{pid}/task'):
+            with open(f'{PROC_ROOT}/{pid}/task/{tid}/children') as f:
+                children.extend(int(child) for child in f.read().split())
+    except FileNotFoundError:
+        if os.path.exists(f'{PROC_ROOT}/{pid}'):
+            return None
+    except OSError:
+        pass
+    return children
+
+
+def _scan_children():
+    """遍历 /proc 建立 父进程 -> 子进程 映射"""
+    tree = {}
+    for name in os.listdir(PROC_ROOT):
+        if not name.isdigit():
+            continue
+        try:
+            ppid = _read_stat(name)[0]
+        except (OSError, ValueError, IndexError):
+            continue
+        tree.setdefault(ppid, []).append(int(name))
+    return tree
+
+
+class ProcessTreeSampler:
+    """
+    构建进程树资源采样
+
+    周期性读取 /proc 统计根进程及其所有子孙进程：
+    - CPU时间：各进程自身CPU时间 + 已被回收的子进程CPU时间（cutime/cstime），取各次采样的最大值
+    - 内存峰值：进程树RSS之和的最大值
+    - IO：实际读写存储设备的字节数，回收子进程时内核会累加到父进程
+    - 子进程数：采样期间观察到的子孙进程数，运行时间短于采样间隔的进程可能未被计入
+
+    根进程退出但尚未被回收（僵尸状态）时仍可读取其统计信息，调用方应在回收前做最后一次采样
+    """
+
+    def __init__(self, pid, interval=BUILD_RESOURCE_SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_time = 0.0
+        self.max_rss = 0
+        self.read_bytes = 0
+        self.write_bytes = 0
+        self.seen = set()
+        self._last_sample = 0
+        self._use_children_file = True
+
+    def maybe_sample(self):
+        """距上次采样超过采样间隔时采样"""
+        if time.monotonic() - self._last_sample >= self.interval:
+            self.sample()
+
+    def sample(self):
+        self._last_sample = time.monotonic()
+        try:
+            tree = None if self._use_children_file else _scan_children()
+            cpu, rss, read_bytes, write_bytes = self._collect(self.pid, tree)
+        except Exception as e:
+            logger.debug(f'采集构建进程资源失败: {str(e)}')
+            return
+        self.cpu_time = max(self.cpu_time, cpu)
+        self.max_rss = max(self.max_rss, rss)
+        self.read_bytes = max(self.read_bytes, read_bytes)
+        self.write_bytes = max(self.write_bytes, write_bytes)
+
+    def _collect(self, pid, tree):
+        """递归统计进程及其仍在运行的子孙进程，返回 (CPU时间, RSS, 读字节, 写字节)"""
+        try:
+            _, own, reaped, rss = _read_stat(pid)
+        except (OSError, ValueError, IndexError):
+            return 0.0, 0, 0, 0
+        read_bytes, write_bytes = _read_io(pid)
+        cpu = own + reaped
+
+        if tree is None:
+            children = _list_children(pid)
+            if children is None:
+                # 内核不支持 children 文件，改为遍历 /proc
+                self._use_children_file = False
+                tree = _scan_children()
+                children = tree.get(pid, [])
+        else:
+            children = tree.get(pid, [])
+
+        for child in children:
+            self.seen.add(child)
+            child_cpu, child_rss, child_read, child_write = self._collect(child, tree)
+            cpu += child_cpu
+            rss += child_rss
+            read_bytes += child_read
+            write_bytes += child_write
+        return cpu, rss, read_bytes, write_bytes
+
+    def result(self):
+        """资源统计结果"""
+        return {
+            'cpu_time': round(self.cpu_time, 2),
+            'max_rss': self.max_rss,
+            'read_bytes': self.read_bytes,
+            'write_bytes': self.write_bytes,
+            'process_count': len(self.seen),
+        }
+
+
+def has_exited(pid):
+    """检查子进程是否已退出，不回收子进程（退出后仍可读取 /proc 中的统计信息）"""
+    try:
+        return os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True
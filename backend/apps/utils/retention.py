@@ -0,0 +1,367 @@
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import Q
+from ..models import BuildTask, BuildHistory, LoginLog, RetentionPolicy, RetentionJob
+from .log_search import remove_from_log_index
+
+logger = logging.getLogger('apps')
+
+# 每批删除的记录数，按主键分批删除，避免长事务和大范围锁
+RETENTION_BATCH_SIZE = getattr(settings, 'RETENTION_BATCH_SIZE', 500)
+# 每批删除之间的间隔（秒），给正常的构建和查询让出数据库
+RETENTION_BATCH_PAUSE = getattr(settings, 'RETENTION_BATCH_PAUSE', 0.2)
+# 后台线程检查到期策略和待执行任务的间隔（秒），提交新任务时会立即唤醒
+RETENTION_POLL_INTERVAL = getattr(settings, 'RETENTION_POLL_INTERVAL', 60)
+# 执行中超过该时间（秒）没有进度的任务视为进程异常退出遗留，重新放回待执行
+RETENTION_STALE_RUNNING = 600
+# 检查遗留任务的间隔（秒）；进程崩溃后很快重启时，遗留任务要等超过 RETENTION_STALE_RUNNING 才能识别，不能只在启动时检查
+RETENTION_RECOVER_INTERVAL = 60
+
+# 仍在构建中的记录不会被清理
+ACTIVE_BUILD_STATUSES = ('pending', 'running')
+
+
+def generate_id():
+    """生成唯一ID"""
+    return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:32]
+
+
+class JobCancelled(Exception):
+    """清理任务已被取消"""
+
+
+def _build_history_targets(params):
+    """根据清理参数生成待删除构建历史的查询集列表
+
+    keep_days 和 keep_builds 同时设置时，超过保留天数或超出保留构建数的记录都会被删除；
+    按保留构建数清理时逐个任务计算，每个任务生成一个查询集
+    """
+    tasks = BuildTask.objects.all()
+    if params.get('task_ids'):
+        tasks = tasks.filter(task_id__in=params['task_ids'])
+    if params.get('environment_id'):
+        tasks = tasks.filter(environment_id=params['environment_id'])
+
+    conditions = Q()
+    if params.get('days_before'):
+        conditions |= Q(create_time__lt=datetime.now() - timedelta(days=params['days_before']))
+
+    base = BuildHistory.objects.exclude(status__in=ACTIVE_BUILD_STATUSES)
+    keep_builds = params.get('keep_builds')
+    if not keep_builds:
+        if not conditions:
+            return []
+        if params.get('task_ids') or params.get('environment_id'):
+            base = base.filter(task__in=tasks)
+        return [base.filter(conditions)]
+
+    targets = []
+    for task_id in tasks.values_list('task_id', flat=True):
+        # 第 keep_builds 新的构建号，比它更早的构建都超出保留数量
+        threshold = BuildHistory.objects.filter(task_id=task_id).order_by('-build_number').values_list(
+            'build_number', flat=True
+        )[keep_builds - 1:keep_builds].first()
+        task_conditions = conditions | Q(build_number__lt=threshold) if threshold else conditions
+        if task_conditions:
+            targets.append(base.filter(task_id=task_id).filter(task_conditions))
+    return targets
+
+
+def _login_log_targets(params):
+    if not params.get('days_before'):
+        return []
+    return [LoginLog.objects.filter(login_time__lt=datetime.now() - timedelta(days=params['days_before']))]
+
+
+def _get_dir_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _get_workspace(task_name, version):
+    """构建版本目录（BUILD_ROOT/任务名/版本号），路径不在BUILD_ROOT下时返回None"""
+    if not task_name or not version:
+        return None
+    build_root = Path(settings.BUILD_ROOT).resolve()
+    workspace = (build_root / task_name / version).resolve()
+    if workspace.parent.parent != build_root:
+        return None
+    return workspace
+
+
+def remove_workspaces(versions):
+    """删除已没有构建历史引用的构建版本目录
+
+    Args:
+        versions: (任务ID, 任务名, 版本号) 集合
+    Returns:
+        tuple: (删除的目录数, 释放的字节数)
+    """
+    count, freed = 0, 0
+    for task_id, task_name, version in versions:
+        workspace = _get_workspace(task_name, version)
+        if workspace is None or not workspace.is_dir():
+            continue
+        # 回滚构建会复用历史版本，仍有记录引用该版本时保留目录
+        if BuildHistory.objects.filter(task_id=task_id, version=version).exists():
+            continue
+        try:
+            size = _get_dir_size(workspace)
+            shutil.rmtree(workspace)
+            count += 1
+            freed += size
+        except Exception as e:
+            logger.error(f'删除构建目录失败 {workspace}: {str(e)}')
+    return count, freed
+
+
+class RetentionRunner:
+    """执行单个清理任务：按主键分批删除，每批之后更新进度并检查是否被取消"""
+
+    def __init__(self, job):
+        self.job = job
+        self.params = job.params or {}
+        self.deleted = job.deleted_count
+        self.workspaces = job.workspace_count
+        self.freed = job.freed_bytes
+
+    def run(self):
+        if self.job.scope == 'login_log':
+            targets = _login_log_targets(self.params)
+        else:
+            targets = _build_history_targets(self.params)
+
+        total = self.deleted + sum(queryset.count() for queryset in targets)
+        RetentionJob.objects.filter(id=self.job.id).update(total_count=total, update_time=datetime.now())
+
+        for queryset in targets:
+            self._delete_in_batches(queryset)
+
+    def _delete_in_batches(self, queryset):
+        model = queryset.model
+        is_build = model is BuildHistory
+        fields = ['id', 'task_id', 'task__name', 'version'] if is_build else ['id']
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).order_by('id').values(*fields)[:RETENTION_BATCH_SIZE])
+            if not rows:
+                return
+            last_id = rows[-1]['id']
+            ids = [row['id'] for row in rows]
+
+            with transaction.atomic():
+                delete_queryset = model.objects.filter(id__in=ids)
+                if is_build:
+                    # 分批期间可能有记录被重新构建，删除时再次排除构建中的记录
+                    delete_queryset = delete_queryset.exclude(status__in=ACTIVE_BUILD_STATUSES)
+                _, deleted = delete_queryset.delete()
+            self.deleted += deleted.get(model._meta.label, 0)
+
+            if is_build:
+                remove_from_log_index(ids)
+
+            if is_build and self.params.get('cleanup_workspace'):
+                versions = {(row['task_id'], row['task__name'], row['version']) for row in rows if row['version']}
+                count, freed = remove_workspaces(versions)
+                self.workspaces += count
+                self.freed += freed
+
+            self._report()
+            if RETENTION_BATCH_PAUSE:
+                time.sleep(RETENTION_BATCH_PAUSE)
+
+    def _report(self):
+        """更新进度；任务已被取消时中止"""
+        updated = RetentionJob.objects.filter(id=self.job.id, status='running').update(
+            deleted_count=self.deleted,
+            workspace_count=self.workspaces,
+            freed_bytes=self.freed,
+            update_time=datetime.now()
+        )
+        if not updated:
+            raise JobCancelled()
+
+
+class RetentionEngine:
+    """
+    数据清理引擎
+
+    清理请求写入清理任务表后由后台线程逐个执行，HTTP请求不再等待删除完成；
+    同时按保留策略定期生成清理任务
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._next_recover = 0
+
+    def start(self):
+        """启动后台清理线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='retention-engine', daemon=True)
+            self._thread.start()
+            logger.info('数据清理线程已启动')
+
+    def submit(self, scope, params, operator=None, policy=None):
+        """提交清理任务
+
+        Args:
+            scope: 清理对象，build_history 或 login_log
+            params: 清理参数（task_ids、environment_id、days_before、keep_builds、cleanup_workspace）
+            operator: 操作人用户ID
+            policy: 生成该任务的保留策略
+        Returns:
+            RetentionJob: 清理任务
+        """
+        job = RetentionJob.objects.create(
+            job_id=generate_id(),
+            policy=policy,
+            scope=scope,
+            params=params,
+            status='pending',
+            operator_id=operator
+        )
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job_id):
+        """取消未完成的清理任务，执行中的任务在当前批次结束后停止"""
+        return RetentionJob.objects.filter(job_id=job_id, status__in=['pending', 'running']).update(
+            status='cancelled', finish_time=datetime.now(), update_time=datetime.now()
+        ) > 0
+
+    def wakeup(self):
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                close_old_connections()
+                # 执行中的任务每批都会更新 update_time，定期检查不会误恢复正在执行的任务
+                if time.monotonic() >= self._next_recover:
+                    self._next_recover = time.monotonic() + RETENTION_RECOVER_INTERVAL
+                    self._recover_stale()
+                self._schedule_policies()
+                job = self._claim_next()
+                if job:
+                    self._execute(job)
+                    continue
+                self._wakeup.wait(RETENTION_POLL_INTERVAL)
+                self._wakeup.clear()
+            except Exception as e:
+                logger.error(f'数据清理线程出错: {str(e)}', exc_info=True)
+                time.sleep(RETENTION_POLL_INTERVAL)
+
+    def _recover_stale(self):
+        """将异常退出时遗留在执行中的任务放回待执行，重新执行时从剩余记录继续删除"""
+        try:
+            stale_before = datetime.now() - timedelta(seconds=RETENTION_STALE_RUNNING)
+            count = RetentionJob.objects.filter(
+                status='running', update_time__lt=stale_before
+            ).update(status='pending')
+            if count:
+                logger.info(f'恢复 {count} 个未完成的清理任务')
+        except Exception as e:
+            logger.error(f'恢复未完成的清理任务失败: {str(e)}', exc_info=True)
+
+    def _schedule_policies(self):
+        """为到期的保留策略生成清理任务"""
+        now = datetime.now()
+        due = RetentionPolicy.objects.filter(enabled=True).filter(
+            Q(next_run_time__isnull=True) | Q(next_run_time__lte=now)
+        )
+        for policy in due:
+            # 条件更新，多个进程同时调度时只有一个能生成任务
+            claimed = RetentionPolicy.objects.filter(id=policy.id, next_run_time=policy.next_run_time).update(
+                last_run_time=now,
+                next_run_time=now + timedelta(hours=max(policy.interval_hours or 24, 1))
+            )
+            if not claimed:
+                continue
+            if RetentionJob.objects.filter(policy=policy, status__in=['pending', 'running']).exists():
+                continue
+            RetentionJob.objects.create(
+                job_id=generate_id(),
+                policy=policy,
+                scope=policy.scope,
+                params=get_policy_params(policy),
+                status='pending',
+                operator_id=policy.creator_id
+            )
+            logger.info(f'保留策略[{policy.name}]已生成清理任务')
+
+    def _claim_next(self):
+        job = RetentionJob.objects.filter(status='pending').order_by('create_time', 'id').first()
+        if not job:
+            return None
+        claimed = RetentionJob.objects.filter(id=job.id, status='pending').update(
+            status='running', start_time=job.start_time or datetime.now(), update_time=datetime.now()
+        )
+        if not claimed:
+            return None
+        job.refresh_from_db()
+        return job
+
+    def _execute(self, job):
+        runner = RetentionRunner(job)
+        status, error = 'success', None
+        try:
+            runner.run()
+        except JobCancelled:
+            RetentionJob.objects.filter(id=job.id).update(
+                deleted_count=runner.deleted,
+                workspace_count=runner.workspaces,
+                freed_bytes=runner.freed
+            )
+            logger.info(f'清理任务[{job.job_id}]已取消，已删除{runner.deleted}条记录')
+            return
+        except Exception as e:
+            logger.error(f'清理任务[{job.job_id}]执行失败: {str(e)}', exc_info=True)
+            status, error = 'failed', str(e)
+
+        RetentionJob.objects.filter(id=job.id, status='running').update(
+            status=status,
+            deleted_count=runner.deleted,
+            workspace_count=runner.workspaces,
+            freed_bytes=runner.freed,
+            error_message=error,
+            finish_time=datetime.now(),
+            update_time=datetime.now()
+        )
+        if status == 'success':
+            logger.info(f'清理任务[{job.job_id}]完成，删除{runner.deleted}条记录，'
+                        f'清理构建目录{runner.workspaces}个，释放{runner.freed}字节')
+
+
+def get_policy_params(policy):
+    """将保留策略转换为清理参数"""
+    return {
+        'task_ids': [policy.task_id] if policy.task_id else [],
+        'environment_id': policy.environment_id,
+        'days_before': policy.keep_days,
+        'keep_builds': policy.keep_builds,
+        'cleanup_workspace': policy.cleanup_workspace,
+    }
+
+
+retention_engine = RetentionEngine()
@@ -3,7 +3,8 @@ import hashlib
 import logging
 from datetime import datetime, timedelta
 from django.utils import timezone
-from ..models import SecurityConfig, LoginAttempt, User
+from ..models import LoginAttempt, User
+from .config_cache import security_config_cache
 
 logger = logging.getLogger('apps')
 
@@ -14,17 +15,8 @@ class SecurityValidator:
     def get_security_config():
         """获取安全配置"""
         try:
-            config, created = SecurityConfig.objects.get_or_create(
-                id=1,
-                defaults={
-                    'min_password_length': 8,
-                    'password_complexity': ['lowercase', 'number'],
-                    'session_timeout': 120,
-                    'max_login_attempts': 5,
-                    'lockout_duration': 30,
-                    'enable_2fa': False
-                }
-            )
+            # 从缓存读取，配置更新时由 SecurityConfigView 使缓存失效
+            config = security_config_cache.get()
             return config
         except Exception as e:
             logger.error(f'获取安全配置失败: {str(e)}')
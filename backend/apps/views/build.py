@@ -11,11 +11,14 @@ from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
-from django.db.models import Q, F
+from django.db.models import Q, F, OuterRef, Subquery, JSONField
 from ..models import BuildTask, BuildHistory, Project, Environment, GitlabTokenCredential, User, NotificationRobot
 from ..utils.auth import jwt_auth_required
 from ..utils.builder import Builder
 from ..utils.permissions import get_user_permissions
+from ..utils.log_search import remove_from_log_index_on_commit
+from ..utils.cgroups import normalize_resource_limits
+from ..utils.log_filters import normalize_log_filters
 
 logger = logging.getLogger('apps')
 
@@ -23,6 +26,35 @@ def generate_id():
     """生成唯一ID"""
     return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:32]
 
+def normalize_build_timeout(value):
+    """校验构建超时时间（分钟），为空时使用默认值
+
+    Returns:
+        tuple: (超时时间或None, 错误信息)
+    """
+    if value in (None, ''):
+        return None, None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None, '构建超时时间必须为整数'
+    if value < 0:
+        return None, '构建超时时间不能小于0'
+    return value, None
+
+def validate_stage_timeouts(stages):
+    """校验构建阶段的超时时间（分钟），返回错误信息"""
+    for stage in stages or []:
+        timeout = stage.get('timeout') if isinstance(stage, dict) else None
+        if timeout in (None, ''):
+            continue
+        try:
+            if float(timeout) < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return f'阶段 "{stage.get("name", "")}" 的超时时间必须为非负数'
+    return None
+
 def execute_build(task, build_number, commit_id, history):
     """执行构建任务"""
     try:
@@ -39,6 +71,17 @@ def execute_build(task, build_number, commit_id, history):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class BuildTaskView(View):
+    # 任务列表支持的排序字段
+    SORT_FIELDS = {
+        'name': 'name',
+        'create_time': 'create_time',
+        'update_time': 'update_time',
+        'total_builds': 'total_builds',
+        'last_build_time': 'latest_build_create_time',
+    }
+    # 每页最多返回的任务数
+    MAX_PAGE_SIZE = 100
+
     @method_decorator(jwt_auth_required)
     def get(self, request, task_id=None):
         """获取构建任务列表或单个任务详情"""
@@ -148,6 +191,9 @@ class BuildTaskView(View):
                             'parameters': task.parameters,
                             'notification_channels': task.notification_channels,
                             'notification_robots': notification_robots,
+                            'resource_limits': task.resource_limits,
+                            'build_timeout': task.build_timeout,
+                            'log_filters': task.log_filters,
                             # 外部脚本库配置
                             'use_external_script': task.use_external_script,
                             'external_script_repo_url': task.external_script_config.get('repo_url', '') if task.external_script_config else '',
@@ -265,18 +311,62 @@ class BuildTaskView(View):
             # 添加其他查询条件
             if name:
                 query &= Q(name__icontains=name)
-
-            # 查询任务列表
+            status = request.GET.get('status')
+            if status:
+                query &= Q(status=status)
+            building_status = request.GET.get('building_status')
+            if building_status:
+                query &= Q(building_status=building_status)
+
+            # 以子查询附带每个任务最新一次构建的信息，整个列表只需一次查询
+            latest_builds = BuildHistory.objects.filter(task_id=OuterRef('task_id')).order_by('-build_number')
             tasks = BuildTask.objects.select_related(
                 'project',
                 'environment',
                 'creator'
-            ).filter(query)
+            ).filter(query).annotate(
+                latest_history_id=Subquery(latest_builds.values('history_id')[:1]),
+                latest_build_number=Subquery(latest_builds.values('build_number')[:1]),
+                latest_build_status=Subquery(latest_builds.values('status')[:1]),
+                latest_build_create_time=Subquery(latest_builds.values('create_time')[:1]),
+                latest_build_time=Subquery(latest_builds.values('build_time')[:1], output_field=JSONField()),
+            )
+
+            last_build_status = request.GET.get('last_build_status')
+            if last_build_status:
+                tasks = tasks.filter(latest_build_status=last_build_status)
+
+            # 排序
+            sort_by = request.GET.get('sort_by')
+            if sort_by in self.SORT_FIELDS:
+                sort_field = self.SORT_FIELDS[sort_by]
+                if request.GET.get('order', 'desc') == 'asc':
+                    tasks = tasks.order_by(F(sort_field).asc(nulls_first=True), 'id')
+                else:
+                    tasks = tasks.order_by(F(sort_field).desc(nulls_last=True), '-id')
+
+            # 分页（仅在传入page参数时分页，未传入时返回全部任务）
+            page = request.GET.get('page')
+            total = None
+            if page:
+                try:
+                    page = max(int(page), 1)
+                    page_size = min(max(int(request.GET.get('page_size', 10)), 1), self.MAX_PAGE_SIZE)
+                except ValueError:
+                    return JsonResponse({
+                        'code': 400,
+                        'message': '分页参数必须为整数'
+                    }, status=400)
+                total = tasks.count()
+                start = (page - 1) * page_size
+                tasks = tasks[start:start + page_size]
 
             task_list = []
             for task in tasks:
-                # 获取最新的构建历史
-                latest_build = BuildHistory.objects.filter(task=task).order_by('-build_number').first()
+                # 最新构建的耗时
+                latest_build_time = task.latest_build_time or {}
+                if isinstance(latest_build_time, str):
+                    latest_build_time = json.loads(latest_build_time)
 
                 task_list.append({
                     'task_id': task.task_id,
@@ -301,12 +391,12 @@ class BuildTaskView(View):
                     'success_builds': task.success_builds,
                     'failure_builds': task.failure_builds,
                     'last_build': {
-                        'id': latest_build.history_id,
-                        'number': latest_build.build_number,
-                        'status': latest_build.status,
-                        'time': latest_build.create_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'duration': '未完成' if latest_build.status in ['pending', 'running'] else str(latest_build.build_time.get('total_duration', 0)) + '秒'
-                    } if latest_build else None,
+                        'id': task.latest_history_id,
+                        'number': task.latest_build_number,
+                        'status': task.latest_build_status,
+                        'time': task.latest_build_create_time.strftime('%Y-%m-%d %H:%M:%S'),
+                        'duration': '未完成' if task.latest_build_status in ['pending', 'running'] else str(latest_build_time.get('total_duration', 0)) + '秒'
+                    } if task.latest_history_id else None,
                     'creator': {
                         'user_id': task.creator.user_id,
                         'name': task.creator.name
@@ -315,6 +405,16 @@ class BuildTaskView(View):
                     'update_time': task.update_time.strftime('%Y-%m-%d %H:%M:%S')
                 })
 
+            if total is not None:
+                return JsonResponse({
+                    'code': 200,
+                    'message': '获取任务列表成功',
+                    'data': task_list,
+                    'total': total,
+                    'page': page,
+                    'page_size': page_size
+                })
+
             return JsonResponse({
                 'code': 200,
                 'message': '获取任务列表成功',
@@ -342,6 +442,25 @@ class BuildTaskView(View):
                 stages = data.get('stages', [])
                 parameters = data.get('parameters', [])
                 notification_channels = data.get('notification_channels', [])
+                resource_limits, error = normalize_resource_limits(data.get('resource_limits'))
+                if error:
+                    return JsonResponse({
+                        'code': 400,
+                        'message': error
+                    })
+                build_timeout, error = normalize_build_timeout(data.get('build_timeout'))
+                error = error or validate_stage_timeouts(stages)
+                if error:
+                    return JsonResponse({
+                        'code': 400,
+                        'message': error
+                    })
+                log_filters, error = normalize_log_filters(data.get('log_filters'))
+                if error:
+                    return JsonResponse({
+                        'code': 400,
+                        'message': error
+                    })
 
                 # 自动构建配置
                 auto_build_enabled = data.get('auto_build_enabled', False)
@@ -474,6 +593,9 @@ class BuildTaskView(View):
                     stages=stages,
                     parameters=parameters,
                     notification_channels=notification_channels,
+                    resource_limits=resource_limits,
+                    build_timeout=build_timeout,
+                    log_filters=log_filters,
                     use_external_script=use_external_script,
                     external_script_config=external_script_config,
                     auto_build_enabled=auto_build_enabled,
@@ -690,6 +812,12 @@ class BuildTaskView(View):
                 if 'branch' in data:
                     task.branch = branch
                 if 'stages' in data:
+                    error = validate_stage_timeouts(stages)
+                    if error:
+                        return JsonResponse({
+                            'code': 400,
+                            'message': error
+                        })
                     task.stages = stages
                 if 'parameters' in data:
                     task.parameters = parameters
@@ -705,6 +833,30 @@ class BuildTaskView(View):
                             'message': f'以下机器人不存在: {", ".join(invalid_robots)}'
                         })
                     task.notification_channels = notification_channels
+                if 'resource_limits' in data:
+                    resource_limits, error = normalize_resource_limits(data['resource_limits'])
+                    if error:
+                        return JsonResponse({
+                            'code': 400,
+                            'message': error
+                        })
+                    task.resource_limits = resource_limits
+                if 'build_timeout' in data:
+                    build_timeout, error = normalize_build_timeout(data['build_timeout'])
+                    if error:
+                        return JsonResponse({
+                            'code': 400,
+                            'message': error
+                        })
+                    task.build_timeout = build_timeout
+                if 'log_filters' in data:
+                    log_filters, error = normalize_log_filters(data['log_filters'])
+                    if error:
+                        return JsonResponse({
+                            'code': 400,
+                            'message': error
+                        })
+                    task.log_filters = log_filters
                 if 'status' in data:
                     task.status = status
 
@@ -761,6 +913,7 @@ class BuildTaskView(View):
 
                 try:
                     task = BuildTask.objects.get(task_id=task_id)
+                    remove_from_log_index_on_commit(BuildHistory.objects.filter(task=task))
                     task.delete()
                     return JsonResponse({
                         'code': 200,
@@ -0,0 +1,105 @@
+import logging
+from django.http import JsonResponse
+from django.views import View
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from ..models import BuildTask
+from ..utils.auth import jwt_auth_required
+from ..utils.permissions import get_compiled_permissions
+from ..utils.build_analytics import get_task_analytics, get_tasks_summary
+
+logger = logging.getLogger('apps')
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BuildAnalyticsView(View):
+    """构建耗时分析接口"""
+
+    @method_decorator(jwt_auth_required)
+    def get(self, request):
+        """获取构建耗时分析数据
+
+        传入 task_id 时返回该任务的耗时分位数、按天趋势、阶段耗时、最慢阶段和耗时退化；
+        否则返回有权限查看的各任务构建耗时分位数
+        """
+        try:
+            # 获取当前用户的权限信息
+            permissions = get_compiled_permissions(request.user_id)
+
+            # 检查用户是否有构建历史查看权限
+            if not permissions.has('build_history', 'view'):
+                logger.warning(f'用户[{request.user_id}]没有构建历史查看权限')
+                return JsonResponse({
+                    'code': 403,
+                    'message': '没有权限查看构建耗时分析'
+                }, status=403)
+
+            task_id = request.GET.get('task_id')
+            days = int(request.GET.get('days', 30))
+            recent_days = int(request.GET.get('recent_days', 7))
+
+            # 按项目和环境权限过滤任务
+            tasks = BuildTask.objects.select_related('project', 'environment').filter(
+                permissions.project_q(), permissions.environment_q()
+            )
+
+            if task_id:
+                task = tasks.filter(task_id=task_id).first()
+                if not task:
+                    if BuildTask.objects.filter(task_id=task_id).exists():
+                        logger.warning(f'用户[{request.user_id}]尝试查看无权限的构建任务[{task_id}]的耗时分析')
+                        return JsonResponse({
+                            'code': 403,
+                            'message': '没有权限查看该任务的耗时分析'
+                        }, status=403)
+                    return JsonResponse({
+                        'code': 404,
+                        'message': '构建任务不存在'
+                    })
+
+                analytics = get_task_analytics(task.task_id, days=days, recent_days=recent_days)
+                analytics.update({
+                    'task_id': task.task_id,
+                    'task_name': task.name,
+                    'days': days,
+                    'recent_days': recent_days,
+                })
+                return JsonResponse({
+                    'code': 200,
+                    'message': '获取构建耗时分析成功',
+                    'data': analytics
+                })
+
+            # 各任务的构建耗时概览
+            project_id = request.GET.get('project_id')
+            environment_id = request.GET.get('environment_id')
+            if project_id:
+                tasks = tasks.filter(project__project_id=project_id)
+            if environment_id:
+                tasks = tasks.filter(environment__environment_id=environment_id)
+
+            task_map = {task.task_id: task for task in tasks}
+            summaries = get_tasks_summary(list(task_map.keys()), days=days)
+
+            task_list = []
+            for summary_task_id, summary in summaries.items():
+                task = task_map[summary_task_id]
+                summary.update({
+                    'task_id': task.task_id,
+                    'task_name': task.name,
+                    'project_name': task.project.name if task.project else None,
+                    'environment_name': task.environment.name if task.environment else None,
+                })
+                task_list.append(summary)
+            task_list.sort(key=lambda item: item['p90'], reverse=True)
+
+            return JsonResponse({
+                'code': 200,
+                'message': '获取构建耗时分析成功',
+                'data': task_list
+            })
+        except Exception as e:
+            logger.error(f'获取构建耗时分析失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
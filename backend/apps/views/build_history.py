@@ -1,78 +1,45 @@
 import json
 import logging
 from datetime import datetime, timedelta
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Q
-from ..models import BuildHistory, BuildTask, Project, Environment
+from ..models import BuildHistory, BuildStageTiming, BuildTask, Project, Environment
 from ..utils.auth import jwt_auth_required
 from ..utils.permissions import get_user_permissions
+from ..utils.log_codec import get_build_log, iter_build_log, iter_build_log_lines
 
 logger = logging.getLogger('apps')
 
 @method_decorator(csrf_exempt, name='dispatch')
 class BuildHistoryView(View):
-    def _get_stage_status_from_log(self, log: str, stage_name: str, overall_status: str = None) -> str:
-        """从日志中获取指定阶段的状态"""
-        if not log:
-            if overall_status == 'failed':
-                return 'failed'
-            else:
-                return 'pending'
-        
-        # 处理特殊阶段：Git Clone
-        if stage_name == 'Git Clone':
-            # Git Clone 阶段使用 [Git Clone] 格式
-            if '[Git Clone]' not in log:
-                if overall_status == 'failed':
-                    return 'failed'
-                else:
-                    return 'pending'
-            
-            # 检查是否有完成标记
-            if '[Git Clone] 代码克隆完成' in log:
-                return 'success'
-            elif overall_status == 'terminated':
-                return 'terminated'
-            elif overall_status in ['running', 'pending']:
-                return 'running'
-            else:
-                return 'failed'
-        
-        # 处理普通构建阶段
-        stage_start_pattern = f'[Build Stages] 开始执行阶段: {stage_name}'
-        stage_complete_pattern = f'[Build Stages] 阶段 {stage_name} 执行完成'
-        
-        # 如果整体构建状态是terminated，检查阶段是否有开始执行
-        if overall_status == 'terminated':
-            if stage_start_pattern in log:
-                # 检查阶段是否完成
-                if stage_complete_pattern in log:
-                    return 'success'
-                else:
-                    return 'terminated'
-            else:
-                # 没有该阶段的日志，说明还没开始执行就被终止了
-                return 'terminated'
-        
-        # 检查阶段是否开始执行
-        if stage_start_pattern not in log:
-            if overall_status == 'failed':
-                return 'failed'
-            else:
-                return 'pending'
-        
-        # 检查阶段是否完成
-        if stage_complete_pattern in log:
-            return 'success'  # 阶段成功完成
-        else:
-            # 阶段已开始但还没完成，根据整体状态判断
-            if overall_status in ['running', 'pending']:
-                return 'running'
-            else:
-                return 'failed'
+    def _get_stage_statuses(self, history_ids) -> dict:
+        """从耗时明细表中获取构建已记录的阶段状态，不解压构建日志
+
+        Returns:
+            dict: {history_id: {阶段名称: 状态}}
+        """
+        statuses = {history_id: {} for history_id in history_ids}
+        rows = BuildStageTiming.objects.filter(
+            history_id__in=history_ids, timing_type='stage'
+        ).values_list('history_id', 'stage_name', 'status')
+        for history_id, stage_name, status in rows:
+            statuses[history_id][stage_name] = status
+        return statuses
+
+    def _get_stage_status(self, statuses: dict, stage_name: str, overall_status: str, first_unrecorded: bool) -> str:
+        """获取指定阶段的状态
+
+        阶段结束时才会写入耗时明细，未记录的阶段按构建的整体状态推断：构建进行中时第一个未记录的阶段
+        正在执行、之后的阶段等待执行；构建已结束时与整体状态一致（失败或终止后的阶段，以及记录耗时明细之前的构建）
+        """
+        if stage_name in statuses:
+            return statuses[stage_name]
+        if overall_status in ['running', 'pending']:
+            return 'running' if first_unrecorded else 'pending'
+        return overall_status
 
     @method_decorator(jwt_auth_required)
     def get(self, request):
@@ -188,7 +155,7 @@ class BuildHistoryView(View):
                 'task__project',
                 'task__environment',
                 'operator'
-            ).filter(query).order_by('-create_time')
+            ).defer('build_log', 'build_log_compressed').filter(query).order_by('-create_time')
 
             # 计算总数
             total = histories.count()
@@ -196,7 +163,8 @@ class BuildHistoryView(View):
             # 分页
             start = (page - 1) * page_size
             end = start + page_size
-            histories = histories[start:end]
+            histories = list(histories[start:end])
+            stage_statuses = self._get_stage_statuses([history.history_id for history in histories])
 
             # 构建返回数据
             history_list = []
@@ -214,6 +182,8 @@ class BuildHistoryView(View):
 
                 # 处理构建阶段信息
                 stages = []
+                statuses = stage_statuses[history.history_id]
+                first_unrecorded = True
                 
                 # 添加 Git Clone 阶段
                 git_clone_stage = next(
@@ -222,7 +192,8 @@ class BuildHistoryView(View):
                 ) if history.build_time else None
 
                 if git_clone_stage:
-                    git_clone_status = self._get_stage_status_from_log(history.build_log, 'Git Clone', history.status)
+                    git_clone_status = self._get_stage_status(statuses, 'Git Clone', history.status, first_unrecorded)
+                    first_unrecorded = first_unrecorded and 'Git Clone' in statuses
                     stages.append({
                         'name': 'Git Clone',
                         'status': git_clone_status,
@@ -237,12 +208,14 @@ class BuildHistoryView(View):
                         None
                     ) if history.build_time else None
 
-                    stage_status = self._get_stage_status_from_log(history.build_log, stage['name'], history.status)
+                    stage_status = self._get_stage_status(statuses, stage['name'], history.status, first_unrecorded)
+                    first_unrecorded = first_unrecorded and stage['name'] in statuses
                     stages.append({
                         'name': stage['name'],
                         'status': stage_status,
                         'startTime': stage_time['start_time'] if stage_time else None,
-                        'duration': stage_time['duration'] + '秒' if stage_time else '未知'
+                        'duration': stage_time['duration'] + '秒' if stage_time else '未知',
+                        'resources': stage_time.get('resources') if stage_time else None
                     })
 
                 # 检查是否有回滚权限
@@ -428,11 +401,14 @@ class BuildLogView(View):
                 # 生成日志文件名
                 filename = f"build_log_{history.task.name}_{history.build_number}.txt"
                 
-                # 准备日志内容
-                log_content = history.build_log or '暂无日志'
-                
-                # 创建响应对象
-                response = HttpResponse(log_content, content_type='text/plain')
+                # 已压缩的日志边解压边输出
+                if history.build_log or history.build_log_compressed:
+                    response = StreamingHttpResponse(
+                        (chunk.encode('utf-8') for chunk in iter_build_log(history)),
+                        content_type='text/plain; charset=utf-8'
+                    )
+                else:
+                    response = HttpResponse('暂无日志', content_type='text/plain')
                 response['Content-Disposition'] = f'attachment; filename="{filename}"'
                 return response
 
@@ -440,7 +416,7 @@ class BuildLogView(View):
                 'code': 200,
                 'message': '获取构建日志成功',
                 'data': {
-                    'log': history.build_log or '暂无日志'
+                    'log': get_build_log(history) or '暂无日志'
                 }
             })
 
@@ -508,7 +484,7 @@ class BuildStageLogView(View):
                     }, status=403)
 
             # 在完整日志中查找指定阶段的日志
-            if not history.build_log:
+            if not history.build_log and not history.build_log_compressed:
                 return JsonResponse({
                     'code': 200,
                     'message': '获取阶段日志成功',
@@ -519,7 +495,8 @@ class BuildStageLogView(View):
 
             # 适配Jenkins风格日志格式的阶段日志解析
             stage_logs = []
-            lines = history.build_log.split('\n')
+            # 逐行解压，找到阶段结束位置后不再解压剩余日志
+            lines = iter_build_log_lines(history)
             in_stage = False
             
             # 处理特殊阶段：Git Clone
@@ -5,14 +5,15 @@ import uuid
 import threading
 import queue
 import asyncio
+import jwt
 from django.http import StreamingHttpResponse, JsonResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from asgiref.sync import sync_to_async
-from ..utils.auth import jwt_auth_required
+from ..utils.auth import jwt_auth_required, verify_token
 from ..utils.log_stream import log_stream_manager
-from ..models import BuildHistory, UserToken
+from ..models import BuildHistory
 
 logger = logging.getLogger('apps')
 
@@ -72,9 +73,17 @@ class BuildLogSSEView(View):
                     content_type='text/event-stream'
                 )
             
+            # 重连时从最后收到的消息之后继续，消息ID为 "epoch:序号"（database 后端没有 epoch，只有序号）
+            last_event_id = request.GET.get('last_event_id') or request.headers.get('Last-Event-ID') or ''
+            epoch, _, since = str(last_event_id).rpartition(':')
+            try:
+                since = max(int(since), 0)
+            except ValueError:
+                since = 0
+
             # 创建异步SSE流
             response = StreamingHttpResponse(
-                self._build_log_stream_async(task_id, int(build_number), history),
+                self._build_log_stream_async(task_id, int(build_number), history, since, epoch or None),
                 content_type='text/event-stream'
             )
             
@@ -99,35 +108,22 @@ class BuildLogSSEView(View):
     def _verify_jwt_token(self, token):
         """验证JWT token"""
         try:
-            import jwt
-            from django.conf import settings
-            
-            # 查询用户token
-            user_token = UserToken.objects.filter(token=token).first()
-            
-            if not user_token:
-                logger.warning("Token不存在于数据库中")
-                return None
-            
-            # 验证JWT token
-            try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-                return {
-                    'user_id': payload.get('user_id'),
-                    'username': payload.get('username')
-                }
-            except jwt.ExpiredSignatureError:
-                logger.warning("Token已过期")
-                return None
-            except jwt.InvalidTokenError as e:
-                logger.warning(f"Token无效: {str(e)}")
-                return None
-                
+            payload = verify_token(token)
+            return {
+                'user_id': payload.get('user_id'),
+                'username': payload.get('username')
+            }
+        except jwt.ExpiredSignatureError:
+            logger.warning("Token已过期")
+            return None
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Token无效: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"Token验证过程发生错误: {str(e)}", exc_info=True)
             return None
     
-    async def _build_log_stream_async(self, task_id, build_number, history):
+    async def _build_log_stream_async(self, task_id, build_number, history, since=0, epoch=None):
         """异步生成构建日志流"""
         # 生成唯一的客户端ID
         client_id = str(uuid.uuid4())
@@ -152,7 +148,7 @@ class BuildLogSSEView(View):
             heartbeat_counter = 0
             
             # 获取异步日志流
-            async for log_msg in self._async_log_stream(task_id, build_number, client_id):
+            async for log_msg in self._async_log_stream(task_id, build_number, client_id, since, epoch):
                 if log_msg is None:
                     # 心跳包
                     heartbeat_counter += 1
@@ -181,7 +177,7 @@ class BuildLogSSEView(View):
                     yield self._format_sse_message({
                         'type': 'build_log',
                         'message': log_msg.message
-                    })
+                    }, event_id=f'{log_msg.epoch}:{log_msg.seq}' if log_msg.epoch else log_msg.seq)
                 
         except Exception as e:
             logger.error(f"生成构建日志流时发生错误: {str(e)}", exc_info=True)
@@ -190,7 +186,7 @@ class BuildLogSSEView(View):
                 'message': f'日志流发生错误: {str(e)}'
             })
     
-    async def _async_log_stream(self, task_id, build_number, client_id):
+    async def _async_log_stream(self, task_id, build_number, client_id, since=0, epoch=None):
         """异步日志流生成器 - 改进版本"""
         try:
             async_queue = asyncio.Queue(maxsize=1000)  # 限制队列大小
@@ -200,7 +196,7 @@ class BuildLogSSEView(View):
             def sync_log_reader():
                 """在单独线程中读取同步日志流"""
                 try:
-                    for log_msg in log_stream_manager.get_log_stream(task_id, build_number, client_id):
+                    for log_msg in log_stream_manager.get_log_stream(task_id, build_number, client_id, since, epoch):
                         if stop_event.is_set():
                             break
                         
@@ -266,8 +262,10 @@ class BuildLogSSEView(View):
             'message': error_message
         })
     
-    def _format_sse_message(self, data, event_type='message'):
+    def _format_sse_message(self, data, event_type='message', event_id=None):
         """格式化SSE消息"""
         message = f"event: {event_type}\n"
+        if event_id:
+            message += f"id: {event_id}\n"
         message += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
         return message 
\ No newline at end of file
@@ -21,6 +21,7 @@ from ..models import (
     User
 )
 from ..utils.auth import jwt_auth_required
+from ..utils.gitlab_pool import gitlab_pool
 
 logger = logging.getLogger('apps')
 
@@ -943,6 +944,7 @@ class CredentialView(View):
             if credential_type == 'gitlab_token':
                 if 'token' in data:  # 只在提供新token时更新
                     credential.token = data['token']  # GitLab Token 不加密
+                    gitlab_pool.evict(credential_id=credential.credential_id)
             elif credential_type == 'ssh_key':
                 if 'private_key' in data: # 只在提供新私钥时更新
                     credential.private_key = data['private_key']
@@ -1016,6 +1018,8 @@ class CredentialView(View):
                 # 如果是SSH密钥，先清理部署的密钥
                 if credential_type == 'ssh_key':
                     self.ssh_manager.remove_ssh_key(credential_id)
+                elif credential_type == 'gitlab_token':
+                    gitlab_pool.evict(credential_id=credential_id)
                 elif credential_type == 'kubeconfig':
                     # 删除kubeconfig凭证后，重新部署剩余的配置
                     credential.delete()
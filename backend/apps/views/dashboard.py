@@ -4,8 +4,9 @@ from django.http import JsonResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Count
-from ..models import Project, BuildTask, BuildHistory, User, Environment
+from django.db.models import Count, Sum
+from ..models import Project, BuildTask, BuildHistory, User, Environment, BuildStatsRollup
+from ..utils.build_stats import DURATION_BUCKETS, aggregate_rollups, get_daily_series, empty_histogram
 
 logger = logging.getLogger('apps')
 
@@ -28,14 +29,16 @@ class DashboardStatsView(View):
             # 获取环境总数
             env_count = Environment.objects.count()
 
-            # 获取总构建数量
-            total_builds_count = BuildHistory.objects.count()
+            # 获取总构建数量（从按天汇总的统计中读取）
+            total_builds_count = BuildStatsRollup.objects.filter(period='day').aggregate(
+                total=Sum('total_count')
+            )['total'] or 0
 
-            # 获取最近7天的构建成功率
+            # 获取最近7天的构建成功率（从按小时汇总的统计中读取）
             seven_days_ago = datetime.now() - timedelta(days=7)
-            recent_builds = BuildHistory.objects.filter(create_time__gte=seven_days_ago)
-            total_recent_builds = recent_builds.count()
-            success_recent_builds = recent_builds.filter(status='success').count()
+            recent_stats = aggregate_rollups('hour', seven_days_ago)
+            total_recent_builds = recent_stats['total_count']
+            success_recent_builds = recent_stats['success_count']
 
             success_rate = 0
             if total_recent_builds > 0:
@@ -76,6 +79,12 @@ class BuildTrendView(View):
             today = datetime.now().date() # 获取今天的日期部分
             start_date = today - timedelta(days=days - 1) # 开始日期是今天往前 days-1 天
 
+            # 一次性读取日期范围内的按天汇总数据
+            daily_stats = {
+                row['bucket_time'].date(): row
+                for row in get_daily_series(start_date, today)
+            }
+
             # 准备日期列表和结果数据
             date_list = []
             success_data = []
@@ -84,29 +93,11 @@ class BuildTrendView(View):
             # 生成从 start_date 到 today 的日期列表
             current_date = start_date
             while current_date <= today:
-                date_str = current_date.strftime('%Y-%m-%d')
-                date_list.append(date_str)
-
-                # 查询当天的构建数据
-                day_start = datetime.combine(current_date, datetime.min.time())
-                day_end = datetime.combine(current_date, datetime.max.time())
-
-                # 成功构建数
-                success_count = BuildHistory.objects.filter(
-                    create_time__gte=day_start,
-                    create_time__lte=day_end,
-                    status='success'
-                ).count()
-
-                # 失败构建数
-                failed_count = BuildHistory.objects.filter(
-                    create_time__gte=day_start,
-                    create_time__lte=day_end,
-                    status='failed'
-                ).count()
-
-                success_data.append(success_count)
-                failed_data.append(failed_count)
+                date_list.append(current_date.strftime('%Y-%m-%d'))
+
+                stats = daily_stats.get(current_date, {})
+                success_data.append(stats.get('success') or 0)
+                failed_data.append(stats.get('failed') or 0)
 
                 current_date += timedelta(days=1)
 
@@ -285,4 +276,97 @@ class ProjectDistributionView(View):
             'mobile': '移动端项目',
             'other': '其他项目'
         }
-        return category_map.get(category, '未分类')
\ No newline at end of file
+        return category_map.get(category, '未分类')
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BuildStatsView(View):
+    """构建统计汇总接口（按任务/项目/环境分组）"""
+
+    GROUP_FIELDS = {
+        'task': 'task_id',
+        'project': 'project_id',
+        'environment': 'environment_id',
+    }
+
+    def get(self, request):
+        """获取最近一段时间内按维度分组的构建统计"""
+        try:
+            days = int(request.GET.get('days', 7))
+            group_by = request.GET.get('group_by', 'task')
+            if group_by not in self.GROUP_FIELDS:
+                return JsonResponse({
+                    'code': 400,
+                    'message': '不支持的分组方式'
+                })
+            group_field = self.GROUP_FIELDS[group_by]
+
+            today = datetime.now().date()
+            start_time = datetime.combine(today - timedelta(days=days - 1), datetime.min.time())
+
+            # 直接读取按天汇总的统计行，在内存中按分组合并（行数为 天数 × 任务数）
+            rows = BuildStatsRollup.objects.filter(
+                period='day',
+                bucket_time__gte=start_time
+            ).values(
+                group_field, 'total_count', 'success_count', 'failed_count',
+                'terminated_count', 'duration_sum', 'duration_count', 'duration_histogram'
+            )
+
+            groups = {}
+            for row in rows:
+                key = row[group_field]
+                stats = groups.setdefault(key, {
+                    'total': 0, 'success': 0, 'failed': 0, 'terminated': 0,
+                    'duration_sum': 0, 'duration_count': 0,
+                    'duration_histogram': empty_histogram(),
+                })
+                stats['total'] += row['total_count']
+                stats['success'] += row['success_count']
+                stats['failed'] += row['failed_count']
+                stats['terminated'] += row['terminated_count']
+                stats['duration_sum'] += row['duration_sum']
+                stats['duration_count'] += row['duration_count']
+                for index, count in enumerate(row['duration_histogram'] or []):
+                    stats['duration_histogram'][index] += count
+
+            names = self._get_group_names(group_by, [key for key in groups if key])
+
+            # 耗时分布的分档标签
+            bucket_labels = [f'<={upper}s' for upper in DURATION_BUCKETS] + [f'>{DURATION_BUCKETS[-1]}s']
+
+            result = []
+            for key, stats in groups.items():
+                result.append({
+                    'id': key,
+                    'name': names.get(key, '未知'),
+                    'total': stats['total'],
+                    'success': stats['success'],
+                    'failed': stats['failed'],
+                    'terminated': stats['terminated'],
+                    'success_rate': round(stats['success'] / stats['total'] * 100) if stats['total'] > 0 else 0,
+                    'avg_duration': round(stats['duration_sum'] / stats['duration_count']) if stats['duration_count'] > 0 else 0,
+                    'duration_histogram': dict(zip(bucket_labels, stats['duration_histogram'])),
+                })
+            result.sort(key=lambda item: item['total'], reverse=True)
+
+            return JsonResponse({
+                'code': 200,
+                'message': '获取构建统计数据成功',
+                'data': result
+            })
+        except Exception as e:
+            logger.error(f'获取构建统计数据失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
+
+    def _get_group_names(self, group_by, keys):
+        """批量获取分组对应的名称"""
+        if not keys:
+            return {}
+        if group_by == 'task':
+            return dict(BuildTask.objects.filter(task_id__in=keys).values_list('task_id', 'name'))
+        if group_by == 'project':
+            return dict(Project.objects.filter(project_id__in=keys).values_list('project_id', 'name'))
+        return dict(Environment.objects.filter(environment_id__in=keys).values_list('environment_id', 'name'))
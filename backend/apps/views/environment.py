@@ -8,9 +8,11 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
 from django.db.models import Q
-from ..models import Environment, User
+from ..models import Environment, BuildHistory, User
 from ..utils.auth import jwt_auth_required
 from ..utils.permissions import get_user_permissions
+from ..utils.log_search import remove_from_log_index_on_commit
+from ..utils.cgroups import normalize_resource_limits
 
 logger = logging.getLogger('apps')
 
@@ -178,6 +180,7 @@ class EnvironmentView(View):
                     'name': env.name,
                     'type': env.type,
                     'description': env.description,
+                    'resource_limits': env.resource_limits,
                     'creator': {
                         'user_id': env.creator.user_id,
                         'username': env.creator.username,
@@ -218,6 +221,13 @@ class EnvironmentView(View):
                         'message': '环境名称和类型不能为空'
                     })
 
+                resource_limits, error = normalize_resource_limits(data.get('resource_limits'))
+                if error:
+                    return JsonResponse({
+                        'code': 400,
+                        'message': error
+                    })
+
                 # 检查环境名称是否已存在
                 if Environment.objects.filter(name=name).exists():
                     return JsonResponse({
@@ -232,6 +242,7 @@ class EnvironmentView(View):
                     name=name,
                     type=type,
                     description=description,
+                    resource_limits=resource_limits,
                     creator=creator
                 )
 
@@ -288,6 +299,14 @@ class EnvironmentView(View):
                     environment.type = type
                 if description is not None:
                     environment.description = description
+                if 'resource_limits' in data:
+                    resource_limits, error = normalize_resource_limits(data['resource_limits'])
+                    if error:
+                        return JsonResponse({
+                            'code': 400,
+                            'message': error
+                        })
+                    environment.resource_limits = resource_limits
 
                 environment.save()
 
@@ -318,6 +337,7 @@ class EnvironmentView(View):
 
                 try:
                     environment = Environment.objects.get(environment_id=environment_id)
+                    remove_from_log_index_on_commit(BuildHistory.objects.filter(task__environment=environment))
                     environment.delete()
                     return JsonResponse({
                         'code': 200,
@@ -1,64 +1,35 @@
 import json
 import logging
-import gitlab
 from django.http import JsonResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from ..models import Project, BuildTask, GitlabTokenCredential
+from ..models import Project, BuildTask
 from ..utils.auth import jwt_auth_required
+from ..utils.gitlab_cache import parse_repository, get_project_id, get_branches, get_commits
+from ..utils.gitlab_pool import gitlab_pool
 
 logger = logging.getLogger('apps')
 
-def get_gitlab_client(repository, git_token=None):
-    """获取GitLab客户端"""
+def get_gitlab_credential(credential=None):
+    """获取GitLab Token凭证，未指定时使用第一个可用的GitLab Token凭证"""
+    return credential or gitlab_pool.get_default_credential()
+
+def get_gitlab_client(repository, credential=None):
+    """从连接池获取GitLab客户端"""
     try:
-        if not git_token:
-            # 获取第一个可用的GitLab Token凭证
-            credential = GitlabTokenCredential.objects.first()
-            if not credential:
-                raise ValueError('未找到GitLab Token凭证')
-            git_token = credential.token
-
-        # 从仓库地址中提取GitLab实例URL
-        repository_parts = repository.split('/')
-        gitlab_url = '/'.join(repository_parts[:3])  # 获取到域名部分
-        if not gitlab_url.startswith('http'):
-            gitlab_url = f'http://{gitlab_url}'
-
-        # 创建GitLab客户端
-        gl = gitlab.Gitlab(
-            url=gitlab_url,
-            private_token=git_token
-        )
-        gl.auth()
-        return gl
+        gitlab_url, _ = parse_repository(repository)
+        return gitlab_pool.get(gitlab_url, get_gitlab_credential(credential))
     except Exception as e:
         logger.error(f'获取GitLab客户端失败: {str(e)}', exc_info=True)
         raise
 
-def get_gitlab_project(repository, git_token=None):
-    """获取GitLab项目"""
+def get_gitlab_project(repository, credential=None):
+    """获取GitLab项目（项目ID会被缓存，不再每次解析路径或搜索）"""
     try:
-        gl = get_gitlab_client(repository, git_token)
-        repository_parts = repository.split('/')
-        project_path = '/'.join(repository_parts[3:])  # 获取group/project部分
-        project_path = project_path.replace('.git', '')
-        
-        # 对项目路径进行URL编码
-        import urllib.parse
-        encoded_path = urllib.parse.quote(project_path, safe='')
-        
-        try:
-            # 使用URL编码的路径
-            return gl.projects.get(encoded_path)
-        except gitlab.exceptions.GitlabGetError:
-            # 失败，通过搜索项目名称获取项目id
-            projects = gl.projects.list(search=project_path.split('/')[-1])
-            for project in projects:
-                if project.path_with_namespace == project_path:
-                    return gl.projects.get(project.id)
-            raise gitlab.exceptions.GitlabGetError(f"Project {project_path} not found")
+        gl = get_gitlab_client(repository, credential)
+        gitlab_url, project_path = parse_repository(repository)
+        return gl.projects.get(get_project_id(gl, gitlab_url, project_path), lazy=True)
     except Exception as e:
         logger.error(f'获取GitLab项目失败: {str(e)}', exc_info=True)
         raise
@@ -91,26 +62,23 @@ class GitlabBranchView(View):
                     'message': '任务未配置Git仓库'
                 })
 
-            # 获取GitLab项目
-            gitlab_project = get_gitlab_project(
+            # 获取分支列表（优先使用缓存）
+            branches = get_branches(
                 task.project.repository,
-                task.git_token.token if task.git_token else None
+                get_gitlab_credential(task.git_token)
             )
-            
-            # 获取分支列表
-            branches = gitlab_project.branches.list(all=True)
             branch_list = []
             for branch in branches:
                 branch_list.append({
-                    'name': branch.name,
-                    'protected': branch.protected,
-                    'merged': branch.merged,
-                    'default': branch.default,
+                    'name': branch['name'],
+                    'protected': branch['protected'],
+                    'merged': branch['merged'],
+                    'default': branch['default'],
                     'commit': {
-                        'id': branch.commit['id'],
-                        'title': branch.commit['title'],
-                        'author_name': branch.commit['author_name'],
-                        'authored_date': branch.commit['authored_date'],
+                        'id': branch['commit']['id'],
+                        'title': branch['commit']['title'],
+                        'author_name': branch['commit']['author_name'],
+                        'authored_date': branch['commit']['authored_date'],
                     }
                 })
 
@@ -156,32 +124,26 @@ class GitlabCommitView(View):
                     'message': '任务未配置Git仓库'
                 })
 
-            # 获取GitLab项目
-            gitlab_project = get_gitlab_project(
+            # 获取最近的提交记录（优先使用缓存）
+            commits = get_commits(
                 task.project.repository,
-                task.git_token.token if task.git_token else None
-            )
-            
-            # 获取最近的提交记录
-            commits = gitlab_project.commits.list(
-                ref_name=branch,
-                all=False,
-                per_page=20,  # 增加返回数量
-                order_by='created_at'
+                get_gitlab_credential(task.git_token),
+                branch,
+                per_page=20
             )
 
             commit_list = []
             for commit in commits:
                 commit_list.append({
-                    'id': commit.id,
-                    'short_id': commit.short_id,
-                    'title': commit.title,
-                    'message': commit.message,
-                    'author_name': commit.author_name,
-                    'author_email': commit.author_email,
-                    'authored_date': commit.authored_date,
-                    'created_at': commit.created_at,
-                    'web_url': commit.web_url
+                    'id': commit['id'],
+                    'short_id': commit['short_id'],
+                    'title': commit['title'],
+                    'message': commit['message'],
+                    'author_name': commit['author_name'],
+                    'author_email': commit['author_email'],
+                    'authored_date': commit['authored_date'],
+                    'created_at': commit['created_at'],
+                    'web_url': commit['web_url']
                 })
 
             return JsonResponse({
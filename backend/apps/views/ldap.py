@@ -1,6 +1,4 @@
 import json
-import uuid
-import hashlib
 import logging
 import ldap3
 from django.http import JsonResponse
@@ -11,13 +9,14 @@ from django.db import transaction
 from ..models import User, LDAPConfig
 from ..utils.auth import jwt_auth_required
 from ..utils.crypto import CryptoUtils
+from ..utils.config_cache import ldap_config_cache
+from ..utils.ldap_pool import ldap_pool
+from ..utils.ldap_sync import (
+    create_admin_connection, get_change_attribute, iter_directory_users, sync_users, sync_directory
+)
 
 logger = logging.getLogger('apps')
 
-def generate_id():
-    """生成唯一ID"""
-    return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:32]
-
 class LDAPError(Exception):
     """LDAP相关异常"""
     pass
@@ -53,6 +52,8 @@ class LDAPConfigView(View):
                 config = self._get_or_create_config()
                 self._update_config(config, data)
                 config.save()
+                ldap_config_cache.invalidate()
+                transaction.on_commit(ldap_pool.invalidate)
                 return APIResponse.success('更新LDAP配置成功')
         except Exception as e:
             logger.error(f'更新LDAP配置失败: {str(e)}', exc_info=True)
@@ -89,6 +90,7 @@ class LDAPConfigView(View):
             'user_search_filter': config.user_search_filter,
             'user_attr_map': config.user_attr_map,
             'timeout': config.timeout,
+            'sync_state': config.sync_state or {},
             'update_time': config.update_time.strftime('%Y-%m-%d %H:%M:%S') if config.update_time else None
         }
 
@@ -98,6 +100,9 @@ class LDAPConfigView(View):
             'enabled', 'server_host', 'server_port', 'use_ssl', 'base_dn',
             'bind_dn', 'user_search_filter', 'user_attr_map', 'timeout'
         ]
+        # 这些配置变化后，上次同步的变更标记不再适用，下次同步需全量进行
+        directory_fields = ['server_host', 'server_port', 'base_dn', 'user_attr_map']
+        directory_before = [getattr(config, field) for field in directory_fields]
         
         # 检查是否禁用LDAP认证
         if 'enabled' in data and not data['enabled']:
@@ -122,6 +127,9 @@ class LDAPConfigView(View):
                 if data['bind_password']:
                     config.bind_password = CryptoUtils.encrypt_password(data['bind_password'])
 
+        if [getattr(config, field) for field in directory_fields] != directory_before:
+            config.sync_state = {}
+
 @method_decorator(csrf_exempt, name='dispatch')
 class LDAPTestView(View):
     @method_decorator(jwt_auth_required)
@@ -144,9 +152,8 @@ class LDAPTestView(View):
 
     def _get_config(self):
         """获取LDAP配置"""
-        try:
-            config = LDAPConfig.objects.get()
-        except LDAPConfig.DoesNotExist:
+        config = ldap_config_cache.get()
+        if not config:
             raise LDAPError('LDAP配置不存在，请先配置LDAP服务器')
         
         if not all([config.server_host, config.base_dn, config.bind_dn]):
@@ -246,6 +253,16 @@ class LDAPSyncView(View):
                     {'synced_users': synced_users}
                 )
             
+            elif action == 'sync_all':
+                # 同步目录中的全部用户，默认只同步上次同步后变更的条目
+                stats = self._sync_directory(config, full=bool(data.get('full')))
+                mode_text = '全量' if stats['mode'] == 'full' else '增量'
+                return APIResponse.success(
+                    f"{mode_text}同步完成：新建{stats['created']}个，更新{stats['updated']}个，"
+                    f"未变化{stats['unchanged']}个，跳过{stats['skipped']}个",
+                    stats
+                )
+
             else:
                 return APIResponse.error(400, '无效的操作类型')
                 
@@ -257,12 +274,11 @@ class LDAPSyncView(View):
 
     def _get_config(self):
         """获取LDAP配置"""
-        try:
-            config = LDAPConfig.objects.get()
-            if not config.enabled:
-                raise LDAPError('LDAP未启用')
-        except LDAPConfig.DoesNotExist:
+        config = ldap_config_cache.get()
+        if not config:
             raise LDAPError('LDAP配置不存在')
+        if not config.enabled:
+            raise LDAPError('LDAP未启用')
 
         if not all([config.server_host, config.base_dn, config.bind_dn, config.bind_password]):
             raise LDAPError('LDAP配置不完整')
@@ -270,44 +286,15 @@ class LDAPSyncView(View):
         return config
 
     def _search_ldap_users(self, config, search_filter=''):
-        """搜索LDAP用户"""
+        """搜索LDAP用户（分页搜索）"""
         try:
-            server_uri = f"{'ldaps://' if config.use_ssl else 'ldap://'}{config.server_host}:{config.server_port}"
-            server = ldap3.Server(server_uri, use_ssl=config.use_ssl, connect_timeout=config.timeout)
-            
-            # 解密绑定密码
-            bind_password = CryptoUtils.decrypt_password(config.bind_password)
-            
-            # 使用管理员账户连接
-            connection = ldap3.Connection(
-                server, 
-                user=config.bind_dn, 
-                password=bind_password, 
-                auto_bind=True
-            )
-            
-            # 构建搜索过滤器
-            if search_filter:
-                final_filter = f"(&(objectClass=person)({search_filter}))"
-            else:
-                final_filter = "(objectClass=person)"
-            
-            # 搜索用户
-            connection.search(
-                search_base=config.base_dn,
-                search_filter=final_filter,
-                attributes=list(config.user_attr_map.values())
-            )
-            
-            users = []
-            for entry in connection.entries:
-                user_info = self._extract_user_info(entry, config.user_attr_map)
-                if user_info.get('username'):  # 确保有用户名
-                    users.append(user_info)
-            
-            connection.unbind()
-            return users
-            
+            connection = create_admin_connection(config)
+            try:
+                change_attribute = get_change_attribute(connection)
+                return list(iter_directory_users(connection, config, search_filter, change_attribute=change_attribute))
+            finally:
+                connection.unbind()
+
         except ldap3.core.exceptions.LDAPException as e:
             logger.error(f"LDAP搜索用户错误: {str(e)}")
             raise LDAPError(f'搜索用户失败: {str(e)}')
@@ -315,78 +302,28 @@ class LDAPSyncView(View):
             logger.error(f"搜索LDAP用户未知错误: {str(e)}", exc_info=True)
             raise LDAPError(f'搜索失败: {str(e)}')
 
-    def _extract_user_info(self, entry, attr_map):
-        """提取用户信息"""
-        user_info = {'dn': entry.entry_dn}
-        for local_attr, ldap_attr in attr_map.items():
-            if hasattr(entry, ldap_attr):
-                attr_value = getattr(entry, ldap_attr)
-                if attr_value:
-                    user_info[local_attr] = str(attr_value.value) if hasattr(attr_value, 'value') else str(attr_value)
-        return user_info
-
     def _sync_users_to_system(self, config, users_data):
-        """同步用户到系统"""
-        synced_users = []
-        
-        for user_data in users_data:
-            try:
-                with transaction.atomic():
-                    username = user_data.get('username')
-                    if not username:
-                        continue
-                    
-                    # 检查用户是否已存在
-                    try:
-                        user = User.objects.get(username=username)
-                        if user.user_type != 'ldap':
-                            logger.warning(f'用户{username}已存在但不是LDAP用户，跳过')
-                            continue
-                        
-                        # 更新用户信息
-                        user.name = user_data.get('name', username)
-                        user.email = user_data.get('email')
-                        user.ldap_dn = user_data.get('dn')
-                        user.save()
-                        
-                        synced_users.append({
-                            'username': username,
-                            'action': 'updated'
-                        })
-                        
-                    except User.DoesNotExist:
-                        # 创建新用户
-                        user = User.objects.create(
-                            user_id=generate_id(),
-                            username=username,
-                            name=user_data.get('name', username),
-                            email=user_data.get('email'),
-                            user_type='ldap',
-                            ldap_dn=user_data.get('dn'),
-                            status=1
-                        )
-                        
-                        synced_users.append({
-                            'username': username,
-                            'action': 'created'
-                        })
-                        
-            except Exception as e:
-                logger.error(f'同步用户{user_data.get("username")}失败: {str(e)}')
-                continue
-        
+        """同步选中的用户到系统"""
+        result = sync_users(users_data)
+        synced_users = [{'username': username, 'action': 'created'} for username in result['created']]
+        synced_users += [{'username': username, 'action': 'updated'} for username in result['updated']]
         return synced_users
 
+    def _sync_directory(self, config, full=False):
+        """同步LDAP目录中的全部用户（默认增量）"""
+        try:
+            return sync_directory(config, full=full)
+        except ldap3.core.exceptions.LDAPException as e:
+            logger.error(f"LDAP同步目录用户错误: {str(e)}")
+            raise LDAPError(f'同步用户失败: {str(e)}')
+
 @method_decorator(csrf_exempt, name='dispatch')
 class LDAPStatusView(View):
     def get(self, request):
         """检查LDAP是否启用（无需认证）"""
         try:
-            try:
-                config = LDAPConfig.objects.get()
-                enabled = config.enabled
-            except LDAPConfig.DoesNotExist:
-                enabled = False
+            config = ldap_config_cache.get()
+            enabled = config.enabled if config else False
             
             return APIResponse.success('获取LDAP状态成功', {'enabled': enabled})
         except Exception as e:
@@ -415,12 +352,11 @@ class LDAPAuthenticator:
     @staticmethod
     def _validate_config():
         """验证LDAP配置"""
-        try:
-            config = LDAPConfig.objects.get()
-            if not config.enabled:
-                raise LDAPError('未启用LDAP认证')
-        except LDAPConfig.DoesNotExist:
+        config = ldap_config_cache.get()
+        if not config:
             raise LDAPError('LDAP配置不存在')
+        if not config.enabled:
+            raise LDAPError('未启用LDAP认证')
 
         if not all([config.server_host, config.base_dn, config.bind_dn, config.bind_password]):
             raise LDAPError('LDAP配置不完整，缺少必要的服务器信息或管理员账户')
@@ -429,44 +365,12 @@ class LDAPAuthenticator:
 
     @staticmethod
     def _ldap_authenticate(config, username, password):
-        """执行LDAP认证 - 只使用绑定DN模式"""
+        """执行LDAP认证 - 通过连接池的管理员长连接搜索用户DN（带缓存），再以用户身份绑定"""
         try:
-            server_uri = f"{'ldaps://' if config.use_ssl else 'ldap://'}{config.server_host}:{config.server_port}"
-            server = ldap3.Server(server_uri, use_ssl=config.use_ssl, connect_timeout=config.timeout)
-
-            # 解密绑定密码
-            bind_password = CryptoUtils.decrypt_password(config.bind_password)
-            
-            # 先用管理员账户连接并搜索用户
-            admin_conn = ldap3.Connection(server, user=config.bind_dn, password=bind_password, auto_bind=True)
-            
-            # 搜索用户 - 支持两种过滤器格式
-            search_filter = config.user_search_filter
-            if '{username}' in search_filter:
-                search_filter = search_filter.format(username=username)
-            elif '%(user)s' in search_filter:
-                search_filter = search_filter.replace('%(user)s', username)
-            else:
-                # 如果都不匹配，尝试直接替换
-                search_filter = search_filter.format(username=username)
-            admin_conn.search(
-                search_base=config.base_dn,
-                search_filter=search_filter,
-                attributes=list(config.user_attr_map.values())
-            )
-            
-            if not admin_conn.entries:
-                admin_conn.unbind()
+            found_user_dn = ldap_pool.authenticate(config, username, password)
+            if not found_user_dn:
                 raise LDAPError('用户不存在于LDAP服务器')
-            
-            # 获取搜索到的用户DN
-            found_user_dn = admin_conn.entries[0].entry_dn
-            admin_conn.unbind()
-            
-            # DN和用户密码进行认证
-            user_conn = ldap3.Connection(server, user=found_user_dn, password=password, auto_bind=True)
-            user_conn.unbind()
-            
+
         except ldap3.core.exceptions.LDAPBindError as e:
             if 'invalidCredentials' in str(e):
                 raise LDAPError('用户名或密码错误')
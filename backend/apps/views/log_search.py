@@ -0,0 +1,165 @@
+import time
+import logging
+from datetime import datetime
+from django.http import JsonResponse
+from django.views import View
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from ..models import BuildHistory, BuildTask
+from ..utils.auth import jwt_auth_required
+from ..utils.permissions import get_compiled_permissions
+from ..utils.log_search import build_log_index
+
+logger = logging.getLogger('apps')
+
+# 每页最多返回的构建数
+MAX_PAGE_SIZE = 50
+# 每个构建最多返回的匹配行数
+MAX_LINES_PER_BUILD = 20
+
+
+def parse_search_time(value, end=False):
+    """解析检索的时间范围，支持 YYYY-MM-DD 和 YYYY-MM-DD HH:MM:SS
+
+    Returns:
+        tuple: ('YYYY-MM-DD HH:MM:SS', 错误信息)
+    """
+    if not value:
+        return None, None
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == '%Y-%m-%d' and end:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime('%Y-%m-%d %H:%M:%S'), None
+    return None, f'时间格式错误: {value}'
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BuildLogSearchView(View):
+    """构建日志全文检索接口"""
+
+    @method_decorator(jwt_auth_required)
+    def get(self, request):
+        """跨构建检索日志
+
+        查询参数:
+            keyword: 关键词（作为整体匹配，不区分大小写）
+            project_id/environment_id/task_id/status: 过滤条件
+            start_time/end_time: 构建开始时间范围
+            order: desc 最近的构建在前（默认），asc 最早的构建在前
+            page/page_size: 按构建分页
+            lines: 每个构建返回的匹配行数
+        """
+        try:
+            # 获取当前用户的权限信息
+            permissions = get_compiled_permissions(request.user_id)
+
+            # 与查看单个构建日志的权限一致
+            if not (permissions.has('build_task', 'view_log') or permissions.has('build_history', 'view_log')):
+                logger.warning(f'用户[{request.user_id}]没有构建历史查看日志权限')
+                return JsonResponse({
+                    'code': 403,
+                    'message': '没有权限查看构建日志'
+                }, status=403)
+
+            keyword = request.GET.get('keyword', '').strip()
+            if len(keyword) < build_log_index.min_keyword_length:
+                return JsonResponse({
+                    'code': 400,
+                    'message': f'关键词至少需要{build_log_index.min_keyword_length}个字符'
+                })
+
+            start_time, error = parse_search_time(request.GET.get('start_time'))
+            if not error:
+                end_time, error = parse_search_time(request.GET.get('end_time'), end=True)
+            if error:
+                return JsonResponse({
+                    'code': 400,
+                    'message': error
+                })
+
+            project_id = request.GET.get('project_id')
+            environment_id = request.GET.get('environment_id')
+            task_id = request.GET.get('task_id')
+            status = request.GET.get('status')
+            order = 'asc' if request.GET.get('order') == 'asc' else 'desc'
+            page = max(int(request.GET.get('page', 1)), 1)
+            page_size = min(max(int(request.GET.get('page_size', 10)), 1), MAX_PAGE_SIZE)
+            lines_per_build = min(max(int(request.GET.get('lines', 5)), 1), MAX_LINES_PER_BUILD)
+
+            # 项目、环境及数据权限换算为任务ID后在索引中过滤，不限制时不传任务ID
+            task_ids = None
+            if (project_id or environment_id or task_id
+                    or permissions.project_scope == 'custom' or permissions.environment_scope == 'custom'):
+                tasks = BuildTask.objects.filter(permissions.project_q(), permissions.environment_q())
+                if project_id:
+                    tasks = tasks.filter(project__project_id=project_id)
+                if environment_id:
+                    tasks = tasks.filter(environment__environment_id=environment_id)
+                if task_id:
+                    tasks = tasks.filter(task_id=task_id)
+                task_ids = list(tasks.values_list('task_id', flat=True))
+
+            started = time.perf_counter()
+            total, builds = build_log_index.search(
+                keyword,
+                task_ids=task_ids,
+                status=status,
+                start_time=start_time,
+                end_time=end_time,
+                order=order,
+                offset=(page - 1) * page_size,
+                limit=page_size,
+                lines_per_build=lines_per_build
+            )
+            took = time.perf_counter() - started
+
+            # 补充构建的展示信息，已删除的构建不返回
+            histories = {
+                history['id']: history
+                for history in BuildHistory.objects.filter(id__in=[build['id'] for build in builds]).values(
+                    'id', 'history_id', 'branch', 'commit_id', 'version',
+                    'task__task_id', 'task__name', 'task__project__name', 'task__environment__name'
+                )
+            }
+            result = []
+            for build in builds:
+                history = histories.get(build['id'])
+                if not history:
+                    continue
+                result.append({
+                    'id': history['history_id'],
+                    'build_number': build['build_number'],
+                    'status': build['status'],
+                    'branch': history['branch'],
+                    'commit': history['commit_id'][:8] if history['commit_id'] else None,
+                    'version': history['version'],
+                    'startTime': build['start_time'],
+                    'project': history['task__project__name'],
+                    'environment': history['task__environment__name'],
+                    'task': {
+                        'id': history['task__task_id'],
+                        'name': history['task__name']
+                    },
+                    'match_count': build['match_count'],
+                    'lines': build['lines']
+                })
+
+            return JsonResponse({
+                'code': 200,
+                'message': '检索构建日志成功',
+                'data': result,
+                'total': total,
+                'page': page,
+                'page_size': page_size,
+                'took_ms': round(took * 1000, 2)
+            })
+        except Exception as e:
+            logger.error(f'检索构建日志失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
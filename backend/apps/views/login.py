@@ -2,6 +2,7 @@ import json
 import hashlib
 import jwt
 import uuid
+import time
 from datetime import datetime, timedelta
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -9,6 +10,7 @@ from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from ..models import User, UserToken, LoginLog
 from ..utils.security import SecurityValidator
+from ..utils.auth import token_registry
 from .ldap import LDAPAuthenticator
 
 def generate_token_id():
@@ -95,15 +97,20 @@ class LoginHandler:
         token_payload = {
             'user_id': user.user_id,
             'username': user.username,
+            'jti': token_id,
         'exp': datetime.utcnow() + timedelta(minutes=config.session_timeout)
         }
         token = jwt.encode(token_payload, settings.SECRET_KEY, algorithm='HS256')
         
-    # 更新token记录
+    # 更新token记录，同一用户只保留最新的token
+        previous_token_id = UserToken.objects.filter(user=user).values_list('token_id', flat=True).first()
         UserToken.objects.update_or_create(
             user=user,
         defaults={'token_id': token_id, 'token': token}
         )
+        token_registry.register(token_id)
+        if previous_token_id and previous_token_id != token_id:
+            token_registry.revoke(previous_token_id, time.time() + config.session_timeout * 60)
 
         # 更新登录时间
         user.login_time = datetime.now()
@@ -187,7 +194,10 @@ def logout(request):
         try:
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
             user_id = payload.get('user_id')
+            token_ids = list(UserToken.objects.filter(user_id=user_id).values_list('token_id', flat=True))
             UserToken.objects.filter(user_id=user_id).delete()
+            for token_id in set(token_ids + [payload.get('jti')]):
+                token_registry.revoke(token_id, payload.get('exp'))
             return JsonResponse({'code': 200, 'message': '退出成功'})
 
         except jwt.ExpiredSignatureError:
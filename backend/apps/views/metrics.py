@@ -0,0 +1,59 @@
+import hmac
+import logging
+import ipaddress
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from ..utils.metrics import registry
+
+logger = logging.getLogger('apps')
+
+# Prometheus 文本格式
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def is_allowed_address(address):
+    """请求地址是否在 METRICS_ALLOWED_IPS 中（支持 CIDR），只使用直连地址，不信任 X-Forwarded-For"""
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    for allowed in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        try:
+            if address in ipaddress.ip_network(allowed, strict=False):
+                return True
+        except ValueError:
+            logger.warning(f'METRICS_ALLOWED_IPS 中的地址无效: {allowed}')
+    return False
+
+
+def check_metrics_token(request):
+    """校验采集Token（METRICS_TOKEN），未配置时只允许 METRICS_ALLOWED_IPS 中的地址访问"""
+    expected = getattr(settings, 'METRICS_TOKEN', '')
+    if not expected:
+        return is_allowed_address(request.META.get('REMOTE_ADDR', ''))
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[len('Bearer '):]
+    token = token or request.GET.get('token', '')
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class MetricsView(View):
+    def get(self, request):
+        """以 Prometheus 文本格式输出运行指标"""
+        if not check_metrics_token(request):
+            if not getattr(settings, 'METRICS_TOKEN', ''):
+                return JsonResponse({'code': 403, 'message': '不允许从该地址访问运行指标'}, status=403)
+            return JsonResponse({'code': 401, 'message': '无效的采集Token'}, status=401)
+        try:
+            return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+        except Exception as e:
+            logger.error(f'生成运行指标失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            }, status=500)
@@ -1,19 +1,18 @@
 import json
 import uuid
 import hashlib
-import hmac
-import base64
 import time
 import logging
-import requests
 from urllib.parse import quote_plus
 from django.http import JsonResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
-from ..models import NotificationRobot, User
+from django.db.models import Count
+from ..models import NotificationRobot, NotificationOutbox, User
 from ..utils.auth import jwt_auth_required
+from ..utils.notification_dispatcher import notification_dispatcher, sign_webhook
 
 logger = logging.getLogger('apps')
 
@@ -276,26 +275,6 @@ class NotificationRobotView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class NotificationTestView(View):
-    def _sign_dingtalk(self, secret, timestamp):
-        """钉钉机器人签名"""
-        string_to_sign = f'{timestamp}\n{secret}'
-        hmac_code = hmac.new(
-            secret.encode('utf-8'),
-            string_to_sign.encode('utf-8'),
-            digestmod=hashlib.sha256
-        ).digest()
-        return base64.b64encode(hmac_code).decode('utf-8')
-
-    def _sign_feishu(self, secret, timestamp):
-        """飞书机器人签名"""
-        string_to_sign = f'{timestamp}\n{secret}'
-        hmac_code = hmac.new(
-            secret.encode('utf-8'),
-            string_to_sign.encode('utf-8'),
-            digestmod=hashlib.sha256
-        ).digest()
-        return base64.b64encode(hmac_code).decode('utf-8')
-
     @method_decorator(jwt_auth_required)
     def post(self, request, *args, **kwargs):
         """测试机器人"""
@@ -335,7 +314,7 @@ class NotificationTestView(View):
                     
                     # 如果使用加签方式
                     if robot.security_type == 'secret' and robot.secret:
-                        sign = self._sign_dingtalk(robot.secret, timestamp)
+                        sign = sign_webhook(robot.secret, timestamp)
                         webhook = f"{webhook}&timestamp={timestamp}&sign={quote_plus(sign)}"
                     
                     # 构建消息内容
@@ -346,11 +325,11 @@ class NotificationTestView(View):
                         }
                     }
                     
-                    response = requests.post(webhook, json=message_data)
+                    response = notification_dispatcher.post(webhook, message_data)
 
                 elif robot.type == 'wecom':
                     # 企业微信机器人
-                    response = requests.post(robot.webhook, json={
+                    response = notification_dispatcher.post(robot.webhook, {
                         "msgtype": "text",
                         "text": {
                             "content": test_message
@@ -361,18 +340,18 @@ class NotificationTestView(View):
                     # 飞书机器人
                     headers = {}
                     if robot.security_type == 'secret' and robot.secret:
-                        sign = self._sign_feishu(robot.secret, timestamp)
+                        sign = sign_webhook(robot.secret, timestamp)
                         headers.update({
                             "X-Timestamp": timestamp,
                             "X-Sign": sign
                         })
                     
-                    response = requests.post(robot.webhook, json={
+                    response = notification_dispatcher.post(robot.webhook, {
                         "msg_type": "text",
                         "content": {
                             "text": test_message
                         }
-                    }, headers=headers)
+                    }, headers)
 
                 if response.status_code == 200:
                     resp_json = response.json()
@@ -404,4 +383,77 @@ class NotificationTestView(View):
             return JsonResponse({
                 'code': 500,
                 'message': f'服务器错误: {str(e)}'
-            }) 
\ No newline at end of file
+            })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class NotificationOutboxView(View):
+    @method_decorator(jwt_auth_required)
+    def get(self, request):
+        """获取通知发件箱的发送记录及各状态数量"""
+        try:
+            status = request.GET.get('status')
+            robot_id = request.GET.get('robot_id')
+            batch_id = request.GET.get('batch_id')
+            page = max(int(request.GET.get('page', 1)), 1)
+            page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+
+            outboxes = NotificationOutbox.objects.all()
+            if robot_id:
+                outboxes = outboxes.filter(robot_id=robot_id)
+            if batch_id:
+                outboxes = outboxes.filter(batch_id=batch_id)
+
+            # 各状态数量（不受状态筛选影响）
+            stats = {'pending': 0, 'sending': 0, 'success': 0, 'failed': 0}
+            for item in outboxes.values('status').annotate(count=Count('id')):
+                stats[item['status']] = item['count']
+
+            if status:
+                outboxes = outboxes.filter(status=status)
+
+            total = outboxes.count()
+            start = (page - 1) * page_size
+            outboxes = outboxes.select_related('robot', 'history', 'history__task').order_by('-id')[start:start + page_size]
+
+            outbox_list = []
+            for outbox in outboxes:
+                outbox_list.append({
+                    'id': outbox.id,
+                    'robot': {
+                        'robot_id': outbox.robot.robot_id,
+                        'name': outbox.robot.name,
+                        'type': outbox.robot.type
+                    } if outbox.robot else None,
+                    'history': {
+                        'history_id': outbox.history.history_id,
+                        'build_number': outbox.history.build_number,
+                        'task_name': outbox.history.task.name if outbox.history.task else None
+                    } if outbox.history else None,
+                    'batch_id': outbox.batch_id,
+                    'status': outbox.status,
+                    'attempts': outbox.attempts,
+                    'last_error': outbox.last_error,
+                    'next_attempt_time': outbox.next_attempt_time.strftime('%Y-%m-%d %H:%M:%S') if outbox.next_attempt_time else None,
+                    'sent_time': outbox.sent_time.strftime('%Y-%m-%d %H:%M:%S') if outbox.sent_time else None,
+                    'create_time': outbox.create_time.strftime('%Y-%m-%d %H:%M:%S') if outbox.create_time else None
+                })
+
+            return JsonResponse({
+                'code': 200,
+                'message': '获取通知发送记录成功',
+                'data': {
+                    'list': outbox_list,
+                    'stats': stats,
+                    'total': total,
+                    'page': page,
+                    'page_size': page_size
+                }
+            })
+
+        except Exception as e:
+            logger.error(f'获取通知发送记录失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
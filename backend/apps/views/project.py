@@ -8,9 +8,10 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
 from django.db.models import Q
-from ..models import Project, User
+from ..models import Project, BuildHistory, User
 from ..utils.auth import jwt_auth_required
 from ..utils.permissions import get_user_permissions
+from ..utils.log_search import remove_from_log_index_on_commit
 
 logger = logging.getLogger('apps')
 
@@ -222,6 +223,7 @@ class ProjectView(View):
 
                 try:
                     project = Project.objects.get(project_id=project_id)
+                    remove_from_log_index_on_commit(BuildHistory.objects.filter(task__project=project))
                     project.delete()
                     return JsonResponse({
                         'code': 200,
@@ -0,0 +1,77 @@
+import logging
+from datetime import datetime
+from django.http import JsonResponse
+from django.views import View
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from ..middleware import request_stats, SLOW_REQUEST_THRESHOLD
+from ..utils.auth import jwt_auth_required
+from ..utils.permissions import get_user_permissions
+
+logger = logging.getLogger('apps')
+
+# 支持的排序字段
+SORT_FIELDS = ('total_time', 'avg_time', 'p95_time', 'max_time', 'count', 'avg_queries', 'max_queries', 'avg_size', 'slow')
+
+
+def check_system_permission(user_id, operation):
+    """检查系统基本设置权限"""
+    user_permissions = get_user_permissions(user_id)
+    return operation in user_permissions.get('function', {}).get('system_basic', [])
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class RequestStatsView(View):
+    @method_decorator(jwt_auth_required)
+    def get(self, request):
+        """获取各接口的耗时统计（当前进程自启动或上次重置以来）"""
+        try:
+            if not check_system_permission(request.user_id, 'view'):
+                return JsonResponse({'code': 403, 'message': '没有权限查看接口统计'}, status=403)
+
+            sort = request.GET.get('sort', 'total_time')
+            if sort not in SORT_FIELDS:
+                return JsonResponse({'code': 400, 'message': '不支持的排序字段'})
+            limit = min(max(int(request.GET.get('limit', 50)), 1), 500)
+            route = request.GET.get('route')
+
+            since, endpoints = request_stats.snapshot()
+            if route:
+                endpoints = [item for item in endpoints if route in item['route']]
+            endpoints.sort(key=lambda item: item[sort], reverse=True)
+
+            return JsonResponse({
+                'code': 200,
+                'message': '获取接口统计成功',
+                'data': {
+                    'since': datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M:%S'),
+                    'slow_threshold': int(SLOW_REQUEST_THRESHOLD * 1000),
+                    'total': len(endpoints),
+                    'list': endpoints[:limit]
+                }
+            })
+        except Exception as e:
+            logger.error(f'获取接口统计失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
+
+    @method_decorator(jwt_auth_required)
+    def delete(self, request):
+        """重置接口统计"""
+        try:
+            if not check_system_permission(request.user_id, 'edit'):
+                return JsonResponse({'code': 403, 'message': '没有权限重置接口统计'}, status=403)
+
+            request_stats.reset()
+            return JsonResponse({
+                'code': 200,
+                'message': '接口统计已重置'
+            })
+        except Exception as e:
+            logger.error(f'重置接口统计失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
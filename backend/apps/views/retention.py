@@ -0,0 +1,307 @@
+import json
+import logging
+from datetime import timedelta
+from django.http import JsonResponse
+from django.views import View
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from ..models import RetentionPolicy, RetentionJob, BuildTask, Environment
+from ..utils.auth import jwt_auth_required
+from ..utils.permissions import get_user_permissions
+from ..utils.retention import retention_engine, generate_id, get_policy_params
+
+logger = logging.getLogger('apps')
+
+
+def check_system_permission(user_id, operation):
+    """检查系统基本设置权限"""
+    user_permissions = get_user_permissions(user_id)
+    return operation in user_permissions.get('function', {}).get('system_basic', [])
+
+
+def format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def serialize_job(job):
+    return {
+        'job_id': job.job_id,
+        'policy_id': job.policy_id,
+        'policy_name': job.policy.name if job.policy else None,
+        'scope': job.scope,
+        'params': job.params,
+        'status': job.status,
+        'total_count': job.total_count,
+        'deleted_count': job.deleted_count,
+        'workspace_count': job.workspace_count,
+        'freed_bytes': job.freed_bytes,
+        'error_message': job.error_message,
+        'operator': {
+            'user_id': job.operator.user_id,
+            'name': job.operator.name
+        } if job.operator else None,
+        'start_time': format_time(job.start_time),
+        'finish_time': format_time(job.finish_time),
+        'create_time': format_time(job.create_time)
+    }
+
+
+def serialize_policy(policy):
+    return {
+        'policy_id': policy.policy_id,
+        'name': policy.name,
+        'scope': policy.scope,
+        'task_id': policy.task_id,
+        'task_name': policy.task.name if policy.task else None,
+        'environment_id': policy.environment_id,
+        'environment_name': policy.environment.name if policy.environment else None,
+        'keep_days': policy.keep_days,
+        'keep_builds': policy.keep_builds,
+        'cleanup_workspace': policy.cleanup_workspace,
+        'enabled': policy.enabled,
+        'interval_hours': policy.interval_hours,
+        'last_run_time': format_time(policy.last_run_time),
+        'next_run_time': format_time(policy.next_run_time),
+        'create_time': format_time(policy.create_time)
+    }
+
+
+def validate_policy_data(data):
+    """校验保留策略参数，返回错误信息，校验通过时返回None"""
+    if data.get('scope', 'build_history') not in ['build_history', 'login_log']:
+        return '不支持的清理对象'
+    keep_days = data.get('keep_days')
+    keep_builds = data.get('keep_builds')
+    if keep_days is not None and (not isinstance(keep_days, int) or keep_days < 1 or keep_days > 3650):
+        return '保留天数必须在1-3650天之间'
+    if keep_builds is not None and (not isinstance(keep_builds, int) or keep_builds < 1):
+        return '保留构建数必须大于0'
+    if not keep_days and not keep_builds:
+        return '保留天数和保留构建数至少设置一项'
+    if data.get('scope') == 'login_log' and not keep_days:
+        return '登录日志只能按保留天数清理'
+    interval_hours = data.get('interval_hours', 24)
+    if not isinstance(interval_hours, int) or interval_hours < 1:
+        return '执行间隔必须大于等于1小时'
+    if data.get('task_id') and not BuildTask.objects.filter(task_id=data['task_id']).exists():
+        return '构建任务不存在'
+    if data.get('environment_id') and not Environment.objects.filter(environment_id=data['environment_id']).exists():
+        return '环境不存在'
+    return None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class RetentionPolicyView(View):
+    @method_decorator(jwt_auth_required)
+    def get(self, request):
+        """获取保留策略列表"""
+        try:
+            if not check_system_permission(request.user_id, 'view'):
+                return JsonResponse({'code': 403, 'message': '没有权限查看保留策略'}, status=403)
+
+            policies = RetentionPolicy.objects.select_related('task', 'environment').all()
+            return JsonResponse({
+                'code': 200,
+                'message': '获取保留策略成功',
+                'data': [serialize_policy(policy) for policy in policies]
+            })
+        except Exception as e:
+            logger.error(f'获取保留策略失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
+
+    @method_decorator(jwt_auth_required)
+    def post(self, request):
+        """创建保留策略"""
+        try:
+            if not check_system_permission(request.user_id, 'edit'):
+                return JsonResponse({'code': 403, 'message': '没有权限修改保留策略'}, status=403)
+
+            data = json.loads(request.body)
+            if not data.get('name'):
+                return JsonResponse({'code': 400, 'message': '策略名称不能为空'})
+            error = validate_policy_data(data)
+            if error:
+                return JsonResponse({'code': 400, 'message': error})
+
+            scope = data.get('scope', 'build_history')
+            policy = RetentionPolicy.objects.create(
+                policy_id=generate_id(),
+                name=data['name'],
+                scope=scope,
+                task_id=data.get('task_id') if scope == 'build_history' else None,
+                environment_id=data.get('environment_id') if scope == 'build_history' else None,
+                keep_days=data.get('keep_days'),
+                keep_builds=data.get('keep_builds') if scope == 'build_history' else None,
+                cleanup_workspace=data.get('cleanup_workspace', True),
+                enabled=data.get('enabled', True),
+                interval_hours=data.get('interval_hours', 24),
+                creator_id=request.user_id
+            )
+            retention_engine.wakeup()
+
+            return JsonResponse({
+                'code': 200,
+                'message': '创建保留策略成功',
+                'data': {'policy_id': policy.policy_id}
+            })
+        except Exception as e:
+            logger.error(f'创建保留策略失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
+
+    @method_decorator(jwt_auth_required)
+    def put(self, request):
+        """更新保留策略"""
+        try:
+            if not check_system_permission(request.user_id, 'edit'):
+                return JsonResponse({'code': 403, 'message': '没有权限修改保留策略'}, status=403)
+
+            data = json.loads(request.body)
+            policy_id = data.get('policy_id')
+            if not policy_id:
+                return JsonResponse({'code': 400, 'message': '策略ID不能为空'})
+            try:
+                policy = RetentionPolicy.objects.get(policy_id=policy_id)
+            except RetentionPolicy.DoesNotExist:
+                return JsonResponse({'code': 404, 'message': '保留策略不存在'})
+
+            fields = ['name', 'task_id', 'environment_id', 'keep_days', 'keep_builds',
+                      'cleanup_workspace', 'enabled', 'interval_hours']
+            merged = {field: data.get(field, getattr(policy, field)) for field in fields}
+            merged['scope'] = policy.scope
+            error = validate_policy_data(merged)
+            if error:
+                return JsonResponse({'code': 400, 'message': error})
+
+            for field in fields:
+                if field in data:
+                    setattr(policy, field, data[field])
+            # 执行间隔修改后按新间隔重新计算下次执行时间
+            if 'interval_hours' in data and policy.last_run_time:
+                policy.next_run_time = policy.last_run_time + timedelta(hours=policy.interval_hours)
+            policy.save()
+            retention_engine.wakeup()
+
+            return JsonResponse({
+                'code': 200,
+                'message': '更新保留策略成功'
+            })
+        except Exception as e:
+            logger.error(f'更新保留策略失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
+
+    @method_decorator(jwt_auth_required)
+    def delete(self, request):
+        """删除保留策略"""
+        try:
+            if not check_system_permission(request.user_id, 'edit'):
+                return JsonResponse({'code': 403, 'message': '没有权限修改保留策略'}, status=403)
+
+            data = json.loads(request.body)
+            deleted, _ = RetentionPolicy.objects.filter(policy_id=data.get('policy_id')).delete()
+            if not deleted:
+                return JsonResponse({'code': 404, 'message': '保留策略不存在'})
+            return JsonResponse({
+                'code': 200,
+                'message': '删除保留策略成功'
+            })
+        except Exception as e:
+            logger.error(f'删除保留策略失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class RetentionJobView(View):
+    @method_decorator(jwt_auth_required)
+    def get(self, request, job_id=None):
+        """获取清理任务的进度（指定job_id）或清理任务列表"""
+        try:
+            if not check_system_permission(request.user_id, 'view'):
+                return JsonResponse({'code': 403, 'message': '没有权限查看清理任务'}, status=403)
+
+            jobs = RetentionJob.objects.select_related('policy', 'operator')
+            if job_id:
+                job = jobs.filter(job_id=job_id).first()
+                if not job:
+                    return JsonResponse({'code': 404, 'message': '清理任务不存在'})
+                return JsonResponse({
+                    'code': 200,
+                    'message': '获取清理任务成功',
+                    'data': serialize_job(job)
+                })
+
+            status = request.GET.get('status')
+            policy_id = request.GET.get('policy_id')
+            page = max(int(request.GET.get('page', 1)), 1)
+            page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+            if status:
+                jobs = jobs.filter(status=status)
+            if policy_id:
+                jobs = jobs.filter(policy_id=policy_id)
+
+            total = jobs.count()
+            start = (page - 1) * page_size
+            return JsonResponse({
+                'code': 200,
+                'message': '获取清理任务成功',
+                'data': {
+                    'list': [serialize_job(job) for job in jobs.order_by('-id')[start:start + page_size]],
+                    'total': total,
+                    'page': page,
+                    'page_size': page_size
+                }
+            })
+        except Exception as e:
+            logger.error(f'获取清理任务失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
+
+    @method_decorator(jwt_auth_required)
+    def post(self, request, job_id=None):
+        """取消清理任务（action=cancel）或立即执行保留策略（action=run）"""
+        try:
+            if not check_system_permission(request.user_id, 'edit'):
+                return JsonResponse({'code': 403, 'message': '没有权限执行清理操作'}, status=403)
+
+            data = json.loads(request.body) if request.body else {}
+            action = data.get('action')
+
+            if action == 'cancel':
+                if not job_id or not retention_engine.cancel(job_id):
+                    return JsonResponse({'code': 400, 'message': '清理任务不存在或已结束'})
+                return JsonResponse({'code': 200, 'message': '清理任务已取消'})
+
+            if action == 'run':
+                try:
+                    policy = RetentionPolicy.objects.get(policy_id=data.get('policy_id'))
+                except RetentionPolicy.DoesNotExist:
+                    return JsonResponse({'code': 404, 'message': '保留策略不存在'})
+                if RetentionJob.objects.filter(policy=policy, status__in=['pending', 'running']).exists():
+                    return JsonResponse({'code': 400, 'message': '该策略已有未完成的清理任务'})
+                job = retention_engine.submit(policy.scope, get_policy_params(policy), operator=request.user_id, policy=policy)
+                return JsonResponse({
+                    'code': 200,
+                    'message': '清理任务已提交',
+                    'data': {'job_id': job.job_id}
+                })
+
+            return JsonResponse({'code': 400, 'message': '不支持的操作'})
+        except Exception as e:
+            logger.error(f'操作清理任务失败: {str(e)}', exc_info=True)
+            return JsonResponse({
+                'code': 500,
+                'message': f'服务器错误: {str(e)}'
+            })
@@ -10,6 +10,7 @@ from django.db import transaction
 from django.db.models import Q
 from ..models import User, Role, UserRole
 from ..utils.auth import jwt_auth_required
+from ..utils.permissions import get_user_permissions, invalidate_user_permissions
 
 logger = logging.getLogger('apps')
 
@@ -175,6 +176,9 @@ class RoleView(View):
 
                 role.save()
 
+                # 角色权限可能被多个用户使用，失效全部用户的权限缓存
+                invalidate_user_permissions()
+
                 return JsonResponse({
                     'code': 200,
                     'message': '更新角色成功'
@@ -211,6 +215,7 @@ class RoleView(View):
                         })
                     
                     role.delete()
+                    invalidate_user_permissions()
                     return JsonResponse({
                         'code': 200,
                         'message': '删除角色成功'
@@ -246,92 +251,8 @@ class UserPermissionView(View):
             # 记录操作日志
             logger.info(f'用户[{user.username}]获取权限信息')
             
-            # 获取用户的所有角色
-            user_roles = UserRole.objects.filter(user=user).select_related('role')
-            
-            # 合并所有角色的权限
-            menu_permissions = set()
-            function_permissions = {}
-            data_permissions = {
-                'project_scope': 'all',
-                'project_ids': [],
-                'environment_scope': 'all',
-                'environment_types': []
-            }
-            
-            has_custom_project_scope = False
-            has_custom_environment_scope = False
-            
-            for user_role in user_roles:
-                role = user_role.role
-                permissions = role.permissions
-                
-                # 如果permissions是字符串，解析为JSON
-                if isinstance(permissions, str):
-                    try:
-                        permissions = json.loads(permissions)
-                    except json.JSONDecodeError:
-                        logger.error(f'解析角色[{role.name}]的权限数据失败')
-                        permissions = {}
-                
-                # 合并菜单权限
-                if permissions.get('menu') and isinstance(permissions['menu'], list):
-                    menu_permissions.update(permissions['menu'])
-                
-                # 合并功能权限
-                if permissions.get('function') and isinstance(permissions['function'], dict):
-                    for module, actions in permissions['function'].items():
-                        if not isinstance(actions, list):
-                            continue
-                            
-                        if module not in function_permissions:
-                            function_permissions[module] = []
-                        function_permissions[module].extend(actions)
-                        # 确保不重复
-                        function_permissions[module] = list(set(function_permissions[module]))
-                
-                # 合并数据权限
-                if permissions.get('data') and isinstance(permissions['data'], dict):
-                    data_perms = permissions['data']
-                    
-                    # 项目权限
-                    if data_perms.get('project_scope') == 'custom':
-                        has_custom_project_scope = True
-                        if data_permissions['project_scope'] == 'all':
-                            data_permissions['project_scope'] = 'custom'
-                            data_permissions['project_ids'] = data_perms.get('project_ids', [])
-                        else:
-                            # 合并项目ID列表
-                            data_permissions['project_ids'].extend(data_perms.get('project_ids', []))
-                            # 确保不重复
-                            data_permissions['project_ids'] = list(set(data_permissions['project_ids']))
-                    
-                    # 环境权限
-                    if data_perms.get('environment_scope') == 'custom':
-                        has_custom_environment_scope = True
-                        if data_permissions['environment_scope'] == 'all':
-                            data_permissions['environment_scope'] = 'custom'
-                            data_permissions['environment_types'] = data_perms.get('environment_types', [])
-                        else:
-                            # 合并环境类型列表
-                            data_permissions['environment_types'].extend(data_perms.get('environment_types', []))
-                            # 确保不重复
-                            data_permissions['environment_types'] = list(set(data_permissions['environment_types']))
-            
-            # 如果没有任何角色有自定义项目/环境范围，保持为'all'
-            if not has_custom_project_scope:
-                data_permissions['project_scope'] = 'all'
-                data_permissions['project_ids'] = []
-            
-            if not has_custom_environment_scope:
-                data_permissions['environment_scope'] = 'all'
-                data_permissions['environment_types'] = []
-            
-            permissions_result = {
-                'menu': list(menu_permissions),
-                'function': function_permissions,
-                'data': data_permissions
-            }
+            # 获取并合并用户所有角色的权限
+            permissions_result = get_user_permissions(user_id)
             
             return JsonResponse({
                 'code': 200,
@@ -6,11 +6,11 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
-from django.utils import timezone
-from datetime import datetime, timedelta
-from ..models import SecurityConfig, User, BuildTask, BuildHistory, LoginLog
+from ..models import SecurityConfig, User, BuildTask
 from ..utils.auth import jwt_auth_required
 from ..utils.permissions import get_user_permissions
+from ..utils.config_cache import security_config_cache
+from ..utils.retention import retention_engine
 
 logger = logging.getLogger('apps')
 
@@ -157,6 +157,7 @@ class SecurityConfigView(View):
                     security_config.watermark_show_username = watermark_show_username
 
                 security_config.save()
+                security_config_cache.invalidate()
 
                 # 记录操作日志
                 user = User.objects.get(user_id=request.user_id)
@@ -264,51 +265,24 @@ def cleanup_build_logs(request):
                 'message': '保留天数必须在1-365天之间'
             })
 
-        # 计算截止日期
-        cutoff_date = timezone.now() - timedelta(days=days_before)
+        # 提交后台清理任务，按主键分批删除并清理不再被引用的构建目录
+        job = retention_engine.submit('build_history', {
+            'task_ids': task_ids,
+            'days_before': days_before,
+            'cleanup_workspace': data.get('cleanup_workspace', True),
+        }, operator=request.user_id)
 
-        # 查询要删除的构建历史记录
-        if task_ids:
-            # 清理指定任务的日志
-            histories_to_delete = BuildHistory.objects.filter(
-                task__task_id__in=task_ids,
-                create_time__lt=cutoff_date
-            )
-        else:
-            # 清理所有任务的日志
-            histories_to_delete = BuildHistory.objects.filter(
-                create_time__lt=cutoff_date
-            )
-
-        # 统计信息
-        total_count = histories_to_delete.count()
-
-        if total_count == 0:
-            task_desc = f"{len(task_ids)}个指定任务" if task_ids else "所有任务"
-            return JsonResponse({
-                'code': 200,
-                'message': f'没有找到{task_desc}中需要清理的构建日志记录',
-                'data': {
-                    'deleted_count': 0,
-                    'task_count': len(task_ids) if task_ids else 0,
-                    'days_before': days_before
-                }
-            })
-
-        # 执行删除操作
-        with transaction.atomic():
-            deleted_count, _ = histories_to_delete.delete()
-
-            # 记录操作日志
-            user = User.objects.get(user_id=request.user_id)
-            task_desc = f"{len(task_ids)}个指定任务" if task_ids else "所有任务"
-            logger.info(f'用户[{user.username}]清理了{task_desc}{days_before}天前的构建日志，共删除{deleted_count}条记录')
+        # 记录操作日志
+        user = User.objects.get(user_id=request.user_id)
+        task_desc = f"{len(task_ids)}个指定任务" if task_ids else "所有任务"
+        logger.info(f'用户[{user.username}]提交了{task_desc}{days_before}天前构建日志的清理任务[{job.job_id}]')
 
         return JsonResponse({
             'code': 200,
-            'message': f'构建日志清理完成，共删除{deleted_count}条记录',
+            'message': '构建日志清理任务已提交，正在后台执行',
             'data': {
-                'deleted_count': deleted_count,
+                'job_id': job.job_id,
+                'status': job.status,
                 'task_count': len(task_ids) if task_ids else 0,
                 'days_before': days_before
             }
@@ -352,40 +326,17 @@ def cleanup_login_logs(request):
                 'message': '保留天数必须在1-365天之间'
             })
 
-        # 计算截止日期
-        cutoff_date = timezone.now() - timedelta(days=days_before)
-
-        # 查询要删除的登录日志记录
-        logs_to_delete = LoginLog.objects.filter(
-            login_time__lt=cutoff_date
-        )
-
-        # 统计信息
-        total_count = logs_to_delete.count()
-
-        if total_count == 0:
-            return JsonResponse({
-                'code': 200,
-                'message': '没有找到需要清理的登录日志记录',
-                'data': {
-                    'deleted_count': 0,
-                    'days_before': days_before
-                }
-            })
-
-        # 执行删除操作
-        with transaction.atomic():
-            deleted_count, _ = logs_to_delete.delete()
-
-            # 记录操作日志
-            user = User.objects.get(user_id=request.user_id)
-            logger.info(f'用户[{user.username}]清理了{days_before}天前的登录日志，共删除{deleted_count}条记录')
+        # 提交后台清理任务，按主键分批删除
+        job = retention_engine.submit('login_log', {'days_before': days_before}, operator=request.user_id)
+        user = User.objects.get(user_id=request.user_id)
+        logger.info(f'用户[{user.username}]提交了{days_before}天前登录日志的清理任务[{job.job_id}]')
 
         return JsonResponse({
             'code': 200,
-            'message': f'登录日志清理完成，共删除{deleted_count}条记录',
+            'message': '登录日志清理任务已提交，正在后台执行',
             'data': {
-                'deleted_count': deleted_count,
+                'job_id': job.job_id,
+                'status': job.status,
                 'days_before': days_before
             }
         })
@@ -403,18 +354,8 @@ def cleanup_login_logs(request):
 def get_watermark_config(request):
     """获取水印配置"""
     try:
-        # 获取安全配置
-        security_config, created = SecurityConfig.objects.get_or_create(
-            id=1,
-            defaults={
-                'min_password_length': 8,
-                'password_complexity': ['lowercase', 'number'],
-                'session_timeout': 120,
-                'max_login_attempts': 5,
-                'lockout_duration': 30,
-                'enable_2fa': False
-            }
-        )
+        # 获取安全配置（缓存）
+        security_config = security_config_cache.get()
 
         return JsonResponse({
             'code': 200,
@@ -7,10 +7,11 @@ from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Q, Prefetch
 from ..models import User, Role, UserRole
 from ..utils.auth import jwt_auth_required
 from ..utils.security import SecurityValidator
+from ..utils.permissions import invalidate_user_permissions
 
 logger = logging.getLogger('apps')
 
@@ -28,6 +29,8 @@ class UserView(View):
             username = request.GET.get('username')
             email = request.GET.get('email')
             status = request.GET.get('status')
+            user_type = request.GET.get('user_type')
+            keyword = request.GET.get('keyword')
 
             # 构建查询条件
             query = {}
@@ -40,15 +43,34 @@ class UserView(View):
                 query['email__icontains'] = email
             if status:
                 query['status'] = status
+            if user_type:
+                query['user_type'] = user_type
+
+            # 使用查询条件过滤用户，并一次性预加载所有用户的角色
+            users = User.objects.filter(**query).prefetch_related(
+                Prefetch('userrole_set', queryset=UserRole.objects.select_related('role'))
+            ).order_by('-create_time', '-id')
+
+            # 关键字同时匹配用户名、姓名和邮箱
+            if keyword:
+                users = users.filter(
+                    Q(username__icontains=keyword) | Q(name__icontains=keyword) | Q(email__icontains=keyword)
+                )
 
-            # 使用查询条件过滤用户
-            users = User.objects.filter(**query)
+            # 分页（仅在传入page参数时分页，未传入时返回全部用户）
+            page = request.GET.get('page')
+            total = None
+            if page:
+                page = max(int(page), 1)
+                page_size = max(int(request.GET.get('page_size', 10)), 1)
+                total = users.count()
+                start = (page - 1) * page_size
+                users = users[start:start + page_size]
 
             user_list = []
             for user in users:
                 # 获取用户角色
-                user_roles = UserRole.objects.filter(user=user).select_related('role')
-                roles = [{"role_id": ur.role.role_id, "name": ur.role.name} for ur in user_roles]
+                roles = [{"role_id": ur.role.role_id, "name": ur.role.name} for ur in user.userrole_set.all() if ur.role]
 
                 user_list.append({
                     'user_id': user.user_id,
@@ -62,6 +84,16 @@ class UserView(View):
                     'create_time': user.create_time.strftime('%Y-%m-%d %H:%M:%S'),
                 })
 
+            if total is not None:
+                return JsonResponse({
+                    'code': 200,
+                    'message': '获取用户列表成功',
+                    'data': user_list,
+                    'total': total,
+                    'page': page,
+                    'page_size': page_size
+                })
+
             return JsonResponse({
                 'code': 200,
                 'message': '获取用户列表成功',
@@ -134,6 +166,7 @@ class UserView(View):
                         UserRole.objects.create(user=user, role=role)
                     except Role.DoesNotExist:
                         logger.warning(f'角色不存在: {role_id}')
+                invalidate_user_permissions(user.user_id)
 
                 return JsonResponse({
                     'code': 200,
@@ -232,6 +265,7 @@ class UserView(View):
                             UserRole.objects.create(user=user, role=role)
                         except Role.DoesNotExist:
                             logger.warning(f'角色不存在: {role_id}')
+                    invalidate_user_permissions(user.user_id)
 
                 return JsonResponse({
                     'code': 200,
@@ -264,6 +298,7 @@ class UserView(View):
                     UserRole.objects.filter(user=user).delete()
                     # 删除用户
                     user.delete()
+                    invalidate_user_permissions(user_id)
                     return JsonResponse({
                         'code': 200,
                         'message': '删除用户成功'
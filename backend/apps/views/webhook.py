@@ -6,6 +6,7 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from ..models import BuildTask, BuildHistory, User
 from ..utils.builder import Builder
+from ..utils.gitlab_cache import invalidate_repository
 import threading
 
 logger = logging.getLogger('apps')
@@ -94,6 +95,10 @@ class GitLabWebhookView(View):
                     'error': 'Invalid task or token'
                 }, status=404)
 
+            # 推送事件会改变分支和提交记录，无论是否触发构建都使缓存失效
+            if request.headers.get('X-Gitlab-Event', '') == 'Push Hook':
+                invalidate_repository(task.project.repository if task.project else None)
+
             # 检查任务是否启用自动构建
             if not task.auto_build_enabled:
                 logger.info(f"任务[{task_id}]未启用自动构建，忽略webhook")
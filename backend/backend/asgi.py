@@ -11,4 +11,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+application = get_asgi_application()
+
+# 启动后台通知发送线程，投递重启前未发送完成的通知
+from apps.utils.notification_dispatcher import notification_dispatcher  # noqa: E402
+notification_dispatcher.start()
+
+# 启动后台数据清理线程，继续执行重启前未完成的清理任务并按保留策略定期清理
+from apps.utils.retention import retention_engine  # noqa: E402
+retention_engine.start()
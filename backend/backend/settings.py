@@ -1,6 +1,5 @@
 from pathlib import Path
 import pymysql
-import logging
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -34,6 +33,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.middleware.RequestTimingMiddleware',  # 接口耗时、SQL统计和慢请求日志
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -94,37 +94,15 @@ USE_TZ = False  # 修改为 True，使用时区功能
 LOG_DIR = BASE_DIR / 'logs'
 LOG_DIR.mkdir(exist_ok=True)  # 确保日志目录存在
 
-class BuildLogFilter(logging.Filter):
-    def filter(self, record):
-        # 如果是构建日志，使用简单格式
-        if getattr(record, 'from_builder', False):
-            return True
-        # 其他日志使用默认格式
-        return True
-
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'filters': {
-        'build_log_filter': {
-            '()': 'backend.settings.BuildLogFilter',
-        },
-        'non_build_log_filter': {
-            '()': lambda: type('Filter', (logging.Filter,), {
-                'filter': lambda self, record: not getattr(record, 'from_builder', False)
-            })(),
-        },
-    },
     'formatters': {
         'verbose': {
             'format': '[{asctime}] {levelname} [{name}:{lineno}] {message}',
             'style': '{',
             'datefmt': '%Y-%m-%d %H:%M:%S'
         },
-        'simple': {
-            'format': '{message}',
-            'style': '{'
-        },
         'console_with_time': {
             'format': '[{asctime}] {levelname} {message}',
             'style': '{',
@@ -132,17 +110,10 @@ LOGGING = {
         },
     },
     'handlers': {
-        'console_build': {
-            'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-            'filters': ['build_log_filter'],
-        },
         'console_normal': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
             'formatter': 'console_with_time',
-            'filters': ['non_build_log_filter'],
         },
         'file': {
             'level': 'INFO',
@@ -178,7 +149,7 @@ LOGGING = {
             'propagate': False,
         },
         'apps': {
-            'handlers': ['console_build', 'console_normal', 'file', 'error_file'],
+            'handlers': ['console_normal', 'file', 'error_file'],
             'level': 'DEBUG',
             'propagate': False,  # 设置为False以避免重复记录
         },
@@ -196,4 +167,105 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # 构建相关配置
 # BUILD_ROOT = Path('/Users/huk/Downloads/data')  # 修改为指定目录
 BUILD_ROOT = Path('/data')
-BUILD_ROOT.mkdir(exist_ok=True, parents=True)  # 确保目录存在，包括父目录
\ No newline at end of file
+BUILD_ROOT.mkdir(exist_ok=True, parents=True)  # 确保目录存在，包括父目录
+
+# Token验证配置
+# 有效Token在进程内缓存的时间（秒），多进程部署且吊销状态仅本地存储时，其他进程最长在该时间后感知退出登录
+TOKEN_CACHE_TTL = 30
+# Token吊销状态存储：local 仅进程内；cache 同时写入 Django 缓存（多进程部署时需配置共享的 CACHES，如 Redis）
+TOKEN_REVOCATION_BACKEND = 'local'
+
+# 系统配置（安全配置、LDAP配置）缓存
+# 进程内缓存的配置在该时间内直接使用（秒），之后比对 Django 缓存中的版本号，版本变化时重新读取
+CONFIG_CACHE_CHECK_INTERVAL = 5
+# 强制重新读取数据库的时间（秒），未配置共享缓存的多进程部署依赖此项感知其他进程的修改
+CONFIG_CACHE_TTL = 300
+
+# 构建通知发送配置
+NOTIFICATION_WORKERS = 4  # 并发发送线程数
+NOTIFICATION_TIMEOUT = (3, 10)  # 请求超时（连接, 读取），单位秒
+NOTIFICATION_MAX_ATTEMPTS = 5  # 最大尝试次数
+NOTIFICATION_RETRY_BASE = 10  # 重试退避基础间隔（秒），第N次重试等待 base * 2^(N-1)
+NOTIFICATION_DIGEST_WINDOW = 60  # 汇总窗口（秒），同一机器人在窗口内的多条通知合并为一条汇总消息，0 表示不合并
+NOTIFICATION_DIGEST_MAX_ITEMS = 20  # 单条汇总消息最多包含的通知数
+NOTIFICATION_OUTBOX_RETENTION_DAYS = 30  # 已发送成功或最终失败的发件箱记录保留天数，0表示不删除
+NOTIFICATION_RATE_LIMITS = {  # 各类型机器人每分钟允许发送的消息数（按单个机器人限流）
+    'dingtalk': 20,
+    'wecom': 20,
+    'feishu': 100,
+}
+
+# GitLab接口缓存配置（分支、提交记录选择）
+GITLAB_CACHE_TTL = 300  # 分支和提交记录的缓存有效期（秒），过期后携带ETag确认是否变化，收到推送Webhook时立即失效
+GITLAB_PROJECT_CACHE_TTL = 24 * 60 * 60  # 项目路径到项目ID映射的缓存时间（秒）
+GITLAB_POOL_SIZE = 32  # GitLab客户端连接池大小（按 GitLab地址+凭证 复用客户端）
+GITLAB_POOL_IDLE_TIMEOUT = 600  # 客户端空闲超过该时间（秒）后关闭
+GITLAB_TIMEOUT = 15  # GitLab接口请求超时（秒）
+
+# LDAP用户同步配置
+LDAP_PAGE_SIZE = 500  # 分页搜索每页条目数
+LDAP_SYNC_BATCH_SIZE = 500  # 每批写入数据库的用户数
+LDAP_DN_CACHE_TTL = 300  # 登录时用户DN的缓存时间（秒）
+LDAP_HEALTH_CHECK_INTERVAL = 60  # LDAP长连接空闲超过该时间（秒）后使用前先做健康检查
+
+# 数据保留与清理配置（构建历史、登录日志的后台分批清理）
+RETENTION_BATCH_SIZE = 500  # 每批删除的记录数
+RETENTION_BATCH_PAUSE = 0.2  # 每批删除之间的间隔（秒）
+RETENTION_POLL_INTERVAL = 60  # 检查到期保留策略的间隔（秒）
+
+# 构建日志压缩配置
+BUILD_LOG_COMPRESS_ENABLED = True  # 构建结束后自动压缩日志（历史数据可执行 python manage.py compress_build_logs 压缩）
+BUILD_LOG_COMPRESS_LEVEL = 6  # 压缩级别（1-9）
+
+# 实时构建日志分发后端
+# memory：仅当前进程（uvicorn 需以单个 worker 运行）
+# socket：通过Unix域套接字在同一主机的多个进程间转发，可使用多个 worker
+# database：从数据库轮询构建日志，SSE请求可由任意主机处理，实时性较低
+LOG_STREAM_BACKEND = 'memory'
+LOG_STREAM_SOCKET = '/tmp/liteops_log_stream.sock'  # socket 后端的套接字路径，同一主机上的进程需使用相同路径
+LOG_STREAM_DB_POLL_INTERVAL = 1.0  # database 后端轮询间隔（秒）
+
+# 运行指标（/metrics，Prometheus 文本格式）
+METRICS_TOKEN = ''  # 采集Token，设置后需通过 Authorization: Bearer <token> 或 ?token= 访问
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # 未设置采集Token时只允许这些地址（支持 CIDR，如 10.0.0.0/8）访问
+
+# 接口耗时统计（Server-Timing 响应头、慢请求日志、/api/system/request-stats/）
+REQUEST_TIMING_ENABLED = True
+SLOW_REQUEST_THRESHOLD = 1.0  # 慢请求阈值（秒），超过时记录日志及耗时最多的SQL
+SLOW_REQUEST_TOP_SQL = 5  # 慢请求日志中输出的SQL条数
+
+# 构建阶段资源统计（CPU时间、内存峰值、IO、子进程数，读取 /proc 采样）
+BUILD_RESOURCE_SAMPLE_INTERVAL = 0.5  # 采样间隔（秒）
+
+# 构建资源限制（cgroup v2）
+# 启用后每次构建放入独立的cgroup，按任务/环境配置的 cpu_weight、cpu_max（核数）、memory_max（MB）、pids_max 限制资源；
+# 需要 cgroup v2 且运行用户有权限管理所在cgroup（如 systemd 服务设置 Delegate=yes），不满足时构建不受限制地继续执行
+BUILD_CGROUP_ENABLED = False
+BUILD_CGROUP_ROOT = ''  # 构建cgroup的父目录，为空时在服务进程所在cgroup下创建 liteops-builds
+BUILD_DEFAULT_RESOURCE_LIMITS = {}  # 任务和环境都未配置时的默认限制，如 {'memory_max': 4096, 'pids_max': 2048}
+BUILD_TOTAL_RESOURCE_LIMITS = {}  # 所有构建合计的限制，如 {'cpu_max': 6}，为接口服务保留CPU
+
+# 构建超时
+BUILD_DEFAULT_TIMEOUT = 0  # 任务未配置构建超时时间时的默认值（分钟），0表示不限制；阶段超时在构建阶段中单独配置
+BUILD_KILL_GRACE_PERIOD = 10  # 终止或超时时先向脚本进程组发送SIGTERM，等待该时间（秒）后发送SIGKILL
+GIT_HTTP_LOW_SPEED_LIMIT = 1000  # 克隆代码时传输速度低于该值（字节/秒）
+GIT_HTTP_LOW_SPEED_TIME = 300  # 并持续该时间（秒）时中止克隆
+
+# 构建日志过滤（任务可单独配置，未配置的项使用以下默认值）
+# presets 可选 maven、npm、docker、gradle、pip：丢弃下载进度等无用输出，连续的进度行只保留最后一行
+BUILD_DEFAULT_LOG_FILTERS = {'presets': ['maven']}
+BUILD_LOG_MAX_LINE_LENGTH = 0  # 单行日志最大长度（字符），超出部分截断，0表示不限制
+# 凭证（GitLab Token、SSH私钥密码、Kubeconfig Token）和标记为敏感的参数值在构建日志中替换为 ******
+BUILD_LOG_SECRET_MIN_LENGTH = 6  # 短于该长度的值不脱敏，避免替换日志中的普通单词
+
+# 构建日志输出（不经过应用日志，由后台线程写入，完整日志仍保存在构建历史中）
+BUILD_LOG_FILE_ENABLED = True  # 按任务写入 logs/builds/<task_id>.log
+BUILD_LOG_FILE_DIR = LOG_DIR / 'builds'
+BUILD_LOG_FILE_MAX_BYTES = 1024 * 1024 * 20  # 单个任务日志文件大小上限，超出后轮转
+BUILD_LOG_FILE_BACKUP_COUNT = 3
+BUILD_LOG_CONSOLE_SAMPLE_RATE = 0  # 构建日志输出到控制台的采样间隔：每N行输出1行，0表示不输出，1表示全部输出
+
+# 构建日志全文检索（SQLite FTS5 索引，构建结束后写入；删除索引文件后可通过 python manage.py rebuild_build_log_index 重建）
+BUILD_LOG_SEARCH_ENABLED = True
+BUILD_LOG_SEARCH_DB = BASE_DIR / 'data' / 'build_log_index.sqlite3'
+BUILD_LOG_SEARCH_MAX_LINE_LENGTH = 2000  # 单行日志写入索引的最大长度（字符）
@@ -8,18 +8,25 @@ from apps.views.gitlab import GitlabBranchView, GitlabCommitView
 from apps.views.build import BuildTaskView, BuildExecuteView
 from apps.views.build_history import BuildHistoryView, BuildLogView, BuildStageLogView
 from apps.views.build_sse import BuildLogSSEView
-from apps.views.notification import NotificationRobotView, NotificationTestView
+from apps.views.build_analytics import BuildAnalyticsView
+from apps.views.log_search import BuildLogSearchView
+from apps.views.notification import NotificationRobotView, NotificationTestView, NotificationOutboxView
 from apps.views.user import UserView, UserProfileView
 from apps.views.role import RoleView, UserPermissionView
 from apps.views.logs import login_logs_list, login_log_detail
-from apps.views.dashboard import DashboardStatsView, BuildTrendView, BuildDetailView, RecentBuildsView, ProjectDistributionView
+from apps.views.dashboard import DashboardStatsView, BuildTrendView, BuildDetailView, RecentBuildsView, ProjectDistributionView, BuildStatsView
 from apps.views.webhook import GitLabWebhookView
 
 from apps.views.security import SecurityConfigView, get_build_tasks_for_cleanup, cleanup_build_logs, cleanup_login_logs, get_watermark_config, get_current_user_info
+from apps.views.retention import RetentionPolicyView, RetentionJobView
+from apps.views.request_stats import RequestStatsView
+from apps.views.metrics import MetricsView
 from apps.views.ldap import LDAPConfigView, LDAPTestView, LDAPStatusView, LDAPSyncView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # 运行指标（Prometheus 采集）
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('api/login/', login, name='login'),
     path('api/logout/', logout, name='logout'),
     path('api/projects/', ProjectView.as_view(), name='projects'),
@@ -37,7 +44,11 @@ urlpatterns = [
     path('api/build/history/', BuildHistoryView.as_view(), name='build-history'),
     path('api/build/history/log/<str:history_id>/', BuildLogView.as_view(), name='build-log'),
     path('api/build/history/log/<str:history_id>/download/', BuildLogView.as_view(), name='build-log-download'),
+    path('api/build/history/log-search/', BuildLogSearchView.as_view(), name='build-log-search'),
     path('api/build/history/stage-log/<str:history_id>/<str:stage_name>/', BuildStageLogView.as_view(), name='build-stage-log'),
+
+    # 构建耗时分析
+    path('api/build/analytics/', BuildAnalyticsView.as_view(), name='build-analytics'),
     
     # SSE构建日志流
     path('api/build/logs/stream/<str:task_id>/<str:build_number>/', BuildLogSSEView.as_view(), name='build-log-sse'),
@@ -48,6 +59,7 @@ urlpatterns = [
     # 通知机器人相关路由
     path('api/notification/robots/', NotificationRobotView.as_view(), name='notification-robots'),
     path('api/notification/robots/test/', NotificationTestView.as_view(), name='notification-robot-test'),
+    path('api/notification/outbox/', NotificationOutboxView.as_view(), name='notification-outbox'),
     path('api/notification/robots/<str:robot_id>/', NotificationRobotView.as_view(), name='notification-robot-detail'),
 
     # 用户管理相关路由
@@ -66,12 +78,22 @@ urlpatterns = [
     path('api/dashboard/build-detail/', BuildDetailView.as_view(), name='build-detail'),
     path('api/dashboard/recent-builds/', RecentBuildsView.as_view(), name='recent-builds'),
     path('api/dashboard/project-distribution/', ProjectDistributionView.as_view(), name='project-distribution'),
+    path('api/dashboard/build-stats/', BuildStatsView.as_view(), name='build-stats'),
 
     # 安全配置相关路由
     path('api/system/security/', SecurityConfigView.as_view(), name='security-config'),
     path('api/system/security/build-tasks/', get_build_tasks_for_cleanup, name='build-tasks-for-cleanup'),
     path('api/system/security/cleanup-build-logs/', cleanup_build_logs, name='cleanup-build-logs'),
     path('api/system/security/cleanup-login-logs/', cleanup_login_logs, name='cleanup-login-logs'),
+
+    # 数据保留策略和后台清理任务
+    path('api/system/retention/policies/', RetentionPolicyView.as_view(), name='retention-policies'),
+    path('api/system/retention/jobs/', RetentionJobView.as_view(), name='retention-jobs'),
+    path('api/system/retention/jobs/<str:job_id>/', RetentionJobView.as_view(), name='retention-job-detail'),
+
+    # 接口耗时统计
+    path('api/system/request-stats/', RequestStatsView.as_view(), name='request-stats'),
+
     path('api/system/watermark/', get_watermark_config, name='watermark-config'),
     path('api/user/current/', get_current_user_info, name='current-user-info'),
 
@@ -0,0 +1,124 @@
+"""
+GitLab客户端连接池基准测试
+
+在本地启动一个模拟的GitLab服务（每个请求固定增加延迟），对比两种获取分支列表的方式：
+  - legacy: 每次新建 gitlab.Gitlab 客户端并调用 auth()，再获取项目和分支（改造前的方式）
+  - pooled: 从 gitlab_pool 获取复用的客户端，通过项目ID直接获取分支
+
+用法（在 backend 目录下执行）:
+    python benchmarks/gitlab_pool_bench.py --requests 200 --latency 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import statistics
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django  # noqa: E402
+django.setup()
+
+import gitlab  # noqa: E402
+from apps.models import GitlabTokenCredential  # noqa: E402
+from apps.utils.gitlab_pool import GitlabClientPool  # noqa: E402
+
+BRANCHES = [
+    {
+        'name': f'feature-{i}', 'protected': False, 'merged': False, 'default': i == 0,
+        'commit': {'id': 'a' * 40, 'title': 'commit', 'author_name': 'dev', 'authored_date': '2025-01-01T00:00:00Z'}
+    }
+    for i in range(50)
+]
+
+
+def make_handler(latency):
+    class FakeGitlabHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支持长连接
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            path = self.path.split('?')[0]
+            if path == '/api/v4/user':
+                body = {'id': 1, 'username': 'bench'}
+            elif path == '/api/v4/projects/group%2Fproject':
+                body = {'id': 1, 'path_with_namespace': 'group/project'}
+            elif path == '/api/v4/projects/1/repository/branches':
+                body = BRANCHES
+            else:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            raw = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    return FakeGitlabHandler
+
+
+class FakeGitlabServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def legacy_branches(gitlab_url, credential):
+    gl = gitlab.Gitlab(url=gitlab_url, private_token=credential.token)
+    gl.auth()
+    project = gl.projects.get('group/project')
+    branches = project.branches.list(all=True)
+    gl.session.close()
+    return branches
+
+
+def pooled_branches(pool, gitlab_url, credential):
+    gl = pool.get(gitlab_url, credential)
+    return gl.projects.get(1, lazy=True).branches.list(all=True)
+
+
+def run(name, func, count):
+    durations = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    print(f'{name:<8} total={sum(durations):9.1f}ms  '
+          f'avg={statistics.mean(durations):7.2f}ms  '
+          f'p50={durations[len(durations) // 2]:7.2f}ms  '
+          f'p95={durations[int(len(durations) * 0.95) - 1]:7.2f}ms')
+    return statistics.mean(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GitLab客户端连接池基准测试')
+    parser.add_argument('--requests', type=int, default=200, help='每种方式的请求次数')
+    parser.add_argument('--latency', type=float, default=5, help='模拟GitLab每个请求的延迟（毫秒）')
+    args = parser.parse_args()
+
+    server = FakeGitlabServer(('127.0.0.1', 0), make_handler(args.latency / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    gitlab_url = f'http://127.0.0.1:{server.server_address[1]}'
+    credential = GitlabTokenCredential(credential_id='bench', token='bench-token')
+    pool = GitlabClientPool(max_size=8, idle_timeout=600)
+
+    print(f'模拟GitLab: {gitlab_url}，请求延迟 {args.latency}ms，每种方式 {args.requests} 次')
+    legacy = run('legacy', lambda: legacy_branches(gitlab_url, credential), args.requests)
+    pooled = run('pooled', lambda: pooled_branches(pool, gitlab_url, credential), args.requests)
+    print(f'平均耗时降低 {(1 - pooled / legacy) * 100:.1f}%，连接池统计: {pool.stats()}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
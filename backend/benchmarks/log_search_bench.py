@@ -0,0 +1,113 @@
+"""
+构建日志全文检索基准测试
+
+生成模拟的已压缩构建日志并写入临时索引，对比跨构建查找关键词的耗时：
+  - scan: 改造前的方式，逐个解压构建日志后查找（相当于逐个下载日志）
+  - index: 全文检索索引（按构建分页，返回每个构建的前5个匹配行）
+
+用法（在 backend 目录下执行）:
+    python benchmarks/log_search_bench.py --builds 500 --lines 5000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from apps.utils.log_codec import compress_log, decompress_log, DEFAULT_LOG_CODEC  # noqa: E402
+from apps.utils.log_search import BuildLogIndex  # noqa: E402
+
+LINES = [
+    '[INFO] Compiling {n} source files to /data/build/target/classes',
+    'Downloaded from central: https://repo.maven.apache.org/maven2/org/example/lib-{n}/1.0/lib-{n}-1.0.jar',
+    '[INFO] Tests run: {n}, Failures: 0, Errors: 0, Skipped: 2',
+    'added {n} packages, and audited {n} packages in 32s',
+    'Step 5/12 : RUN npm ci --registry=https://registry.npmmirror.com',
+    '[Build Stages] 开始执行阶段: 编译{n}',
+]
+# 偶尔出现的错误，检索的目标
+ERRORS = [
+    "[ERROR] Failed to execute goal on project demo: Could not resolve dependencies for project com.example:demo-{n}",
+    'npm ERR! code ERESOLVE unable to resolve dependency tree',
+    'java.lang.OutOfMemoryError: Java heap space',
+]
+QUERIES = ['Could not resolve dependencies', 'OutOfMemoryError', 'ERESOLVE', 'lib-12345', '开始执行阶段']
+
+
+def generate_builds(count, lines, seed=42):
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=count)
+    builds = []
+    for i in range(count):
+        text = '\n'.join(
+            (rng.choice(ERRORS) if rng.random() < 0.001 else rng.choice(LINES)).format(n=rng.randint(1, 99999))
+            for _ in range(lines)
+        )
+        builds.append(SimpleNamespace(
+            id=i + 1, task_id=f'task-{i % 20}', build_number=i // 20 + 1, status=rng.choice(['success', 'failed']),
+            create_time=start + timedelta(days=i), build_log=None,
+            build_log_compressed=compress_log(text), log_codec=DEFAULT_LOG_CODEC
+        ))
+    return builds
+
+
+def scan(builds, keyword):
+    keyword = keyword.lower()
+    matched = 0
+    for build in builds:
+        if keyword in decompress_log(build.build_log_compressed, build.log_codec).lower():
+            matched += 1
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='构建日志全文检索基准测试')
+    parser.add_argument('--builds', type=int, default=500, help='构建数')
+    parser.add_argument('--lines', type=int, default=5000, help='每个构建的日志行数')
+    parser.add_argument('--rounds', type=int, default=5, help='每个关键词的检索轮数')
+    args = parser.parse_args()
+
+    builds = generate_builds(args.builds, args.lines)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'index.sqlite3')
+        index = BuildLogIndex(path)
+        start = time.perf_counter()
+        for build in builds:
+            index.index(build)
+        elapsed = time.perf_counter() - start
+        total_lines = args.builds * args.lines
+        print(f'{args.builds} 个构建、{total_lines} 行，分词: {index.tokenizer}')
+        print(f'写入索引 {elapsed:.2f} 秒（{total_lines / elapsed:,.0f} 行/秒），'
+              f'索引大小 {os.path.getsize(path) / 1024 / 1024:.1f} MB')
+
+        print(f'{"关键词":<30} {"scan(毫秒)":>10} {"index(毫秒)":>11} {"匹配构建数":>8}')
+        task_ids = [f'task-{i}' for i in range(5)]
+        for keyword in QUERIES:
+            start = time.perf_counter()
+            scan(builds, keyword)
+            scan_ms = (time.perf_counter() - start) * 1000
+
+            durations = []
+            total = 0
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                total, _ = index.search(keyword, limit=10)
+                durations.append((time.perf_counter() - start) * 1000)
+            print(f'{keyword:<30} {scan_ms:>10.1f} {min(durations):>11.2f} {total:>8}')
+
+        start = time.perf_counter()
+        total, _ = index.search('Could not resolve dependencies', task_ids=task_ids, status='failed', limit=10)
+        print(f'按任务和状态过滤: {(time.perf_counter() - start) * 1000:.2f} 毫秒，匹配构建 {total}')
+
+
+if __name__ == '__main__':
+    main()
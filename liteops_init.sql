@@ -37,6 +37,8 @@ CREATE TABLE `build_history` (
   `status` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
   `requirement` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_bin,
   `build_log` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_bin,
+  `build_log_compressed` longblob,
+  `log_codec` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL,
   `stages` json NOT NULL,
   `build_time` json NOT NULL,
   `create_time` datetime(6) DEFAULT NULL,
@@ -83,6 +85,9 @@ CREATE TABLE `build_task` (
   `use_external_script` tinyint(1) NOT NULL,
   `parameters` json NOT NULL DEFAULT (_utf8mb3'[]'),
   `auto_build_branches` json NOT NULL DEFAULT (_utf8mb3'[]'),
+  `resource_limits` json NOT NULL DEFAULT (_utf8mb3'{}'),
+  `build_timeout` int DEFAULT NULL,
+  `log_filters` json NOT NULL DEFAULT (_utf8mb3'{}'),
   `auto_build_enabled` tinyint(1) NOT NULL,
   `webhook_token` varchar(64) COLLATE utf8mb4_bin DEFAULT NULL,
   PRIMARY KEY (`id`),
@@ -110,6 +115,7 @@ CREATE TABLE `environment` (
   `update_time` datetime(6) DEFAULT NULL,
   `creator_id` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL,
   `type` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL,
+  `resource_limits` json NOT NULL DEFAULT (_utf8mb3'{}'),
   PRIMARY KEY (`id`),
   UNIQUE KEY `environment_id` (`environment_id`),
   KEY `environment_creator_id_2f30820a_fk_user_user_id` (`creator_id`),
@@ -313,6 +319,7 @@ CREATE TABLE `user` (
   `update_time` datetime(6) DEFAULT NULL,
   `ldap_dn` varchar(255) COLLATE utf8mb4_bin DEFAULT NULL,
   `user_type` varchar(20) COLLATE utf8mb4_bin DEFAULT NULL,
+  `ldap_modified` varchar(64) COLLATE utf8mb4_bin DEFAULT NULL,
   PRIMARY KEY (`id`),
   UNIQUE KEY `user_id` (`user_id`),
   UNIQUE KEY `username` (`username`),
@@ -343,7 +350,7 @@ DROP TABLE IF EXISTS `user_token`;
 CREATE TABLE `user_token` (
   `id` int NOT NULL AUTO_INCREMENT,
   `token_id` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL,
-  `token` varchar(256) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL,
+  `token` varchar(1024) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL,
   `create_time` datetime(6) DEFAULT NULL,
   `update_time` datetime(6) DEFAULT NULL,
   `user_id` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL,
@@ -368,9 +375,153 @@ CREATE TABLE `ldap_config` (
   `user_attr_map` json NOT NULL DEFAULT (_utf8mb3'{}'),
   `user_dn_template` varchar(255) COLLATE utf8mb4_bin DEFAULT NULL,
   `user_search_filter` varchar(255) COLLATE utf8mb4_bin NOT NULL,
+  `sync_state` json DEFAULT NULL,
   PRIMARY KEY (`id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
 
+-- ----------------------------
+-- Table structure for build_stats_rollup
+-- ----------------------------
+DROP TABLE IF EXISTS `build_stats_rollup`;
+CREATE TABLE `build_stats_rollup` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `period` varchar(10) COLLATE utf8mb4_bin NOT NULL,
+  `bucket_time` datetime(6) NOT NULL,
+  `task_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `project_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `environment_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `total_count` int NOT NULL DEFAULT '0',
+  `success_count` int NOT NULL DEFAULT '0',
+  `failed_count` int NOT NULL DEFAULT '0',
+  `terminated_count` int NOT NULL DEFAULT '0',
+  `duration_sum` bigint NOT NULL DEFAULT '0',
+  `duration_count` int NOT NULL DEFAULT '0',
+  `duration_histogram` json NOT NULL DEFAULT (_utf8mb3'[]'),
+  `update_time` datetime(6) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `build_stats_rollup_period_bucket_time_task_id_uniq` (`period`,`bucket_time`,`task_id`),
+  KEY `build_stats_period_time_idx` (`period`,`bucket_time`),
+  KEY `build_stats_rollup_task_id_fk_build_task_task_id` (`task_id`),
+  CONSTRAINT `build_stats_rollup_task_id_fk_build_task_task_id` FOREIGN KEY (`task_id`) REFERENCES `build_task` (`task_id`)
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
+
+-- ----------------------------
+-- Table structure for build_stage_timing
+-- ----------------------------
+DROP TABLE IF EXISTS `build_stage_timing`;
+CREATE TABLE `build_stage_timing` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `history_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `task_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `timing_type` varchar(10) COLLATE utf8mb4_bin NOT NULL,
+  `stage_name` varchar(100) COLLATE utf8mb4_bin DEFAULT NULL,
+  `stage_index` int NOT NULL DEFAULT '0',
+  `start_time` datetime(6) DEFAULT NULL,
+  `duration` double NOT NULL DEFAULT '0',
+  `status` varchar(20) COLLATE utf8mb4_bin DEFAULT NULL,
+  `cpu_time` double DEFAULT NULL,
+  `max_rss` bigint DEFAULT NULL,
+  `read_bytes` bigint DEFAULT NULL,
+  `write_bytes` bigint DEFAULT NULL,
+  `process_count` int DEFAULT NULL,
+  `create_time` datetime(6) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `stage_timing_task_time_idx` (`task_id`,`timing_type`,`start_time`),
+  KEY `stage_timing_type_time_idx` (`timing_type`,`start_time`),
+  KEY `build_stage_timing_history_id_fk_build_history_history_id` (`history_id`),
+  CONSTRAINT `build_stage_timing_history_id_fk_build_history_history_id` FOREIGN KEY (`history_id`) REFERENCES `build_history` (`history_id`),
+  CONSTRAINT `build_stage_timing_task_id_fk_build_task_task_id` FOREIGN KEY (`task_id`) REFERENCES `build_task` (`task_id`)
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
+
+-- ----------------------------
+-- Table structure for notification_outbox
+-- ----------------------------
+DROP TABLE IF EXISTS `notification_outbox`;
+CREATE TABLE `notification_outbox` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `robot_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `history_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `message` json NOT NULL,
+  `summary` longtext COLLATE utf8mb4_bin,
+  `batch_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `status` varchar(20) COLLATE utf8mb4_bin NOT NULL,
+  `attempts` int NOT NULL DEFAULT '0',
+  `next_attempt_time` datetime(6) DEFAULT NULL,
+  `last_error` longtext COLLATE utf8mb4_bin,
+  `sent_time` datetime(6) DEFAULT NULL,
+  `create_time` datetime(6) DEFAULT NULL,
+  `update_time` datetime(6) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `outbox_status_next_idx` (`status`,`next_attempt_time`),
+  KEY `outbox_robot_time_idx` (`robot_id`,`create_time`),
+  KEY `outbox_batch_idx` (`batch_id`),
+  KEY `notification_outbox_robot_id_fk_notification_robot_robot_id` (`robot_id`),
+  KEY `notification_outbox_history_id_fk_build_history_history_id` (`history_id`),
+  CONSTRAINT `notification_outbox_robot_id_fk_notification_robot_robot_id` FOREIGN KEY (`robot_id`) REFERENCES `notification_robot` (`robot_id`),
+  CONSTRAINT `notification_outbox_history_id_fk_build_history_history_id` FOREIGN KEY (`history_id`) REFERENCES `build_history` (`history_id`)
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
+
+-- ----------------------------
+-- Table structure for retention_policy
+-- ----------------------------
+DROP TABLE IF EXISTS `retention_policy`;
+CREATE TABLE `retention_policy` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `policy_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `name` varchar(100) COLLATE utf8mb4_bin DEFAULT NULL,
+  `scope` varchar(20) COLLATE utf8mb4_bin NOT NULL,
+  `task_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `environment_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `keep_days` int DEFAULT NULL,
+  `keep_builds` int DEFAULT NULL,
+  `cleanup_workspace` tinyint(1) NOT NULL DEFAULT '1',
+  `enabled` tinyint(1) NOT NULL DEFAULT '1',
+  `interval_hours` int NOT NULL DEFAULT '24',
+  `last_run_time` datetime(6) DEFAULT NULL,
+  `next_run_time` datetime(6) DEFAULT NULL,
+  `creator_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `create_time` datetime(6) DEFAULT NULL,
+  `update_time` datetime(6) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `policy_id` (`policy_id`),
+  KEY `retention_policy_task_id_fk_build_task_task_id` (`task_id`),
+  KEY `retention_policy_environment_id_fk_environment_environment_id` (`environment_id`),
+  KEY `retention_policy_creator_id_fk_user_user_id` (`creator_id`),
+  CONSTRAINT `retention_policy_task_id_fk_build_task_task_id` FOREIGN KEY (`task_id`) REFERENCES `build_task` (`task_id`),
+  CONSTRAINT `retention_policy_environment_id_fk_environment_environment_id` FOREIGN KEY (`environment_id`) REFERENCES `environment` (`environment_id`),
+  CONSTRAINT `retention_policy_creator_id_fk_user_user_id` FOREIGN KEY (`creator_id`) REFERENCES `user` (`user_id`)
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
+
+-- ----------------------------
+-- Table structure for retention_job
+-- ----------------------------
+DROP TABLE IF EXISTS `retention_job`;
+CREATE TABLE `retention_job` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `job_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `policy_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `scope` varchar(20) COLLATE utf8mb4_bin NOT NULL,
+  `params` json NOT NULL,
+  `status` varchar(20) COLLATE utf8mb4_bin NOT NULL,
+  `total_count` int NOT NULL DEFAULT '0',
+  `deleted_count` int NOT NULL DEFAULT '0',
+  `workspace_count` int NOT NULL DEFAULT '0',
+  `freed_bytes` bigint NOT NULL DEFAULT '0',
+  `error_message` longtext COLLATE utf8mb4_bin,
+  `operator_id` varchar(32) COLLATE utf8mb4_bin DEFAULT NULL,
+  `start_time` datetime(6) DEFAULT NULL,
+  `finish_time` datetime(6) DEFAULT NULL,
+  `create_time` datetime(6) DEFAULT NULL,
+  `update_time` datetime(6) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `job_id` (`job_id`),
+  KEY `retention_job_status_idx` (`status`,`create_time`),
+  KEY `retention_job_policy_id_fk_retention_policy_policy_id` (`policy_id`),
+  KEY `retention_job_operator_id_fk_user_user_id` (`operator_id`),
+  CONSTRAINT `retention_job_policy_id_fk_retention_policy_policy_id` FOREIGN KEY (`policy_id`) REFERENCES `retention_policy` (`policy_id`),
+  CONSTRAINT `retention_job_operator_id_fk_user_user_id` FOREIGN KEY (`operator_id`) REFERENCES `user` (`user_id`)
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
+
 -- ----------------------------
 -- 初始化数据
 -- ----------------------------